@@ -0,0 +1,197 @@
+"""Applying many inspections and rehabs to bridge data at once.
+
+apply_updates takes a day's worth of inspection and rehab events and
+applies all of them in a single pass over the bridge data, with the same
+result as calling inspect_bridges and add_rehab once per event, in order.
+Each distinct date is validated once, unknown bridge ids are reported,
+and watchers of the bridge data are notified once at the end. Stores whose
+rows are copies, like a bridge_table.BridgeTable, are sent each event
+through their own inspect_bridges and add_rehab instead.
+
+"""
+
+from copy import deepcopy
+from datetime import datetime
+from typing import Iterable, NamedTuple
+
+from bridge_functions import notify_bridges_changed, THREE_BRIDGES
+from constants import (
+    ID_INDEX, LAST_MAJOR_INDEX, LAST_MINOR_INDEX, LAST_INSPECTED_INDEX,
+    BCIS_INDEX)
+
+# Format of inspection and rehab dates, as in '09/15/2018'.
+DATE_FORMAT = '%m/%d/%Y'
+
+
+class UpdateReport(NamedTuple):
+    """The outcome of apply_updates.
+
+    applied is the number of events applied, each counted once even if
+    several records share its bridge id, unknown_ids the sorted ids of
+    events for bridges not in the bridge data, and invalid_dates the sorted
+    dates that are not in the format MM/DD/YYYY. Events with unknown ids or
+    invalid dates are skipped.
+
+    """
+
+    applied: int
+    unknown_ids: list[int]
+    invalid_dates: list[str]
+
+
+def is_valid_date(date: str) -> bool:
+    """Return True if and only if date is a real date in the format
+    MM/DD/YYYY.
+
+    >>> is_valid_date('09/15/2018')
+    True
+    >>> is_valid_date('02/30/2018')
+    False
+    >>> is_valid_date('2018-09-15')
+    False
+    """
+
+    try:
+        datetime.strptime(date, DATE_FORMAT)
+    except ValueError:
+        return False
+
+    return len(date) == 10
+
+
+def apply_updates(bridge_data: list[list],
+                  inspections: Iterable[tuple[int, str, float]] = (),
+                  rehabs: Iterable[tuple[int, str, bool]] = ()
+                  ) -> UpdateReport:
+    """Apply the (bridge_id, date, bci) inspections inspections and the
+    (bridge_id, date, major) rehab events rehabs to the bridge data
+    bridge_data, in one pass over bridge_data. The result is the same as
+    calling inspect_bridges(bridge_data, [bridge_id], date, bci) for each
+    inspection and then add_rehab(bridge_data, bridge_id, date, major) for
+    each rehab event, in order.
+
+    >>> bridges = deepcopy(THREE_BRIDGES)
+    >>> apply_updates(bridges, [(1, '09/15/2018', 71.9), (42, '09/15/2018',
+    ...                         60.0), (1, '09/16/2018', 70.1)],
+    ...               [(2, '09/15/2019', True), (3, '13/01/2019', False)])
+    UpdateReport(applied=3, unknown_ids=[42], invalid_dates=['13/01/2019'])
+    >>> bridges[0][LAST_INSPECTED_INDEX], bridges[0][BCIS_INDEX][:3]
+    ('09/16/2018', [70.1, 71.9, 72.3])
+    >>> bridges[1][LAST_MAJOR_INDEX]
+    '2019'
+
+    Every rehab event counts, even when a later one overwrites it, and an
+    event for an id shared by several records counts once:
+
+    >>> apply_updates(bridges, rehabs=[(2, '09/15/2020', True),
+    ...                                (2, '09/15/2021', True)])
+    UpdateReport(applied=2, unknown_ids=[], invalid_dates=[])
+    >>> twins = [deepcopy(THREE_BRIDGES[0]) for _ in range(2)]
+    >>> apply_updates(twins, [(1, '09/15/2018', 71.9)],
+    ...               [(1, '09/15/2019', False)])
+    UpdateReport(applied=2, unknown_ids=[], invalid_dates=[])
+    >>> [(bridge[BCIS_INDEX][0], bridge[LAST_MINOR_INDEX]) for bridge in twins]
+    [(71.9, '2019'), (71.9, '2009')]
+
+    A store with its own inspect_bridges and add_rehab methods is given
+    each event through them, and notifies its watchers as they do. Raise
+    TypeError for any other bridge data that is not a list of records.
+
+    >>> from bridge_table import BridgeTable
+    >>> table = BridgeTable.from_records(THREE_BRIDGES)
+    >>> apply_updates(table, [(1, '09/15/2018', 71.9), (42, '09/15/2018',
+    ...                       60.0), (1, '09/16/2018', 70.1)],
+    ...               [(2, '09/15/2019', True)])
+    UpdateReport(applied=3, unknown_ids=[42], invalid_dates=[])
+    >>> table[0][LAST_INSPECTED_INDEX], table[0][BCIS_INDEX][:3]
+    ('09/16/2018', [70.1, 71.9, 72.3])
+    >>> table[1][LAST_MAJOR_INDEX]
+    '2019'
+    >>> apply_updates(tuple(THREE_BRIDGES), [(1, '09/15/2018', 71.9)])
+    Traceback (most recent call last):
+    ...
+    TypeError: cannot update bridge data of type tuple
+    """
+
+    valid_dates = {}
+    invalid_dates = set()
+
+    def check_date(date: str) -> bool:
+        if date not in valid_dates:
+            valid_dates[date] = is_valid_date(date)
+            if not valid_dates[date]:
+                invalid_dates.add(date)
+        return valid_dates[date]
+
+    inspections = [(bridge_id, date, bci)
+                   for bridge_id, date, bci in inspections
+                   if check_date(date)]
+    new_bcis = {}
+    last_inspected = {}
+    for bridge_id, date, bci in inspections:
+        new_bcis.setdefault(bridge_id, []).append(bci)
+        last_inspected[bridge_id] = date
+
+    rehabs = [(bridge_id, date, major) for bridge_id, date, major in rehabs
+              if check_date(date)]
+    rehab_years = {}
+    rehab_counts = {}
+    for bridge_id, date, major in rehabs:
+        index = LAST_MAJOR_INDEX if major else LAST_MINOR_INDEX
+        rehab_years.setdefault(bridge_id, {})[index] = date[6:]
+        rehab_counts[bridge_id] = rehab_counts.get(bridge_id, 0) + 1
+
+    def count_applied(changed: Iterable[int]) -> int:
+        return sum(len(new_bcis.get(bridge_id, ()))
+                   + rehab_counts.get(bridge_id, 0) for bridge_id in changed)
+
+    pending = set(new_bcis) | set(rehab_years)
+    store_inspect = getattr(bridge_data, 'inspect_bridges', None)
+    store_rehab = getattr(bridge_data, 'add_rehab', None)
+    if store_inspect is not None and store_rehab is not None:
+        # Stores whose rows are copies, like a bridge_table.BridgeTable,
+        # record updates themselves; edits to their rows would be lost.
+        known = pending & {bridge[ID_INDEX] for bridge in bridge_data}
+        for bridge_id, date, bci in inspections:
+            if bridge_id in known:
+                store_inspect([bridge_id], date, bci)
+        for bridge_id, date, major in rehabs:
+            if bridge_id in known:
+                store_rehab(bridge_id, date, major)
+        return UpdateReport(count_applied(known), sorted(pending - known),
+                            sorted(invalid_dates))
+
+    by_id = getattr(bridge_data, 'by_id', None)
+    if by_id is not None:
+        bridges = [by_id[bridge_id] for bridge_id in pending
+                   if bridge_id in by_id]
+    elif isinstance(bridge_data, list):
+        bridges = [bridge for bridge in bridge_data
+                   if bridge[ID_INDEX] in pending]
+    else:
+        raise TypeError('cannot update bridge data of type '
+                        + type(bridge_data).__name__)
+
+    # Like inspect_bridges, inspections go to every record with the id, but
+    # like add_rehab, rehabs only go to the first.
+    changed = []
+    for bridge in bridges:
+        bridge_id = bridge[ID_INDEX]
+        if bridge_id in new_bcis:
+            bridge[LAST_INSPECTED_INDEX] = last_inspected[bridge_id]
+            bridge[BCIS_INDEX][:0] = new_bcis[bridge_id][::-1]
+        if bridge_id in pending:
+            for index, year in rehab_years.get(bridge_id, {}).items():
+                bridge[index] = year
+            changed.append(bridge_id)
+            pending.discard(bridge_id)
+
+    if changed:
+        notify_bridges_changed(bridge_data, changed)
+
+    return UpdateReport(count_applied(changed), sorted(pending),
+                        sorted(invalid_dates))
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,310 @@
+"""Forecasts of when each bridge's BCI will fall to the priority BCIs.
+
+The BCI history of each bridge is fitted with a least-squares line, and the
+line is followed down from the most recent BCI to the high, medium and low
+priority BCIs. A rehab resets a bridge's condition, so only the BCIs from
+the year of the most recent rehab, major or minor, on are fitted.
+
+Formatted bridge data keeps the BCIs of each bridge but not the years they
+were recorded in, so the most recent BCI is taken to be from the year of
+the last inspection, and the others to be interval years apart, two by
+default: in the source data, most bridges have a BCI every other year.
+
+forecast_bridges fits every bridge at once: if NumPy is installed, the
+least-squares sums of all bridges are computed in two vectorized calls.
+FleetForecast keeps the forecasts of some bridge data and watches it, so
+that only the bridges changed by inspect_bridges or add_rehab are fitted
+again.
+
+"""
+
+from copy import deepcopy
+from itertools import chain
+from typing import NamedTuple
+
+from bridge_functions import (
+    add_rehab, inspect_bridges, np, BridgeWatcher, THREE_BRIDGES)
+from constants import (
+    ID_INDEX, LAST_MAJOR_INDEX, LAST_MINOR_INDEX, LAST_INSPECTED_INDEX,
+    BCIS_INDEX, HIGH_PRIORITY_BCI, MEDIUM_PRIORITY_BCI, LOW_PRIORITY_BCI)
+
+# Years between two BCIs in a bridge's history.
+DEFAULT_INTERVAL = 2
+
+# Fewest BCIs a trend is fitted to.
+MIN_POINTS = 2
+
+
+class BciForecast(NamedTuple):
+    """The BCI trend of one bridge.
+
+    year is the year of the most recent BCI, latest, and slope is the
+    change in BCI per year fitted to the points BCIs recorded since the
+    most recent rehab. year and latest are None if no BCI was recorded
+    since then, and slope is None if fewer than MIN_POINTS were.
+
+    high_year, medium_year and low_year are the years in which the BCI
+    falls to HIGH_PRIORITY_BCI, MEDIUM_PRIORITY_BCI and LOW_PRIORITY_BCI,
+    as returned by get_crossing_year.
+
+    """
+
+    year: int
+    latest: float
+    slope: float
+    points: int
+    high_year: float
+    medium_year: float
+    low_year: float
+
+
+def _get_year(date: str) -> int:
+    """Return the year of the date date, in the format MM/DD/YYYY or YYYY,
+    or None if date is empty.
+
+    >>> _get_year('04/13/2012'), _get_year('2014'), _get_year('')
+    (2012, 2014, None)
+    """
+
+    if not date:
+        return None
+
+    return int(date[-4:])
+
+
+def get_crossing_year(year: int, latest: float, slope: float,
+                      bci: float) -> float:
+    """Return the year in which a BCI of latest in the year year, changing
+    by slope per year, falls to bci: year itself if latest is already at
+    most bci, and None if it never does or if latest or slope is None.
+
+    >>> get_crossing_year(2012, 72.3, -0.5, 70)
+    2016.6
+    >>> get_crossing_year(2012, 72.3, 0.5, 70) is None
+    True
+    >>> get_crossing_year(2012, 72.3, None, 100)
+    2012
+    """
+
+    if latest is None:
+        return None
+    if latest <= bci:
+        return year
+    if slope is None or slope >= 0:
+        return None
+
+    return year + (bci - latest) / slope
+
+
+def get_window(bridge: list, interval: float = DEFAULT_INTERVAL) -> int:
+    """Return the number of the most recent BCIs of the bridge bridge that
+    were recorded since its most recent rehab, when the BCIs are interval
+    years apart.
+
+    >>> get_window(THREE_BRIDGES[0]), get_window(THREE_BRIDGES[2])
+    (0, 1)
+    >>> bridge = deepcopy(THREE_BRIDGES[0])
+    >>> bridge[LAST_MAJOR_INDEX] = bridge[LAST_MINOR_INDEX] = '2007'
+    >>> get_window(bridge)
+    3
+    """
+
+    year = _get_year(bridge[LAST_INSPECTED_INDEX])
+    if year is None:
+        return 0
+
+    count = len(bridge[BCIS_INDEX])
+    rehabs = [rehab for rehab in (_get_year(bridge[LAST_MAJOR_INDEX]),
+                                  _get_year(bridge[LAST_MINOR_INDEX]))
+              if rehab is not None]
+    if rehabs:
+        if max(rehabs) > year:
+            return 0
+        count = min(count, int((year - max(rehabs)) // interval) + 1)
+
+    return count
+
+
+def _get_sums(bridge_data: list[list],
+              windows: list[int]) -> tuple[list[float], list[float]]:
+    """Return, for each bridge in bridge data bridge_data, the sum of its
+    windows[i] most recent BCIs, and the sum of each of them times its
+    position in the history, newest at position 0.
+
+    """
+
+    if not np:
+        sums = []
+        weighted_sums = []
+        for bridge, window in zip(bridge_data, windows):
+            bcis = bridge[BCIS_INDEX]
+            sums.append(sum(bcis[:window]))
+            weighted_sums.append(sum(i * bcis[i] for i in range(window)))
+        return sums, weighted_sums
+
+    lengths = np.array(windows, dtype=int)
+    bcis = np.fromiter(
+        chain.from_iterable(bridge[BCIS_INDEX][:window]
+                            for bridge, window in zip(bridge_data, windows)),
+        float, int(lengths.sum()))
+    owners = np.repeat(np.arange(len(lengths)), lengths)
+    positions = np.arange(len(bcis)) - np.repeat(np.cumsum(lengths)
+                                                 - lengths, lengths)
+    return (np.bincount(owners, bcis, len(lengths)).tolist(),
+            np.bincount(owners, positions * bcis, len(lengths)).tolist())
+
+
+def forecast_bridges(bridge_data: list[list],
+                     interval: float = DEFAULT_INTERVAL) -> list[BciForecast]:
+    """Return the forecast of each bridge in bridge data bridge_data, in
+    order, when the BCIs in each bridge's history are interval years apart.
+    Bridges with fewer than MIN_POINTS BCIs since their most recent rehab
+    have no slope.
+
+    The sums are computed by NumPy if it is installed, so forecasts can
+    differ in the last bits of precision from those computed without it.
+
+    >>> bridges = deepcopy(THREE_BRIDGES)
+    >>> for bridge in bridges:
+    ...     bridge[LAST_MAJOR_INDEX] = bridge[LAST_MINOR_INDEX] = ''
+    >>> forecast = forecast_bridges(bridges)[0]
+    >>> forecast.year, forecast.latest, forecast.points
+    (2012, 72.3, 7)
+    >>> round(forecast.slope, 4), round(forecast.medium_year, 1)
+    (-0.0839, 2039.4)
+    >>> forecast.high_year is None, forecast.low_year
+    (False, 2012)
+    >>> forecast_bridges(THREE_BRIDGES)[0]
+    BciForecast(year=None, latest=None, slope=None, points=0, high_year=None, \
+medium_year=None, low_year=None)
+    """
+
+    windows = [get_window(bridge, interval) for bridge in bridge_data]
+    sums, weighted_sums = _get_sums(bridge_data, windows)
+
+    forecasts = []
+    for i in range(len(bridge_data)):
+        bridge = bridge_data[i]
+        count = windows[i]
+        if count == 0:
+            forecasts.append(BciForecast(None, None, None, 0, None, None,
+                                         None))
+            continue
+
+        year = _get_year(bridge[LAST_INSPECTED_INDEX])
+        latest = bridge[BCIS_INDEX][0]
+        slope = None
+        if count >= MIN_POINTS:
+            # Least squares over the positions 0 to count - 1, whose sum
+            # and sum of squares have closed forms. The position of a BCI
+            # grows as its year decreases.
+            position_sum = count * (count - 1) / 2
+            square_sum = (count - 1) * count * (2 * count - 1) / 6
+            slope = -((count * weighted_sums[i] - position_sum * sums[i])
+                      / (count * square_sum - position_sum ** 2)) / interval
+        forecasts.append(BciForecast(
+            year, latest, slope, count,
+            get_crossing_year(year, latest, slope, HIGH_PRIORITY_BCI),
+            get_crossing_year(year, latest, slope, MEDIUM_PRIORITY_BCI),
+            get_crossing_year(year, latest, slope, LOW_PRIORITY_BCI)))
+
+    return forecasts
+
+
+class FleetForecast(BridgeWatcher):
+    """The forecasts of every bridge in some bridge data, kept up to date
+    as inspections and rehabs are recorded.
+
+    >>> bridges = deepcopy(THREE_BRIDGES)
+    >>> fleet = FleetForecast(bridges)
+    >>> fleet.get_forecast(1).slope is None
+    True
+    >>> inspect_bridges(bridges, [1], '09/15/2016', 71.0)
+    >>> inspect_bridges(bridges, [1], '09/15/2018', 68.0)
+    >>> forecast = fleet.get_forecast(1)
+    >>> forecast.points, round(forecast.slope, 3), round(forecast.high_year, 1)
+    (3, -1.075, 2025.4)
+
+    """
+
+    def __init__(self, bridge_data: list[list],
+                 interval: float = DEFAULT_INTERVAL) -> None:
+        """Initialize the forecasts of the bridges in the bridge data
+        bridge_data, whose BCIs are interval years apart, and start watching
+        it for changes.
+
+        """
+
+        self.interval = interval
+        self._forecasts = {}
+        super().__init__(bridge_data)
+
+    def refresh(self) -> None:
+        """Fit every bridge again. Call this after adding or removing
+        bridges.
+
+        """
+
+        super().refresh()
+        self._forecasts = dict(zip(
+            (bridge[ID_INDEX] for bridge in self.bridge_data),
+            forecast_bridges(self.bridge_data, self.interval)))
+
+    def update_bridges(self, bridge_ids: list[int],
+                       positions: list[int]) -> None:
+        """Fit the bridges with ids bridge_ids, at positions positions in
+        the bridge data, again.
+
+        >>> bridges = deepcopy(THREE_BRIDGES)
+        >>> fleet = FleetForecast(bridges)
+        >>> add_rehab(bridges, 3, '01/01/2001', True)
+        >>> add_rehab(bridges, 3, '01/01/2001', False)
+        >>> fleet.get_forecast(3).points
+        7
+        """
+
+        bridges = [self.bridge_data[pos] for pos in positions]
+        for bridge, forecast in zip(bridges, forecast_bridges(
+                bridges, self.interval)):
+            self._forecasts[bridge[ID_INDEX]] = forecast
+
+    def get_forecast(self, bridge_id: int) -> BciForecast:
+        """Return the forecast of the bridge with id bridge_id, or None if
+        there is no such bridge.
+
+        """
+
+        return self._forecasts.get(bridge_id)
+
+    def get_forecasts(self) -> dict[int, BciForecast]:
+        """Return a dictionary from the id of every bridge to its
+        forecast.
+
+        >>> sorted(FleetForecast(THREE_BRIDGES).get_forecasts())
+        [1, 2, 3]
+        """
+
+        return dict(self._forecasts)
+
+    def get_bridges_crossing(self, year: float,
+                             bci: float = HIGH_PRIORITY_BCI) -> list[int]:
+        """Return the ids of the bridges whose BCI is forecast to fall to
+        bci by the year year, in the order of the bridge data.
+
+        >>> FleetForecast(THREE_BRIDGES).get_bridges_crossing(2100, 90)
+        [3]
+        """
+
+        bridge_ids = []
+        for bridge_id, forecast in self._forecasts.items():
+            crossing = get_crossing_year(forecast.year, forecast.latest,
+                                         forecast.slope, bci)
+            if crossing is not None and crossing <= year:
+                bridge_ids.append(bridge_id)
+
+        return bridge_ids
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
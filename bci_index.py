@@ -0,0 +1,137 @@
+"""A sorted index of the latest BCI of each bridge.
+
+BciIndex keeps the bridges of some bridge data sorted by their most recent
+BCI, so that the bridges at or below a BCI threshold are found with one
+binary search instead of a scan of all bridges. The index watches the
+bridge data and re-sorts a bridge when inspect_bridges changes its latest
+BCI.
+
+For B bridges, k of them at or below the threshold, a query takes
+O(log B + k log k) time: the binary search, then sorting the k matches
+back into the order of the bridge data. Re-sorting a bridge inserts into
+and deletes from a Python list, which is O(B) in the worst case, although
+moving the list's items is a single fast memory copy.
+
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from copy import deepcopy
+from math import inf
+
+from bridge_functions import inspect_bridges, BridgeWatcher, THREE_BRIDGES
+from constants import ID_INDEX, BCIS_INDEX
+
+
+class BciIndex(BridgeWatcher):
+    """The bridges of some bridge data, sorted by latest BCI.
+
+    Bridges with no BCIs are left out of the index.
+
+    >>> index = BciIndex(THREE_BRIDGES)
+    >>> index.get_bridges_with_bci_below(72)
+    [2]
+    >>> index.get_bridges_with_bci_below(85.2, [1, 3])
+    [1, 3]
+
+    """
+
+    def __init__(self, bridge_data: list[list]) -> None:
+        """Initialize a new index of the bridges in bridge data bridge_data,
+        and start watching it for changes.
+
+        """
+
+        self._keys = []
+        self._latest = {}
+        super().__init__(bridge_data)
+
+    def refresh(self) -> None:
+        """Rebuild the index from scratch. Call this after adding or removing
+        bridges.
+
+        """
+
+        super().refresh()
+        self._latest = {}
+        for pos in range(len(self.bridge_data)):
+            bridge = self.bridge_data[pos]
+            if bridge[BCIS_INDEX]:
+                self._latest[pos] = bridge[BCIS_INDEX][0]
+        self._keys = sorted((bci, pos) for pos, bci in self._latest.items())
+
+    def update_bridges(self, bridge_ids: list[int],
+                       positions: list[int]) -> None:
+        """Re-sort the bridges with ids bridge_ids, at positions positions
+        in the bridge data, whose latest BCI has changed.
+
+        >>> bridges = deepcopy(THREE_BRIDGES)
+        >>> index = BciIndex(bridges)
+        >>> inspect_bridges(bridges, [3], '09/15/2018', 60.0)
+        >>> index.get_bridges_with_bci_below(70)
+        [3]
+        """
+
+        for pos in positions:
+            bcis = self.bridge_data[pos][BCIS_INDEX]
+            new_bci = bcis[0] if bcis else None
+            old_bci = self._latest.get(pos)
+            if new_bci == old_bci:
+                continue
+
+            if old_bci is not None:
+                del self._keys[bisect_left(self._keys, (old_bci, pos))]
+                del self._latest[pos]
+            if new_bci is not None:
+                insort(self._keys, (new_bci, pos))
+                self._latest[pos] = new_bci
+
+    def get_positions_with_bci_below(self, bci: float) -> set[int]:
+        """Return the set of positions in the bridge data of the bridges
+        whose latest BCI is at most bci.
+
+        >>> BciIndex(THREE_BRIDGES).get_positions_with_bci_below(72) == {1}
+        True
+        """
+
+        end = bisect_right(self._keys, (bci, inf))
+        return {pos for _, pos in self._keys[:end]}
+
+    def get_bridges_with_bci_below(self, bci: float,
+                                   bridge_ids: list[int] = None) -> list[int]:
+        """Return a list of the ids of the bridges whose latest BCI is at
+        most bci, in the order of the bridge data. If bridge_ids is not None,
+        only include bridges whose id is in bridge_ids, as
+        get_bridges_with_bci_below does.
+
+        Putting the k matching bridges in the order of the bridge data
+        takes O(k log k) time, after the O(log B) binary search.
+
+        >>> from bridge_functions import get_bridges_with_bci_below
+        >>> index = BciIndex(THREE_BRIDGES)
+        >>> (index.get_bridges_with_bci_below(72, [1, 2])
+        ...  == get_bridges_with_bci_below(THREE_BRIDGES, [1, 2], 72))
+        True
+        >>> index.get_bridges_with_bci_below(0)
+        []
+        """
+
+        end = bisect_right(self._keys, (bci, inf))
+        if bridge_ids is None:
+            positions = [pos for _, pos in self._keys[:end]]
+        elif len(bridge_ids) < end:
+            positions = set()
+            for bridge_id in bridge_ids:
+                pos = self._positions.get(bridge_id)
+                if pos in self._latest and self._latest[pos] <= bci:
+                    positions.add(pos)
+        else:
+            bridge_ids = set(bridge_ids)
+            positions = [pos for _, pos in self._keys[:end]
+                         if self.bridge_data[pos][ID_INDEX] in bridge_ids]
+
+        return [self.bridge_data[pos][ID_INDEX] for pos in sorted(positions)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
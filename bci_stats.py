@@ -0,0 +1,181 @@
+"""Incremental per-bridge BCI statistics.
+
+FleetBciStats keeps the count, sum, minimum, maximum, latest value and an
+exponentially weighted trend of the BCI history of every bridge in some
+bridge data. Recording an inspection through inspect_bridges adds the new
+BCI to the statistics of each inspected bridge, rather than going over its
+history again, and fleet-wide reports read the kept statistics rather than
+every inspection.
+
+This does not make an inspection O(1): inspect_bridges still inserts the
+new BCI at the front of a bridge's history, and reading a bridge from a
+BridgeTable builds its whole record, both in time linear in the length of
+the history.
+
+Sums are updated incrementally, so averages can differ from
+get_average_bci in the last bits of precision.
+
+"""
+
+from copy import deepcopy
+
+from bridge_functions import inspect_bridges, BridgeWatcher, THREE_BRIDGES
+from constants import ID_INDEX, BCIS_INDEX
+
+# Weight of the newest BCI in the exponentially weighted trend.
+DEFAULT_TREND_WEIGHT = 0.3
+
+
+class BciStats:
+    """Running statistics over the BCI history of one bridge.
+
+    >>> stats = BciStats([72.3, 69.5, 70.0])
+    >>> stats.count, stats.minimum, stats.maximum, stats.latest
+    (3, 69.5, 72.3, 72.3)
+    >>> stats.add(60.0)
+    >>> stats.count, stats.minimum, stats.latest
+    (4, 60.0, 60.0)
+
+    """
+
+    def __init__(self, bcis: list[float] = (),
+                 trend_weight: float = DEFAULT_TREND_WEIGHT) -> None:
+        """Initialize new statistics over the BCIs bcis, listed newest
+        first, weighting each new BCI by trend_weight in the trend.
+
+        """
+
+        self.count = 0
+        self.total = 0
+        self.minimum = None
+        self.maximum = None
+        self.latest = None
+        self.trend = None
+        self.trend_weight = trend_weight
+        for bci in reversed(bcis):
+            self.add(bci)
+
+    def add(self, bci: float) -> None:
+        """Add the BCI bci as the newest BCI in the history."""
+
+        self.count += 1
+        self.total += bci
+        if self.count == 1:
+            self.minimum = self.maximum = self.trend = bci
+        else:
+            self.minimum = min(self.minimum, bci)
+            self.maximum = max(self.maximum, bci)
+            self.trend += self.trend_weight * (bci - self.trend)
+        self.latest = bci
+
+    def mean(self) -> float:
+        """Return the mean BCI of the history, or 0 if it is empty.
+
+        >>> BciStats([72.0, 70.0]).mean()
+        71.0
+        >>> BciStats().mean()
+        0
+        """
+
+        if self.count == 0:
+            return 0
+
+        return self.total / self.count
+
+
+class FleetBciStats(BridgeWatcher):
+    """BCI statistics for every bridge in some bridge data, kept up to date
+    as inspections are recorded.
+
+    >>> from bridge_functions import get_average_bci
+    >>> bridges = deepcopy(THREE_BRIDGES)
+    >>> fleet = FleetBciStats(bridges)
+    >>> fleet.get_average_bci(1) == get_average_bci(bridges, 1)
+    True
+    >>> inspect_bridges(bridges, [1], '09/15/2018', 40.0)
+    >>> fleet.get_stats(1).count, fleet.get_stats(1).minimum
+    (8, 40.0)
+
+    """
+
+    def __init__(self, bridge_data: list[list],
+                 trend_weight: float = DEFAULT_TREND_WEIGHT) -> None:
+        """Initialize statistics for each bridge in the bridge data
+        bridge_data, and start watching it for changes.
+
+        """
+
+        self.trend_weight = trend_weight
+        self._stats = {}
+        super().__init__(bridge_data)
+
+    def refresh(self) -> None:
+        """Recompute the statistics of every bridge from scratch. Call this
+        after adding or removing bridges.
+
+        """
+
+        super().refresh()
+        self._stats = {}
+        for pos in range(len(self.bridge_data)):
+            bridge = self.bridge_data[pos]
+            self._stats[bridge[ID_INDEX]] = BciStats(bridge[BCIS_INDEX],
+                                                     self.trend_weight)
+
+    def update_bridges(self, bridge_ids: list[int],
+                       positions: list[int]) -> None:
+        """Update the statistics of the bridges with ids bridge_ids, at
+        positions positions in the bridge data.
+
+        """
+
+        for bridge_id, pos in zip(bridge_ids, positions):
+            # A history that grew by one BCI in front of the previous latest
+            # BCI is taken to be a new inspection; anything else is rebuilt.
+            bcis = self.bridge_data[pos][BCIS_INDEX]
+            stats = self._stats[bridge_id]
+            if (len(bcis) == stats.count + 1
+                    and (stats.count == 0 or bcis[1] == stats.latest)):
+                stats.add(bcis[0])
+            elif (len(bcis) != stats.count
+                  or (bcis and bcis[0] != stats.latest)):
+                self._stats[bridge_id] = BciStats(bcis, self.trend_weight)
+
+    def get_stats(self, bridge_id: int) -> BciStats:
+        """Return the BCI statistics of the bridge with id bridge_id, or None
+        if there is no such bridge.
+
+        """
+
+        return self._stats.get(bridge_id)
+
+    def get_average_bci(self, bridge_id: int) -> float:
+        """Return the average BCI of the bridge with id bridge_id, or 0 if
+        there is no such bridge or it has no BCIs, as get_average_bci does.
+
+        >>> FleetBciStats(THREE_BRIDGES).get_average_bci(42)
+        0
+        """
+
+        stats = self._stats.get(bridge_id)
+        if stats is None:
+            return 0
+
+        return stats.mean()
+
+    def get_average_bcis(self) -> dict[int, float]:
+        """Return a dictionary from the id of every bridge to its average
+        BCI.
+
+        >>> averages = FleetBciStats(THREE_BRIDGES).get_average_bcis()
+        >>> sorted(averages)
+        [1, 2, 3]
+        """
+
+        return {bridge_id: stats.mean()
+                for bridge_id, stats in self._stats.items()}
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
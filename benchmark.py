@@ -0,0 +1,708 @@
+"""Benchmarks for the bridge functions on synthetic Ontario-scale data.
+
+For each size, synthetic bridge data is generated offline with
+synthetic_data, every public function of bridge_functions is timed on it,
+and every optimized code path is checked against a plain reference
+implementation. Results are written as JSON so that runs of different
+versions can be compared. The script also measures how much faster
+assign_inspectors is than the original algorithm, on 10000 bridges and
+1000 inspectors by default. Run as a script, e.g.
+
+    python benchmark.py --sizes 100 1000 10000 --output new.json
+    python benchmark.py --sizes 100 1000 10000 --compare old.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from copy import deepcopy
+from io import StringIO
+
+from bci_forecast import FleetForecast, forecast_bridges
+from bci_index import BciIndex
+from batch_updates import apply_updates
+from bridge_functions import (
+    add_rehab, assign_inspectors, calculate_distance, format_data,
+    get_average_bci, get_bridge, get_bridges_containing,
+    get_bridges_in_radius, get_bridges_with_bci_below, get_closest_bridge,
+    get_distance_between, get_inspection_reach, get_total_length_on_hwy,
+    inspect_bridges, np, read_data, PRIORITY_TIERS)
+from bridge_snapshot import load_snapshot, save_snapshot
+from bridge_stream import (
+    stream_bridges_in_radius, stream_formatted, stream_total_length_on_hwy)
+from bridge_table import BridgeTable
+from distance_cache import DistanceCache
+from highway_stats import HighwayStats
+from instrumentation import instrument
+from name_index import NameIndex
+from optimal_assign import assign_inspectors_optimal
+from parallel_format import format_data_parallel
+from route_planning import plan_routes
+from scenarios import evaluate_scenario, run_scenarios, Scenario
+from sharded_assign import assign_inspectors_sharded
+from spatial_index import build_spatial_index, get_bridges_in_radii
+from synthetic_data import (
+    make_bridges, make_inspectors, make_raw_bridges, write_bridge_csv,
+    HIGHWAYS)
+from constants import (
+    ID_INDEX, NAME_INDEX, LAT_INDEX, LON_INDEX, BCIS_INDEX,
+    HIGH_PRIORITY_BCI, MEDIUM_PRIORITY_BCI, LOW_PRIORITY_BCI,
+    HIGH_PRIORITY_RADIUS, MEDIUM_PRIORITY_RADIUS, LOW_PRIORITY_RADIUS)
+
+# Bridge counts benchmarked by default.
+DEFAULT_SIZES = (100, 1000, 10000, 100000, 1000000)
+
+# Each function is called until this many seconds have been spent on it...
+DEFAULT_MIN_TIME = 0.2
+
+# ... or it has been called this many times.
+DEFAULT_MAX_RUNS = 50
+
+# One inspector per this many bridges, up to MAX_INSPECTORS.
+BRIDGES_PER_INSPECTOR = 10
+MAX_INSPECTORS = 1000
+
+# Checks run on at most this many bridges, since the references are slow.
+CHECK_SIZE = 10000
+
+# Queries made for each check.
+CHECK_QUERIES = 3
+
+# The original assign_inspectors does O(I * B**2) work, so it is checked
+# on this many bridges and inspectors only.
+REFERENCE_BRIDGES = 200
+REFERENCE_INSPECTORS = 10
+
+# Size assign_inspectors is compared with the original algorithm at.
+SPEEDUP_BRIDGES = 10000
+SPEEDUP_INSPECTORS = 1000
+
+# Timings more than this many times slower than before are regressions.
+REGRESSION_RATIO = 1.2
+
+# Modules whose import is timed, each in fresh interpreters.
+IMPORT_MODULES = ('bridge_schema', 'bridge_functions')
+
+# Number of fresh interpreters each import is timed in.
+IMPORT_RUNS = 5
+
+
+def reference_get_closest_bridge(bridge_data: list[list],
+                                 bridge_id: int) -> int:
+    """Return the result of get_closest_bridge, computed with the original
+    linear scan over bridge_data.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> reference_get_closest_bridge(THREE_BRIDGES, 2)
+    1
+    """
+
+    target = get_bridge(bridge_data, bridge_id)
+    closest = bridge_data[0] if bridge_data[0] != target else bridge_data[1]
+    for bridge in bridge_data:
+        if (bridge != target and get_distance_between(closest, target)
+                > get_distance_between(bridge, target)):
+            closest = bridge
+
+    return closest[ID_INDEX]
+
+
+def reference_get_bridges_in_radius(bridge_data: list[list], latitude: float,
+                                    longitude: float,
+                                    radius: float) -> list[int]:
+    """Return the result of get_bridges_in_radius, computed with the original
+    linear scan over bridge_data.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> reference_get_bridges_in_radius(THREE_BRIDGES, 43.10, -80.15, 50)
+    [1, 2]
+    """
+
+    return [bridge[ID_INDEX] for bridge in bridge_data
+            if calculate_distance(latitude, longitude, bridge[LAT_INDEX],
+                                  bridge[LON_INDEX]) <= radius]
+
+
+def reference_get_bridges_with_bci_below(bridge_data: list[list],
+                                         bridge_ids: list[int],
+                                         bci: float) -> list[int]:
+    """Return the result of get_bridges_with_bci_below, computed with the
+    original scan that searches bridge_ids for every bridge.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> reference_get_bridges_with_bci_below(THREE_BRIDGES, [1, 2], 72)
+    [2]
+    """
+
+    return [bridge[ID_INDEX] for bridge in bridge_data
+            if bridge[ID_INDEX] in bridge_ids and bridge[BCIS_INDEX][0] <= bci]
+
+
+def get_path_length(bridge_data: list[list], start: list[float],
+                    bridge_ids: list[int]) -> float:
+    """Return the length in kilometers of the path from the (latitude,
+    longitude) location start through the bridges with ids bridge_ids in
+    bridge data bridge_data, in order.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> round(get_path_length(THREE_BRIDGES, [43.10, -80.15], [2, 1]), 3)
+    12.897
+    """
+
+    length = 0
+    lat, lon = start
+    for bridge_id in bridge_ids:
+        bridge = get_bridge(bridge_data, bridge_id)
+        length += calculate_distance(lat, lon, bridge[LAT_INDEX],
+                                     bridge[LON_INDEX])
+        lat, lon = bridge[LAT_INDEX], bridge[LON_INDEX]
+
+    return length
+
+
+def is_valid_assignment(bridge_data: list[list],
+                        inspectors: list[list[float]], max_bridges: int,
+                        assignment: list[list[int]]) -> bool:
+    """Return True if and only if assignment gives each inspector in
+    inspectors at most max_bridges bridges from bridge data bridge_data,
+    each within its inspection reach under PRIORITY_TIERS, and no bridge
+    to two inspectors.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> is_valid_assignment(THREE_BRIDGES, [[43.10, -80.15]], 2, [[1, 2]])
+    True
+    >>> is_valid_assignment(THREE_BRIDGES, [[43.10, -80.15]], 2, [[1, 3]])
+    False
+    """
+
+    assigned = [bridge_id for bridge_ids in assignment
+                for bridge_id in bridge_ids]
+    if (len(assignment) != len(inspectors)
+            or len(set(assigned)) != len(assigned)):
+        return False
+
+    for inspector, bridge_ids in zip(inspectors, assignment):
+        if len(bridge_ids) > max_bridges:
+            return False
+        for bridge_id in bridge_ids:
+            bridge = get_bridge(bridge_data, bridge_id)
+            if (not bridge or calculate_distance(
+                    inspector[0], inspector[1], bridge[LAT_INDEX],
+                    bridge[LON_INDEX])
+                    > get_inspection_reach(bridge, PRIORITY_TIERS)):
+                return False
+
+    return True
+
+
+def count_high_priority(bridge_data: list[list],
+                        assignment: list[list[int]]) -> int:
+    """Return the number of bridges assigned in assignment whose latest
+    BCI in bridge data bridge_data is at most HIGH_PRIORITY_BCI.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> count_high_priority(THREE_BRIDGES, [[1, 2], [3]])
+    0
+    """
+
+    bcis = [get_bridge(bridge_data, bridge_id)[BCIS_INDEX]
+            for bridge_ids in assignment for bridge_id in bridge_ids]
+    return sum(1 for bci in bcis if bci and bci[0] <= HIGH_PRIORITY_BCI)
+
+
+def reference_assign_inspectors(bridge_data: list[list],
+                                inspectors: list[list[float]],
+                                max_bridges: int) -> list[list[int]]:
+    """Return the assignment of assign_inspectors, computed with the original
+    algorithm that rescans bridge_data for every (inspector, bridge) pair.
+
+    >>> from bridge_functions import THREE_BRIDGES
+    >>> reference_assign_inspectors(THREE_BRIDGES,
+    ...                             [[43.20, -80.35], [45.0368, -81.34]], 2)
+    [[1, 2], [3]]
+    """
+
+    id_lst = [bridge[ID_INDEX] for bridge in bridge_data]
+
+    assignment = []
+    for inspector in inspectors:
+        assign_inspector = []
+        count = 0
+        for bridge_id in id_lst:
+            is_high = (bridge_id in get_bridges_in_radius(bridge_data,
+                                                          inspector[0],
+                                                          inspector[1],
+                                                          HIGH_PRIORITY_RADIUS)
+                       and bridge_id
+                       in get_bridges_with_bci_below(bridge_data,
+                                                     id_lst, HIGH_PRIORITY_BCI))
+            is_medium = (bridge_id
+                         in get_bridges_in_radius(bridge_data, inspector[0],
+                                                  inspector[1],
+                                                  MEDIUM_PRIORITY_RADIUS)
+                         and bridge_id
+                         in get_bridges_with_bci_below(bridge_data, id_lst,
+                                                       MEDIUM_PRIORITY_BCI))
+            is_low = (bridge_id
+                      in get_bridges_in_radius(bridge_data, inspector[0],
+                                               inspector[1],
+                                               LOW_PRIORITY_RADIUS)
+                      and bridge_id
+                      in get_bridges_with_bci_below(bridge_data,
+                                                    id_lst, LOW_PRIORITY_BCI))
+
+            if count < max_bridges and (is_high or is_medium or is_low):
+                assign_inspector.append(bridge_id)
+                count += 1
+
+        assignment.append(assign_inspector)
+
+        id_lst = [bid for bid in id_lst if bid not in assign_inspector]
+
+    return assignment
+
+
+def bench_assign_inspectors(num_bridges: int, num_inspectors: int,
+                            max_bridges: int,
+                            reference_bridges: int = REFERENCE_BRIDGES,
+                            reference_inspectors: int = REFERENCE_INSPECTORS,
+                            seed: int = 0) -> dict:
+    """Return the time of assign_inspectors on num_bridges synthetic
+    bridges and num_inspectors inspectors, generated with seed seed, and
+    how much faster it is than the original algorithm. Progress is printed
+    as it goes.
+
+    The original algorithm does O(I * B**2) work, so it is timed on
+    reference_bridges bridges and reference_inspectors inspectors only, and
+    its time at full size is extrapolated from that.
+
+    >>> result = bench_assign_inspectors(20, 2, 3, 10, 1)
+    ... # doctest: +ELLIPSIS
+    assign_inspectors: 20 bridges, 2 inspectors: ...
+    >>> result['same']
+    True
+    """
+
+    bridges = make_bridges(num_bridges, seed)
+    inspectors = make_inspectors(num_inspectors, seed)
+
+    start = time.perf_counter()
+    assign_inspectors(bridges, inspectors, max_bridges)
+    new_time = time.perf_counter() - start
+    print(f'assign_inspectors: {num_bridges} bridges, {num_inspectors} '
+          f'inspectors: {new_time:.3f}s')
+
+    small_bridges = bridges[:reference_bridges]
+    small_inspectors = inspectors[:reference_inspectors]
+    start = time.perf_counter()
+    expected = reference_assign_inspectors(small_bridges, small_inspectors,
+                                           max_bridges)
+    reference_time = time.perf_counter() - start
+    start = time.perf_counter()
+    actual = assign_inspectors(small_bridges, small_inspectors, max_bridges)
+    small_time = time.perf_counter() - start
+    print(f'  at {reference_bridges} bridges, {reference_inspectors} '
+          f'inspectors: original {reference_time:.3f}s, new '
+          f'{small_time:.3f}s, same result: {actual == expected}')
+
+    scale = ((num_bridges / reference_bridges) ** 2
+             * num_inspectors / reference_inspectors)
+    extrapolated = reference_time * scale
+    speedup = extrapolated / new_time if new_time > 0 else None
+    print(f'  original extrapolated to full size: {extrapolated:.0f}s '
+          f'({speedup or 0:.0f}x slower)')
+
+    return {'bridges': num_bridges, 'inspectors': num_inspectors,
+            'seconds': new_time, 'reference_bridges': reference_bridges,
+            'reference_inspectors': reference_inspectors,
+            'reference_seconds': reference_time,
+            'extrapolated_seconds': extrapolated, 'speedup': speedup,
+            'same': actual == expected}
+
+
+def time_function(function, make_args, min_time: float = DEFAULT_MIN_TIME,
+                  max_runs: int = DEFAULT_MAX_RUNS) -> dict:
+    """Return the number of runs and the best and mean time in seconds of
+    calling function(*make_args()) until min_time seconds have been spent
+    in function or it has run max_runs times. make_args is not timed.
+
+    >>> timing = time_function(sorted, lambda: ([3, 1, 2],), max_runs=3)
+    >>> timing['runs']
+    3
+    """
+
+    times = []
+    while not times or (sum(times) < min_time and len(times) < max_runs):
+        args = make_args()
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+
+    return {'runs': len(times), 'best': min(times),
+            'mean': sum(times) / len(times)}
+
+
+def time_import(module: str, runs: int = IMPORT_RUNS) -> dict:
+    """Return the number of runs and the best and mean time in seconds of
+    importing the module named module in a fresh interpreter, as reported
+    by python -X importtime, over runs runs. One untimed run first writes
+    the bytecode cache, so that compiling the source is not timed.
+
+    >>> time_import('bridge_schema', 2)['runs']
+    2
+    """
+
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    times = []
+    for _ in range(runs + 1):
+        completed = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, env=env, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)))
+        # The line for module itself comes last, after its imports.
+        lines = [line for line in completed.stderr.splitlines()
+                 if line.split('|')[-1].strip() == module]
+        times.append(int(lines[-1].split('|')[1]) / 1e6)
+    times = times[1:]
+
+    return {'runs': len(times), 'best': min(times),
+            'mean': sum(times) / len(times)}
+
+
+def time_functions(size: int, seed: int, max_bridges: int, min_time: float,
+                   max_runs: int) -> tuple[dict[str, dict], list[list]]:
+    """Return a dictionary from the name of each public function of
+    bridge_functions to its timing on size synthetic bridges generated with
+    seed seed, and the formatted bridges.
+
+    """
+
+    rows = make_raw_bridges(size, seed)
+    csv_file = StringIO()
+    write_bridge_csv(csv_file, rows)
+    text = csv_file.getvalue()
+    del rows, csv_file
+
+    timings = {}
+    # The lambdas hold their own reference to text, so that deleting it
+    # below frees the CSV text once they are gone.
+    timings['read_data'] = time_function(
+        read_data, lambda text=text: (StringIO(text),), min_time, max_runs)
+    timings['format_data'] = time_function(
+        format_data, lambda text=text: (read_data(StringIO(text)),),
+        min_time, max_runs)
+    bridges = read_data(StringIO(text))
+    del text
+    format_data(bridges)
+
+    rng = random.Random(seed)
+    ids = [bridge[ID_INDEX] for bridge in bridges]
+    inspectors = make_inspectors(
+        max(1, min(size // BRIDGES_PER_INSPECTOR, MAX_INSPECTORS)), seed)
+
+    def location() -> tuple[float, float]:
+        bridge = rng.choice(bridges)
+        return bridge[LAT_INDEX], bridge[LON_INDEX]
+
+    calls = {
+        'get_bridge': (get_bridge, lambda: (bridges, rng.choice(ids))),
+        'get_average_bci': (get_average_bci,
+                            lambda: (bridges, rng.choice(ids))),
+        'get_total_length_on_hwy': (get_total_length_on_hwy,
+                                    lambda: (bridges, rng.choice(HIGHWAYS))),
+        'get_distance_between': (get_distance_between,
+                                 lambda: (rng.choice(bridges),
+                                          rng.choice(bridges))),
+        'get_closest_bridge': (get_closest_bridge,
+                               lambda: (bridges, rng.choice(ids))),
+        'get_bridges_in_radius': (get_bridges_in_radius,
+                                  lambda: (bridges, *location(), 25)),
+        'get_bridges_with_bci_below': (get_bridges_with_bci_below,
+                                       lambda: (bridges, ids, 60)),
+        'get_bridges_containing': (get_bridges_containing,
+                                   lambda: (bridges, 'creek')),
+        'assign_inspectors': (assign_inspectors,
+                              lambda: (bridges, inspectors, max_bridges)),
+        'inspect_bridges': (inspect_bridges,
+                            lambda: (bridges, rng.sample(ids, min(10, size)),
+                                     '09/15/2018', 71.9)),
+        'add_rehab': (add_rehab, lambda: (bridges, rng.choice(ids),
+                                          '09/15/2018', True)),
+    }
+    for name, (function, make_args) in calls.items():
+        timings[name] = time_function(function, make_args, min_time,
+                                      max_runs)
+
+    return timings, bridges
+
+
+def check_functions(bridges: list[list], seed: int,
+                    max_bridges: int) -> dict[str, bool]:
+    """Return a dictionary from the name of each optimized code path to
+    whether it gave the same results as its reference implementation on the
+    formatted bridges bridges, generated with seed seed.
+
+    """
+
+    rng = random.Random(seed)
+    bridges = deepcopy(bridges[:CHECK_SIZE])
+    ids = [bridge[ID_INDEX] for bridge in bridges]
+    checks = {}
+
+    index = build_spatial_index(bridges)
+    same = True
+    for _ in range(CHECK_QUERIES):
+        bridge = rng.choice(bridges)
+        lat, lon, radius = bridge[LAT_INDEX], bridge[LON_INDEX], 25
+        expected = reference_get_bridges_in_radius(bridges, lat, lon, radius)
+        same = (same
+                and get_bridges_in_radius(bridges, lat, lon, radius)
+                == expected
+                and index.bridges_in_radius(lat, lon, radius) == expected
+                and list(stream_bridges_in_radius(iter(bridges), lat, lon,
+                                                  radius, 1000)) == expected)
+    checks['bridges_in_radius'] = same
+
+    same = True
+    if len(bridges) >= 2:
+        for bridge_id in rng.sample(ids, min(CHECK_QUERIES, len(ids))):
+            expected = reference_get_closest_bridge(bridges, bridge_id)
+            same = (same and get_closest_bridge(bridges, bridge_id) == expected
+                    and index.closest_bridge(bridge_id) == expected)
+    checks['closest_bridge'] = same
+
+    bci_index = BciIndex(bridges)
+    subset = rng.sample(ids, len(ids) // 2)
+    checks['bridges_with_bci_below'] = all(
+        get_bridges_with_bci_below(bridges, subset, bci)
+        == reference_get_bridges_with_bci_below(bridges, subset, bci)
+        == bci_index.get_bridges_with_bci_below(bci, subset)
+        for bci in (HIGH_PRIORITY_BCI, MEDIUM_PRIORITY_BCI))
+
+    cache = DistanceCache(bridges)
+    sample = rng.sample(ids, min(CHECK_QUERIES, len(ids)))
+    pairs = [(i, j) for i in sample for j in sample if i < j]
+    checks['distance_cache'] = (
+        len(bridges) < 2
+        or all(cache.get_closest_bridge(bridge_id)
+               == reference_get_closest_bridge(bridges, bridge_id)
+               for bridge_id in sample)
+        and cache.get_condensed_matrix(sorted(sample))
+        == [get_distance_between(get_bridge(bridges, i),
+                                 get_bridge(bridges, j))
+            for i, j in sorted(pairs)])
+
+    queries = [(bridge[LAT_INDEX], bridge[LON_INDEX], radius)
+               for bridge in rng.sample(bridges, min(CHECK_QUERIES,
+                                                     len(bridges)))
+               for radius in (0, 10, 100)]
+    expected = [reference_get_bridges_in_radius(bridges, *query)
+                for query in queries]
+    checks['bridges_in_radii'] = (
+        get_bridges_in_radii(bridges, queries) == expected
+        and get_bridges_in_radii(bridges, queries, index=index) == expected
+        and index.bridges_in_radii(queries, counts_only=True)
+        == [len(found) for found in expected])
+
+    with instrument() as stats:
+        found = get_bridges_in_radius(bridges, *queries[0])
+    checks['instrumentation'] = (
+        found == expected[0]
+        and stats.get_stats('get_bridges_in_radius').calls == 1)
+
+    names = NameIndex(bridges)
+    checks['bridges_containing'] = all(
+        get_bridges_containing(bridges, search) == names.search(search)
+        == [bridge[ID_INDEX] for bridge in bridges
+            if search.lower() in bridge[NAME_INDEX].lower()]
+        for search in ('creek', 'St', 'under'))
+
+    stats = HighwayStats(bridges)
+    checks['total_length_on_hwy'] = all(
+        get_total_length_on_hwy(bridges, highway)
+        == stats.get_total_length(highway)
+        == stream_total_length_on_hwy(iter(bridges), highway)
+        for highway in HIGHWAYS)
+
+    small = bridges[:REFERENCE_BRIDGES]
+    inspectors = make_inspectors(REFERENCE_INSPECTORS, seed)
+    assignment = assign_inspectors(small, inspectors, max_bridges)
+    checks['assign_inspectors'] = assignment == reference_assign_inspectors(
+        small, inspectors, max_bridges)
+
+    routes = plan_routes(small, inspectors, assignment, workers=1)
+    checks['plan_routes'] = all(
+        sorted(route.bridge_ids) == sorted(bridge_ids) and not route.skipped
+        and abs(route.length - get_path_length(small, inspector,
+                                               route.bridge_ids)) < 0.01
+        for inspector, bridge_ids, route in zip(inspectors, assignment,
+                                                routes))
+
+    optimal = assign_inspectors_optimal(small, inspectors, max_bridges)
+    checks['assign_inspectors_optimal'] = (
+        is_valid_assignment(small, inspectors, max_bridges, optimal)
+        and count_high_priority(small, optimal)
+        >= count_high_priority(small, assignment))
+
+    inspectors = make_inspectors(
+        max(1, min(len(bridges) // BRIDGES_PER_INSPECTOR, MAX_INSPECTORS)),
+        seed)
+    checks['assign_inspectors_sharded'] = (
+        assign_inspectors_sharded(bridges, inspectors, max_bridges,
+                                  workers=0)
+        == assign_inspectors(bridges, inspectors, max_bridges))
+
+    scenarios = [Scenario('default', inspectors, max_bridges),
+                 Scenario('wide', inspectors[:len(inspectors) // 2 + 1],
+                          max_bridges * 2, tuple(
+                              (radius * 2, bci)
+                              for radius, bci in PRIORITY_TIERS))]
+    checks['scenarios'] = (
+        sorted(run_scenarios(bridges, scenarios, workers=1))
+        == sorted(evaluate_scenario(bridges, scenario)
+                  for scenario in scenarios))
+
+    raw = make_raw_bridges(len(bridges), seed)
+    formatted = deepcopy(raw)
+    format_data(formatted)
+    parallel = deepcopy(raw)
+    format_data_parallel(parallel, chunk_size=max(1, len(raw) // 4))
+    checks['format_data'] = (
+        parallel == formatted
+        == list(stream_formatted(deepcopy(raw)))
+        == BridgeTable.from_raw(raw).to_records())
+
+    inspections = [(rng.choice(ids) + rng.choice((0, 0, 0, len(ids))),
+                    '09/15/2018', round(rng.uniform(20, 95), 1))
+                   for _ in range(CHECK_QUERIES * 10)]
+    rehabs = [(rng.choice(ids), '09/15/2018', rng.random() < 0.5)
+              for _ in range(CHECK_QUERIES * 10)]
+    batched = deepcopy(bridges)
+    apply_updates(batched, inspections, rehabs)
+    for bridge_id, date, bci in inspections:
+        inspect_bridges(bridges, [bridge_id], date, bci)
+    for bridge_id, date, major in rehabs:
+        add_rehab(bridges, bridge_id, date, major)
+    checks['apply_updates'] = batched == bridges
+
+    forecast_data = deepcopy(bridges)
+    fleet = FleetForecast(forecast_data)
+    for bridge_id, date, bci in inspections:
+        inspect_bridges(forecast_data, [bridge_id], date, bci)
+    checks['forecasts'] = fleet.get_forecasts() == dict(zip(
+        (bridge[ID_INDEX] for bridge in forecast_data),
+        forecast_bridges(forecast_data)))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bridges.snapshot')
+        save_snapshot(bridges, path)
+        checks['snapshot'] = load_snapshot(path).to_records() == bridges
+
+    return checks
+
+
+def run_benchmarks(sizes: list[int], seed: int = 0, max_bridges: int = 10,
+                   min_time: float = DEFAULT_MIN_TIME,
+                   max_runs: int = DEFAULT_MAX_RUNS) -> dict:
+    """Return the timings and checks for synthetic data of each size in
+    sizes, generated with seed seed, in the JSON format written by this
+    script. Progress is printed as it goes.
+
+    """
+
+    results = {'python': platform.python_version(),
+               'platform': platform.platform(), 'numpy': bool(np),
+               'seed': seed, 'max_bridges': max_bridges,
+               'timings': [], 'checks': []}
+    for module in IMPORT_MODULES:
+        timing = time_import(module)
+        results['timings'].append({'function': f'import {module}',
+                                   'size': 0, **timing})
+        print(f'{0:>9} {"import " + module:<28} {timing["best"]:12.6f}s '
+              f'({timing["runs"]} runs)')
+
+    for size in sizes:
+        timings, bridges = time_functions(size, seed, max_bridges, min_time,
+                                          max_runs)
+        for name, timing in timings.items():
+            results['timings'].append({'function': name, 'size': size,
+                                       **timing})
+            print(f'{size:>9} {name:<28} {timing["best"]:12.6f}s '
+                  f'({timing["runs"]} runs)')
+
+        checks = check_functions(bridges, seed, max_bridges)
+        del bridges
+        for name, passed in checks.items():
+            results['checks'].append({'check': name, 'size': size,
+                                      'passed': passed})
+            print(f'{size:>9} check {name:<25} '
+                  f'{"ok" if passed else "FAILED"}')
+
+    return results
+
+
+def compare_results(old: dict, new: dict) -> list[str]:
+    """Return a line of text for each function and size timed in both of
+    the benchmark results old and new, comparing their best times.
+
+    >>> old = {'timings': [{'function': 'f', 'size': 10, 'best': 1.0}]}
+    >>> new = {'timings': [{'function': 'f', 'size': 10, 'best': 1.5}]}
+    >>> compare_results(old, new)
+    ['       10 f                              1.50x REGRESSION']
+    """
+
+    before = {(timing['function'], timing['size']): timing['best']
+              for timing in old['timings']}
+    lines = []
+    for timing in new['timings']:
+        key = (timing['function'], timing['size'])
+        if key in before and before[key] > 0:
+            ratio = timing['best'] / before[key]
+            flag = ' REGRESSION' if ratio > REGRESSION_RATIO else ''
+            lines.append(f'{timing["size"]:>9} {timing["function"]:<28} '
+                         f'{ratio:6.2f}x{flag}')
+
+    return lines
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=list(DEFAULT_SIZES))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-bridges', type=int, default=10)
+    parser.add_argument('--min-time', type=float, default=DEFAULT_MIN_TIME)
+    parser.add_argument('--max-runs', type=int, default=DEFAULT_MAX_RUNS)
+    parser.add_argument('--output', help='write the results to this file')
+    parser.add_argument('--compare', help='compare with results in this file')
+    parser.add_argument('--speedup-bridges', type=int,
+                        default=SPEEDUP_BRIDGES,
+                        help='0 to skip comparing assign_inspectors with the '
+                        'original algorithm')
+    parser.add_argument('--speedup-inspectors', type=int,
+                        default=SPEEDUP_INSPECTORS)
+    args = parser.parse_args()
+
+    RESULTS = run_benchmarks(args.sizes, args.seed, args.max_bridges,
+                             args.min_time, args.max_runs)
+    if args.speedup_bridges > 0:
+        RESULTS['assign_speedup'] = bench_assign_inspectors(
+            args.speedup_bridges, args.speedup_inspectors, args.max_bridges,
+            seed=args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(RESULTS, output_file, indent=1)
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as compare_file:
+            print('\n'.join(compare_results(json.load(compare_file),
+                                            RESULTS)))
+    if not all(check['passed'] for check in RESULTS['checks']):
+        sys.exit(1)
@@ -15,26 +15,110 @@ Sharmin, and Jacqueline Smith
 
 """
 
-import csv
+import sys
 from copy import deepcopy
-from math import sin, cos, asin, radians, sqrt, inf
-from typing import TextIO
-
+from importlib.machinery import PathFinder
+from io import TextIOBase
+from itertools import islice
+from math import sin, cos, asin, radians, degrees, sqrt, inf
+from weakref import WeakSet
+
+# Checks constants once, and raises a SchemaError saying what is wrong if it
+# is missing or inconsistent.
+from bridge_schema import SCHEMA
 from constants import (
     ID_INDEX, NAME_INDEX, HIGHWAY_INDEX, LAT_INDEX,
-    LON_INDEX, YEAR_INDEX, LAST_MAJOR_INDEX,
+    LON_INDEX, LAST_MAJOR_INDEX,
     LAST_MINOR_INDEX, NUM_SPANS_INDEX,
     SPAN_DETAILS_INDEX, LENGTH_INDEX,
     LAST_INSPECTED_INDEX, BCIS_INDEX, FROM_SEP, TO_SEP,
-    HIGH_PRIORITY_BCI, MEDIUM_PRIORITY_BCI,
-    LOW_PRIORITY_BCI, HIGH_PRIORITY_RADIUS,
-    MEDIUM_PRIORITY_RADIUS, LOW_PRIORITY_RADIUS,
     EARTH_RADIUS)
 EPSILON = 0.01
 
+# calculate_distance rounds to the nearest meter, so a bridge slightly
+# outside a radius can still be reported as inside it. Distance bounds used
+# for pruning are widened by this many kilometers to keep such bridges.
+ROUNDING_SLACK = 0.001
+
+# (radius, BCI) pairs for the high, medium and low inspection priorities.
+PRIORITY_TIERS = SCHEMA.priority_tiers
+
+# Span details look like 'Total=64  (1)=12;(2)=19;(3)=21;(4)=12;'. The
+# patterns matching the spans and the total are compiled on first use by
+# get_span_patterns, since importing re is slow.
+_span_patterns = []
+
+# Largest difference, in meters, allowed between the sum of a bridge's spans
+# and the total given in its span details.
+SPAN_TOTAL_TOLERANCE = 0.05
+
+# Objects told about changes to bridge data; see watch_bridge_data.
+_watchers = WeakSet()
+
+# Queries over at least this many bridges compute their distances in one
+# NumPy call, when NumPy is installed.
+BATCH_THRESHOLD = 64
+
+
+class _LazyModule:
+    """A module that is only imported when it is first used. It is false
+    if importing it fails, so code can test it before using it.
+
+    >>> bool(_LazyModule('no_such_module'))
+    False
+    >>> _LazyModule('math').sqrt(4.0)
+    2.0
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize a new stand-in for the module named name."""
+
+        self._name = name
+        self._module = None
+        self._failed = False
+
+    def __bool__(self) -> bool:
+        """Return whether the module can be imported, importing it first
+        if need be.
+
+        """
+
+        if self._module is None and not self._failed:
+            try:
+                __import__(self._name)
+            except ImportError:
+                # Installed but broken, e.g. built for another Python.
+                self._failed = True
+            else:
+                self._module = sys.modules[self._name]
+
+        return self._module is not None
+
+    def __getattr__(self, name: str):
+        """Return the attribute name of the module, importing it first if
+        need be. Raise an AttributeError, as for any missing attribute, if
+        the module cannot be imported.
+
+        """
+
+        if not self:
+            raise AttributeError(f'{self._name} cannot be imported, so it '
+                                 f'has no attribute {name!r}')
+        value = getattr(self._module, name)
+        setattr(self, name, value)
+        return value
+
+
+# NumPy, or None if it is not installed. Importing NumPy takes longer than
+# everything else here, so it is only imported once it is used, and np is
+# false if that fails: test it with "if np" rather than "is None".
+np = sys.modules.get('numpy')
+if np is None and PathFinder.find_spec('numpy') is not None:
+    np = _LazyModule('numpy')
+
 
 # We provide this function for you to use as a helper.
-def read_data(csv_file: TextIO) -> list[list[str]]:
+def read_data(csv_file: TextIOBase) -> list[list[str]]:
     """Read and return the contents of the open CSV file csv_file as a
     list of lists, where each inner list contains the values from one
     line of csv_file.
@@ -43,8 +127,11 @@ def read_data(csv_file: TextIO) -> list[list[str]]:
 
     """
 
+    # Imported here, since only reading CSV files needs it.
+    import csv
+
     lines = csv.reader(csv_file)
-    return list(lines)[2:]
+    return list(islice(lines, 2, None))
 
 
 # We provide this function for you to use as a helper.  This function
@@ -78,6 +165,82 @@ def calculate_distance(lat1: float, lon1: float,
     return round(2 * EARTH_RADIUS * asin(sqrt(haversine)), 3)
 
 
+def calculate_distances(lats, lons, lat: float, lon: float):
+    """Return the distances in kilometers from the location (lat, lon) to each
+    of the locations (lats[i], lons[i]), rounded to the nearest meter.
+
+    If NumPy is installed, the distances are computed in one vectorized call
+    and returned as an array; otherwise they are returned as a list. In
+    either case they agree with calculate_distance to within floating point
+    error.
+
+    >>> distances = calculate_distances([43.657129, 53.32],
+    ...                                 [-79.399439, -113.30],
+    ...                                 43.659777, -79.397383)
+    >>> [float(distance) for distance in distances]
+    [0.338, 2687.359]
+    """
+
+    if not np:
+        return [calculate_distance(lat, lon, lats[i], lons[i])
+                for i in range(len(lats))]
+
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = (np.radians(np.asarray(lats, dtype=float)),
+                  np.radians(np.asarray(lons, dtype=float)))
+
+    haversine = (np.sin((lat2 - lat1) / 2) ** 2
+                 + np.cos(lat1) * np.cos(lat2)
+                 * np.sin((lon2 - lon1) / 2) ** 2)
+
+    return np.round(2 * EARTH_RADIUS * np.arcsin(np.sqrt(haversine)), 3)
+
+
+def calculate_distance_matrix(lats1, lons1, lats2, lons2):
+    """Return the matrix of distances in kilometers between the locations
+    (lats1[i], lons1[i]) and (lats2[j], lons2[j]), rounded to the nearest
+    meter, with one row per location in lats1 and lons1.
+
+    The result is a NumPy array if NumPy is installed, and a list of lists
+    otherwise.
+
+    >>> matrix = calculate_distance_matrix([43.659777, 43.42],
+    ...                                    [-79.397383, -79.24],
+    ...                                    [43.657129, 53.32],
+    ...                                    [-79.399439, -113.30])
+    >>> float(matrix[0][0]), float(matrix[1][1])
+    (0.338, 2713.226)
+    """
+
+    if not np:
+        return [calculate_distances(lats2, lons2, lats1[i], lons1[i])
+                for i in range(len(lats1))]
+
+    lats1 = np.asarray(lats1, dtype=float)
+    lons1 = np.asarray(lons1, dtype=float)
+    return calculate_distances(lats2, lons2, lats1[:, np.newaxis],
+                               lons1[:, np.newaxis])
+
+
+def get_bridge_coordinates(bridge_data: list[list]) -> tuple:
+    """Return the latitudes and longitudes of the bridges in bridge data
+    bridge_data, as NumPy arrays if NumPy is installed and lists otherwise.
+
+    >>> lats, lons = get_bridge_coordinates(THREE_BRIDGES)
+    >>> list(lats) == [43.167233, 43.164531, 45.036739]
+    True
+    """
+
+    if not np:
+        return ([bridge[LAT_INDEX] for bridge in bridge_data],
+                [bridge[LON_INDEX] for bridge in bridge_data])
+
+    return (np.fromiter((bridge[LAT_INDEX] for bridge in bridge_data),
+                        float, len(bridge_data)),
+            np.fromiter((bridge[LON_INDEX] for bridge in bridge_data),
+                        float, len(bridge_data)))
+
+
 # We provide this sample data to help you set up example calls.
 THREE_BRIDGES_UNCLEANED = [
     ['1 -  32/', 'Highway 24 Underpass at Highway 403', '403', '43.167233',
@@ -115,6 +278,10 @@ def get_bridge(bridge_data: list[list], bridge_id: int) -> list:
     """Return the data for the bridge with id bridge_id from bridge data
     bridge_data. If there is no bridge with id bridge_id, return [].
 
+    The lookup takes constant time if bridge_data keeps an id index, like a
+    bridge_lookup.BridgeList, or if the bridge is at position bridge_id - 1,
+    as in data formatted by format_data. Otherwise bridge_data is scanned.
+
     >>> result = get_bridge(THREE_BRIDGES, 1)
     >>> result == [
     ...    1, 'Highway 24 Underpass at Highway 403', '403', 43.167233,
@@ -124,12 +291,26 @@ def get_bridge(bridge_data: list[list], bridge_id: int) -> list:
     True
     >>> get_bridge(THREE_BRIDGES, 42)
     []
+    >>> get_bridge(THREE_BRIDGES, 0)
+    []
+    >>> get_bridge(THREE_BRIDGES[1:], 3)[NAME_INDEX]
+    'STOKES RIVER BRIDGE'
 
     """
 
-    if bridge_id - 1 < len(bridge_data):
+    by_id = getattr(bridge_data, 'by_id', None)
+    if by_id is not None:
+        return by_id.get(bridge_id, [])
+
+    # Data formatted by format_data has each bridge at position id - 1.
+    if (0 < bridge_id <= len(bridge_data)
+            and bridge_data[bridge_id - 1][ID_INDEX] == bridge_id):
         return bridge_data[bridge_id - 1]
 
+    for bridge in bridge_data:
+        if bridge[ID_INDEX] == bridge_id:
+            return bridge
+
     return []
 
 
@@ -144,14 +325,9 @@ def get_average_bci(bridge_data: list[list], bridge_id: int) -> float:
     >>> get_average_bci (THREE_BRIDGES, 42)
     0
     """
-    if (bridge_id - 1 < len(bridge_data)
-            and isinstance(bridge_data[bridge_id - 1][BCIS_INDEX], list)):
-        total = 0
-        num_bci = 0
-        for num in bridge_data[bridge_id - 1][BCIS_INDEX]:
-            total += num
-            num_bci += 1
-        return total / num_bci
+    bridge = get_bridge(bridge_data, bridge_id)
+    if bridge and bridge[BCIS_INDEX]:
+        return sum(bridge[BCIS_INDEX]) / len(bridge[BCIS_INDEX])
 
     return 0
 
@@ -216,18 +392,33 @@ def get_closest_bridge(bridge_data: list[list], bridge_id: int) -> int:
 
     >>> get_closest_bridge(THREE_BRIDGES, 1)
     2
+    >>> get_closest_bridge(THREE_BRIDGES[1:], 3)
+    2
     """
-    if bridge_data[bridge_id - 1] != bridge_data[0]:
-        closest_bridge = bridge_data[0]
-    else:
-        closest_bridge = bridge_data[1]
-
-    for bridge in bridge_data:
-        if (bridge != bridge_data[bridge_id - 1]
-            and get_distance_between(closest_bridge,
-                                     bridge_data[bridge_id - 1])
-                > get_distance_between(bridge, bridge_data[bridge_id - 1])):
-            closest_bridge = bridge
+    target = get_bridge(bridge_data, bridge_id)
+    closest_bridge = None
+    closest_distance = inf
+
+    candidates = bridge_data
+    if np and len(bridge_data) >= BATCH_THRESHOLD:
+        lats, lons = get_bridge_coordinates(bridge_data)
+        distances = calculate_distances(lats, lons, target[LAT_INDEX],
+                                        target[LON_INDEX])
+        ids = np.fromiter((bridge[ID_INDEX] for bridge in bridge_data),
+                          int, len(bridge_data))
+        distances[ids == bridge_id] = inf
+        # Only bridges this close to the batched minimum can be the closest
+        # once their distances are recomputed exactly.
+        bound = distances.min() + 2 * ROUNDING_SLACK
+        candidates = [bridge_data[i]
+                      for i in np.flatnonzero(distances <= bound).tolist()]
+
+    for bridge in candidates:
+        if bridge[ID_INDEX] != bridge_id:
+            distance = get_distance_between(bridge, target)
+            if distance < closest_distance:
+                closest_bridge = bridge
+                closest_distance = distance
 
     return closest_bridge[ID_INDEX]
 
@@ -250,6 +441,16 @@ def get_bridges_in_radius(bridge_data: list[list], latitude: float,
     [1, 2, 3]
     """
     id_list = []
+    if np and len(bridge_data) >= BATCH_THRESHOLD:
+        lats, lons = get_bridge_coordinates(bridge_data)
+        distances = calculate_distances(lats, lons, latitude, longitude)
+        for i in np.flatnonzero(distances <= radius + ROUNDING_SLACK).tolist():
+            if (distances[i] < radius - ROUNDING_SLACK
+                    or calculate_distance(latitude, longitude, lats[i],
+                                          lons[i]) <= radius):
+                id_list.append(bridge_data[i][ID_INDEX])
+        return id_list
+
     for bridge in bridge_data:
         if calculate_distance(latitude, longitude, bridge[LAT_INDEX],
                               bridge[LON_INDEX]) <= radius:
@@ -278,6 +479,7 @@ def get_bridges_with_bci_below(bridge_data: list[list],
     >>> get_bridges_with_bci_below(THREE_BRIDGES, [], 85.2)
     []
     """
+    bridge_id = set(bridge_id)
     bci_below = []
     for bridge in bridge_data:
         if bridge[ID_INDEX] in bridge_id and bridge[BCIS_INDEX][0] <= bci:
@@ -341,46 +543,226 @@ def assign_inspectors(bridge_data: list[list], inspectors: list[list[float]],
 
     """
 
-    id_lst = [bridge[ID_INDEX] for bridge in bridge_data]
+    return assign_inspectors_with_tiers(bridge_data, inspectors, max_bridges,
+                                        PRIORITY_TIERS)
+
+
+def get_inspection_reach(bridge: list,
+                         tiers: tuple[tuple[float, float], ...]) -> float:
+    """Return the largest distance in kilometers from which an inspector can
+    be assigned the bridge bridge under the (radius, BCI) priority tiers
+    tiers, or -1 if no tier covers the bridge's most recent BCI.
+
+    >>> get_inspection_reach(THREE_BRIDGES[0], ((500, 60), (100, 100)))
+    100
+    >>> get_inspection_reach(THREE_BRIDGES[0], ((500, 60),))
+    -1
+    """
+
+    reach = -1
+    if bridge[BCIS_INDEX]:
+        for radius, bci in tiers:
+            if bridge[BCIS_INDEX][0] <= bci and radius > reach:
+                reach = radius
+
+    return reach
+
+
+def assign_inspectors_with_tiers(bridge_data: list[list],
+                                 inspectors: list[list[float]],
+                                 max_bridges: int,
+                                 tiers: tuple[tuple[float, float], ...]
+                                 ) -> list[list[int]]:
+    """Return the inspector assignment of assign_inspectors for bridge data
+    bridge_data, inspectors inspectors and at most max_bridges bridges per
+    inspector, using the (radius, BCI) priority tiers tiers.
+
+    A bridge can go to an inspector if, for some tier, the bridge is within
+    the tier's radius of the inspector and its most recent BCI is at most the
+    tier's BCI. Each inspector takes the first max_bridges such bridges, in
+    the order of bridge_data, that no earlier inspector has taken.
+
+    >>> assign_inspectors_with_tiers(THREE_BRIDGES, [[43.10, -80.15]], 3,
+    ...                              ((250, 100),))
+    [[1, 2, 3]]
+    """
+
+    reaches = [get_inspection_reach(bridge, tiers) for bridge in bridge_data]
+    if np and len(bridge_data) >= BATCH_THRESHOLD:
+        return _assign_inspectors_batched(bridge_data, inspectors,
+                                          max_bridges, reaches)
+
+    # No bridge more than lat_limits[i] degrees of latitude away from an
+    # inspector can be within reach of them.
+    lat_limits = [degrees((reach + ROUNDING_SLACK) / EARTH_RADIUS)
+                  for reach in reaches]
+    remaining = [i for i in range(len(bridge_data)) if reaches[i] >= 0]
 
     assignment = []
     for inspector in inspectors:
         assign_inspector = []
-        count = 0
-        for bridge_id in id_lst:
-            is_high = (bridge_id in get_bridges_in_radius(bridge_data,
-                                                          inspector[0],
-                                                          inspector[1],
-                                                          HIGH_PRIORITY_RADIUS)
-                       and bridge_id
-                       in get_bridges_with_bci_below(bridge_data,
-                                                     id_lst, HIGH_PRIORITY_BCI))
-            is_medium = (bridge_id
-                         in get_bridges_in_radius(bridge_data, inspector[0],
-                                                  inspector[1],
-                                                  MEDIUM_PRIORITY_RADIUS)
-                         and bridge_id
-                         in get_bridges_with_bci_below(bridge_data, id_lst,
-                                                       MEDIUM_PRIORITY_BCI))
-            is_low = (bridge_id
-                      in get_bridges_in_radius(bridge_data, inspector[0],
-                                               inspector[1],
-                                               LOW_PRIORITY_RADIUS)
-                      and bridge_id
-                      in get_bridges_with_bci_below(bridge_data,
-                                                    id_lst, LOW_PRIORITY_BCI))
-
-            if count < max_bridges and (is_high or is_medium or is_low):
-                assign_inspector.append(bridge_id)
-                count += 1
-
-        assignment.append(assign_inspector)
-
-        id_lst = [bid for bid in id_lst if bid not in assign_inspector]
+        if max_bridges > 0:
+            latitude, longitude = inspector[0], inspector[1]
+            for i in remaining:
+                bridge = bridge_data[i]
+                if (abs(bridge[LAT_INDEX] - latitude) <= lat_limits[i]
+                        and calculate_distance(latitude, longitude,
+                                               bridge[LAT_INDEX],
+                                               bridge[LON_INDEX])
+                        <= reaches[i]):
+                    assign_inspector.append(i)
+                    if len(assign_inspector) == max_bridges:
+                        break
+
+        if assign_inspector:
+            assigned = set(assign_inspector)
+            remaining = [i for i in remaining if i not in assigned]
+        assignment.append([bridge_data[i][ID_INDEX]
+                           for i in assign_inspector])
 
     return assignment
 
 
+def _assign_inspectors_batched(bridge_data: list[list],
+                               inspectors: list[list[float]],
+                               max_bridges: int,
+                               reaches: list[float]) -> list[list[int]]:
+    """Return the result of assign_inspectors_with_tiers for bridge data
+    bridge_data, inspectors inspectors and at most max_bridges bridges per
+    inspector, where reaches[i] is the inspection reach of bridge_data[i].
+    Distances from each inspector are computed in one NumPy call.
+
+    Precondition: NumPy is installed.
+
+    """
+
+    lats, lons = get_bridge_coordinates(bridge_data)
+    reaches = np.array(reaches, dtype=float)
+    remaining = np.flatnonzero(reaches >= 0)
+
+    assignment = []
+    for inspector in inspectors:
+        assign_inspector = []
+        if max_bridges > 0 and len(remaining) > 0:
+            latitude, longitude = inspector[0], inspector[1]
+            distances = calculate_distances(lats[remaining], lons[remaining],
+                                            latitude, longitude)
+            limits = reaches[remaining]
+            for j in np.flatnonzero(
+                    distances <= limits + ROUNDING_SLACK).tolist():
+                i = int(remaining[j])
+                if (distances[j] < limits[j] - ROUNDING_SLACK
+                        or calculate_distance(latitude, longitude, lats[i],
+                                              lons[i]) <= limits[j]):
+                    assign_inspector.append(i)
+                    if len(assign_inspector) == max_bridges:
+                        break
+
+        if assign_inspector:
+            remaining = remaining[np.isin(remaining, assign_inspector,
+                                          invert=True)]
+        assignment.append([bridge_data[i][ID_INDEX]
+                           for i in assign_inspector])
+
+    return assignment
+
+
+def watch_bridge_data(watcher) -> None:
+    """Register watcher to be told about changes to bridge data. After
+    inspect_bridges or add_rehab changes bridge data bridge_data, or after
+    notify_bridges_changed is called, watcher.bridges_changed(bridge_data,
+    bridge_ids) is called with the ids of the changed bridges.
+
+    Only a weak reference to watcher is kept, so watching bridge data does
+    not keep watcher alive.
+
+    """
+
+    _watchers.add(watcher)
+
+
+def unwatch_bridge_data(watcher) -> None:
+    """Stop telling watcher about changes to bridge data."""
+
+    _watchers.discard(watcher)
+
+
+def notify_bridges_changed(bridge_data: list[list],
+                           bridge_ids: list[int]) -> None:
+    """Tell every registered watcher that the bridges with ids in bridge_ids
+    in bridge data bridge_data have changed. Call this after changing bridge
+    records other than through inspect_bridges and add_rehab.
+
+    """
+
+    for watcher in list(_watchers):
+        watcher.bridges_changed(bridge_data, bridge_ids)
+
+
+class BridgeWatcher:
+    """Something computed from some bridge data and kept up to date as the
+    bridge data changes.
+
+    A subclass computes everything from scratch in refresh, after calling
+    BridgeWatcher.refresh, and updates the changed bridges in
+    update_bridges. bridges_changed finds the changed bridges by id and
+    calls update_bridges with their positions, or refresh if a bridge is
+    not where it was, since bridges were added or removed.
+
+    """
+
+    def __init__(self, bridge_data: list[list]) -> None:
+        """Initialize a new watcher of the bridge data bridge_data, compute
+        everything from it, and start watching it for changes.
+
+        """
+
+        self.bridge_data = bridge_data
+        self._positions = {}
+        self.refresh()
+        watch_bridge_data(self)
+
+    def refresh(self) -> None:
+        """Find the position of every bridge from scratch. Call this after
+        adding or removing bridges.
+
+        """
+
+        self._positions = {}
+        for pos in range(len(self.bridge_data)):
+            self._positions[self.bridge_data[pos][ID_INDEX]] = pos
+
+    def bridges_changed(self, bridge_data: list[list],
+                        bridge_ids: list[int]) -> None:
+        """Update this watcher for the bridges with ids in bridge_ids in
+        bridge data bridge_data. Changes to other bridge data are ignored.
+
+        """
+
+        if bridge_data is not self.bridge_data:
+            return
+
+        positions = []
+        for bridge_id in bridge_ids:
+            pos = self._positions.get(bridge_id)
+            if (pos is None or pos >= len(bridge_data)
+                    or bridge_data[pos][ID_INDEX] != bridge_id):
+                self.refresh()
+                return
+            positions.append(pos)
+
+        self.update_bridges(list(bridge_ids), positions)
+
+    def update_bridges(self, bridge_ids: list[int],
+                       positions: list[int]) -> None:
+        """Update this watcher for the changed bridges with ids bridge_ids,
+        at positions positions in the bridge data.
+
+        """
+
+        raise NotImplementedError
+
+
 # We provide the header and doctring for this function to help get you
 # started. Note the use of the built-in function deepcopy (see
 # help(deepcopy)!): since this function modifies its input, we do not
@@ -408,10 +790,29 @@ def inspect_bridges(bridge_data: list[list], bridge_ids: list[int], date: str,
 
     """
 
-    for bridge in bridge_data:
-        if bridge[ID_INDEX] in bridge_ids:
-            bridge[LAST_INSPECTED_INDEX] = date
-            bridge[BCIS_INDEX].insert(0, bci)
+    # Stores whose rows are copies, like a bridge_table.BridgeTable, record
+    # inspections themselves.
+    inspect = getattr(bridge_data, 'inspect_bridges', None)
+    if inspect is not None:
+        inspect(bridge_ids, date, bci)
+        return
+
+    bridge_ids = set(bridge_ids)
+    if hasattr(bridge_data, 'by_id'):
+        bridges = [get_bridge(bridge_data, bridge_id)
+                   for bridge_id in bridge_ids]
+    else:
+        bridges = [bridge for bridge in bridge_data
+                   if bridge[ID_INDEX] in bridge_ids]
+
+    bridges = [bridge for bridge in bridges if bridge]
+    for bridge in bridges:
+        bridge[LAST_INSPECTED_INDEX] = date
+        bridge[BCIS_INDEX].insert(0, bci)
+
+    if _watchers and bridges:
+        notify_bridges_changed(bridge_data,
+                               [bridge[ID_INDEX] for bridge in bridges])
 
 
 def add_rehab(bridge_data: list[list], bridge_id: int, date: str,
@@ -472,10 +873,21 @@ def add_rehab(bridge_data: list[list], bridge_id: int, date: str,
     True
 
     """
-    if major and bridge_id - 1 < len(bridge_data):
-        bridge_data[bridge_id - 1][LAST_MAJOR_INDEX] = date[6:]
-    elif bridge_id - 1 < len(bridge_data):
-        bridge_data[bridge_id - 1][LAST_MINOR_INDEX] = date[6:]
+    # Stores whose rows are copies, like a bridge_table.BridgeTable, record
+    # rehabs themselves.
+    rehab = getattr(bridge_data, 'add_rehab', None)
+    if rehab is not None:
+        rehab(bridge_id, date, major)
+        return
+
+    bridge = get_bridge(bridge_data, bridge_id)
+    if major and bridge:
+        bridge[LAST_MAJOR_INDEX] = date[6:]
+    elif bridge:
+        bridge[LAST_MINOR_INDEX] = date[6:]
+
+    if _watchers and bridge:
+        notify_bridges_changed(bridge_data, [bridge_id])
 
 
 # We provide the header and doctring for this function to help get you started.
@@ -484,19 +896,58 @@ def format_data(data: list[list[str]]) -> None:
     bridge data, i.e., follows the format outlined in the 'Data
     formatting' section of the assignment handout.
 
-    >>> d = THREE_BRIDGES_UNCLEANED
+    Raise ValueError, and leave data unchanged, if a record cannot be
+    formatted, such as one whose span details are malformed.
+    find_malformed_spans lists all records with malformed span details.
+
+    >>> d = deepcopy(THREE_BRIDGES_UNCLEANED)
     >>> format_data(d)
     >>> d == THREE_BRIDGES
     True
+    >>> bad = deepcopy(THREE_BRIDGES_UNCLEANED)
+    >>> bad[2][SPAN_DETAILS_INDEX] = 'Total=16  (1)=6;'
+    >>> d = deepcopy(bad)
+    >>> format_data(d)
+    Traceback (most recent call last):
+    ...
+    ValueError: malformed span details 'Total=16  (1)=6;': \
+spans add up to 6.0, not the total 16.0
+    >>> d == bad
+    True
 
     """
 
-    for i in range(len(data)):
-        format_bcis(data[i])
-        format_spans(data[i])
-        format_location(data[i])
-        format_length(data[i])
-        data[i][ID_INDEX] = i + 1
+    # The records are put back as they were if one cannot be formatted, so
+    # that a bad record does not leave data half formatted. Tuples of
+    # strings are dropped from garbage collection, so they cost less to
+    # keep than lists.
+    originals = [tuple(record) for record in data]
+    i = 0
+    try:
+        for i in range(len(data)):
+            format_record(data[i], i + 1)
+    except Exception:
+        for j in range(i + 1):
+            data[j][:] = originals[j]
+        raise
+
+
+def format_record(bridge_record: list, bridge_id: int) -> list:
+    """Format the uncleaned bridge record bridge_record in place as
+    format_data does, giving it the id bridge_id, and return it.
+
+    >>> record = format_record(deepcopy(THREE_BRIDGES_UNCLEANED[2]), 3)
+    >>> record == THREE_BRIDGES[2]
+    True
+    """
+
+    format_bcis(bridge_record)
+    format_spans(bridge_record)
+    format_location(bridge_record)
+    format_length(bridge_record)
+    bridge_record[ID_INDEX] = bridge_id
+
+    return bridge_record
 
 
 # This is a suggested helper function for format_data. We provide the
@@ -542,24 +993,156 @@ def format_spans(bridge_record: list) -> None:
     ...           '70.5', '', '70.7', '72.9', '']
     True
 
+    Raise ValueError if the span details are malformed, as
+    check_span_details describes, and leave the record unchanged.
+
+    >>> record[NUM_SPANS_INDEX:SPAN_DETAILS_INDEX + 1] = [
+    ...     '2', 'Total=64  (1)=12;(2)=19;']
+    >>> format_spans(record)
+    Traceback (most recent call last):
+    ...
+    ValueError: malformed span details 'Total=64  (1)=12;(2)=19;': \
+spans add up to 31.0, not the total 64.0
+    >>> record[NUM_SPANS_INDEX]
+    '2'
+
     """
-    bridge_record[NUM_SPANS_INDEX] = int(bridge_record[NUM_SPANS_INDEX])
-    span_lst = []
+    num_spans = int(bridge_record[NUM_SPANS_INDEX])
     details = bridge_record[SPAN_DETAILS_INDEX]
-    i = 0
+    try:
+        spans = parse_checked_span_details(details, num_spans)
+    except ValueError as error:
+        raise ValueError(
+            f'malformed span details {details!r}: {error}') from None
+
+    bridge_record[NUM_SPANS_INDEX] = num_spans
+    bridge_record[SPAN_DETAILS_INDEX] = spans
+
+
+def get_span_patterns() -> list:
+    """Return the compiled regular expressions matching each span length
+    and the total in span details strings, compiling them on the first
+    call.
+
+    >>> get_span_patterns()[1].search('Total=64  (1)=64;').group(1)
+    '64'
+    """
+
+    if not _span_patterns:
+        import re
+        _span_patterns.append(re.compile(
+            r'\)' + re.escape(TO_SEP) + '([^' + re.escape(FROM_SEP) + ']*)'))
+        _span_patterns.append(re.compile(
+            r'Total' + re.escape(TO_SEP) + r'\s*([^\s(]+)'))
+
+    return _span_patterns
+
+
+def parse_span_details(details: str) -> list[float]:
+    """Return the span lengths listed in the span details string details.
+
+    >>> parse_span_details('Total=60.4  (1)=12.2;(2)=18;(3)=18;(4)=12.2;')
+    [12.2, 18.0, 18.0, 12.2]
+    >>> parse_span_details('Total=16  (1)=16;')
+    [16.0]
+    """
+
+    return [float(span) for span in get_span_patterns()[0].findall(details)]
+
+
+def parse_span_column(column: list[str]) -> list[list[float]]:
+    """Return the span lengths listed in each of the span details strings
+    in column.
+
+    >>> parse_span_column(['Total=16  (1)=16;', 'Total=9  (1)=4;(2)=5;'])
+    [[16.0], [4.0, 5.0]]
+    """
+
+    findall = get_span_patterns()[0].findall
+    return [[float(span) for span in findall(details)] for details in column]
+
+
+def parse_checked_span_details(details: str,
+                               num_spans: int) -> list[float]:
+    """Return the span lengths listed in the span details string details
+    of a bridge with num_spans spans.
+
+    Raise ValueError describing what is wrong unless the spans are
+    numbers, there are num_spans of them, and they add up to the total
+    given in details.
+
+    >>> parse_checked_span_details('Total=16  (1)=16;', 1)
+    [16.0]
+    >>> parse_checked_span_details('(1)=16;', 1)
+    Traceback (most recent call last):
+    ...
+    ValueError: no total
+    """
+
+    total = get_span_patterns()[1].search(details)
+    if total is None:
+        raise ValueError('no total')
+
+    total = float(total.group(1))
+    spans = parse_span_details(details)
+    if len(spans) != num_spans:
+        raise ValueError(f'expected {num_spans} spans, found {len(spans)}')
+    if abs(sum(spans) - total) > SPAN_TOTAL_TOLERANCE:
+        raise ValueError(f'spans add up to {sum(spans)}, not the total '
+                         f'{total}')
+
+    return spans
+
+
+def check_span_details(details: str, num_spans: int) -> str:
+    """Return a description of what is wrong with the span details string
+    details of a bridge with num_spans spans, as parse_checked_span_details
+    raises it, or '' if nothing is wrong.
+
+    >>> check_span_details('Total=64  (1)=12;(2)=19;(3)=21;(4)=12;', 4)
+    ''
+    >>> check_span_details('Total=64  (1)=12;(2)=19;', 4)
+    'expected 4 spans, found 2'
+    >>> check_span_details('Total=64  (1)=12;(2)=19;', 2)
+    'spans add up to 31.0, not the total 64.0'
+    >>> check_span_details('(1)=12;', 1)
+    'no total'
+    """
+
+    try:
+        parse_checked_span_details(details, num_spans)
+    except ValueError as error:
+        return str(error)
+
+    return ''
+
+
+def find_malformed_spans(data: list[list[str]]) -> list[tuple[int, str]]:
+    """Return (position, problem) pairs for each record of the uncleaned
+    bridge data data whose span details are malformed, where problem
+    describes what is wrong as check_span_details does.
+
+    >>> find_malformed_spans(THREE_BRIDGES_UNCLEANED)
+    []
+    >>> find_malformed_spans([['1 -  32/', 'Bridge', '403', '43.16',
+    ...                        '-80.27', '1965', '2014', '2009', '2',
+    ...                        'Total=64  (1)=12;(2)=x;', '65']])
+    [(0, "could not convert string to float: 'x'")]
+    """
+
+    problems = []
+    for i in range(len(data)):
+        try:
+            num_spans = int(data[i][NUM_SPANS_INDEX])
+        except ValueError:
+            problems.append((i, 'invalid number of spans'))
+            continue
+
+        problem = check_span_details(data[i][SPAN_DETAILS_INDEX], num_spans)
+        if problem:
+            problems.append((i, problem))
 
-    while i < len(details):
-        if details[i] == ')':
-            num = ''
-            i += 2
-            while i < len(details) and details[i] != ';':
-                num += details[i]
-                i += 1
-            span_lst.append(float(num))
-        else:
-            i += 1
-
-    bridge_record[SPAN_DETAILS_INDEX] = span_lst
+    return problems
 
 
 # This is a suggested helper function for format_data. We provide the
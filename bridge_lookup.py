@@ -0,0 +1,148 @@
+"""Bridge data with an index from bridge ids to bridge records.
+
+A BridgeList is a list of bridge records that keeps a dictionary from each
+bridge id to its record up to date as records are added, removed or
+replaced. The functions in bridge_functions use it to look bridges up by
+id in constant time, whatever the ids are and however the records are
+ordered.
+
+"""
+
+from bridge_functions import get_average_bci, get_bridge, THREE_BRIDGES
+from constants import ID_INDEX
+
+
+class BridgeList(list):
+    """A list of bridge records indexed by bridge id.
+
+    by_id maps the id of each bridge to its record. If two records share an
+    id, by_id maps it to the first of them. The index is only updated when
+    the list itself changes: changing the id inside a record requires a
+    call to reindex.
+
+    >>> bridges = BridgeList(THREE_BRIDGES[::-1])
+    >>> get_bridge(bridges, 1) == THREE_BRIDGES[0]
+    True
+    >>> get_average_bci(bridges, 1)
+    70.88571428571429
+    >>> del bridges[0]
+    >>> get_bridge(bridges, 3)
+    []
+
+    """
+
+    def __init__(self, bridge_data: list[list] = ()) -> None:
+        """Initialize a new list of the bridges in bridge data
+        bridge_data.
+
+        """
+
+        super().__init__(bridge_data)
+        self.by_id = {}
+        self.reindex()
+
+    def reindex(self) -> None:
+        """Rebuild the id index of this list from its records."""
+
+        self.by_id = {}
+        for bridge in self:
+            self.by_id.setdefault(bridge[ID_INDEX], bridge)
+
+    def append(self, bridge: list) -> None:
+        """Add the bridge record bridge to the end of this list.
+
+        >>> bridges = BridgeList()
+        >>> bridges.append(THREE_BRIDGES[2])
+        >>> get_bridge(bridges, 3) is THREE_BRIDGES[2]
+        True
+        """
+
+        super().append(bridge)
+        self.by_id.setdefault(bridge[ID_INDEX], bridge)
+
+    def extend(self, bridge_data: list[list]) -> None:
+        """Add the bridges in bridge data bridge_data to the end of this
+        list.
+
+        """
+
+        for bridge in bridge_data:
+            self.append(bridge)
+
+    def __iadd__(self, bridge_data: list[list]) -> 'BridgeList':
+        """Add the bridges in bridge data bridge_data to the end of this
+        list, and return this list.
+
+        """
+
+        self.extend(bridge_data)
+        return self
+
+    def insert(self, pos: int, bridge: list) -> None:
+        """Insert the bridge record bridge at position pos."""
+
+        super().insert(pos, bridge)
+        self.reindex()
+
+    def __setitem__(self, pos, value) -> None:
+        """Replace the record or slice of records at pos with value."""
+
+        super().__setitem__(pos, value)
+        self.reindex()
+
+    def __delitem__(self, pos) -> None:
+        """Remove the record or slice of records at pos."""
+
+        super().__delitem__(pos)
+        self.reindex()
+
+    def pop(self, pos: int = -1) -> list:
+        """Remove and return the bridge record at position pos."""
+
+        bridge = super().pop(pos)
+        self.reindex()
+        return bridge
+
+    def remove(self, bridge: list) -> None:
+        """Remove the first record equal to the bridge record bridge."""
+
+        super().remove(bridge)
+        self.reindex()
+
+    def clear(self) -> None:
+        """Remove all records from this list."""
+
+        super().clear()
+        self.by_id = {}
+
+    def __imul__(self, times: int) -> 'BridgeList':
+        """Repeat the records of this list times times, and return this
+        list.
+
+        """
+
+        super().__imul__(times)
+        self.reindex()
+        return self
+
+    def copy(self) -> 'BridgeList':
+        """Return a shallow copy of this list, with its own id index."""
+
+        return BridgeList(self)
+
+    def get_bridges(self, bridge_ids: list[int]) -> list[list]:
+        """Return the records of the bridges with ids in bridge_ids that are
+        in this list, in the order of bridge_ids.
+
+        >>> bridges = BridgeList(THREE_BRIDGES)
+        >>> [bridge[ID_INDEX] for bridge in bridges.get_bridges([3, 42, 1])]
+        [3, 1]
+        """
+
+        return [self.by_id[bridge_id] for bridge_id in bridge_ids
+                if bridge_id in self.by_id]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
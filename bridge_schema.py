@@ -0,0 +1,223 @@
+"""The layout of bridge records and the inspection settings, in one object.
+
+constants, which comes with the assignment, defines the position of each
+field of a bridge record and the inspection priority settings as separate
+names. SCHEMA gathers them into a BridgeSchema when this module is first
+imported, and checks them once: every field must have its own position,
+and the priority BCIs must increase from high to low priority. A missing
+or inconsistent constants module is reported as a SchemaError that says
+what is wrong.
+
+read_data_in_order reads CSV files whose columns come in a different
+order. It works out from the header line where each field is, once, and
+then moves the columns of each row into the order of SCHEMA.
+
+"""
+
+from io import TextIOBase
+from operator import itemgetter
+
+# Fields of a bridge record, named as in constants without '_INDEX'.
+FIELDS = ('ID', 'NAME', 'HIGHWAY', 'LAT', 'LON', 'YEAR', 'LAST_MAJOR',
+          'LAST_MINOR', 'NUM_SPANS', 'SPAN_DETAILS', 'LENGTH',
+          'LAST_INSPECTED', 'BCIS')
+
+# Header of the column holding each field in a bridge data CSV file. The
+# BCI history follows the current BCI, in columns of its own.
+FIELD_HEADERS = {
+    'ID': 'ID', 'NAME': 'STRUCTURE', 'HIGHWAY': 'HWY NAME',
+    'LAT': 'LATITUDE', 'LON': 'LONGITUDE', 'YEAR': 'YEAR BUILT',
+    'LAST_MAJOR': 'LAST MAJOR REHAB', 'LAST_MINOR': 'LAST MINOR REHAB',
+    'NUM_SPANS': 'NUMBER OF SPANS', 'SPAN_DETAILS': 'SPAN DETAILS (m)',
+    'LENGTH': 'DECK / CULVERTS LENGTH (m)',
+    'LAST_INSPECTED': 'LAST INSPECTION DATE', 'BCIS': 'CURRENT BCI'}
+
+# Inspection priorities, from high to low, as named in constants.
+PRIORITIES = ('HIGH', 'MEDIUM', 'LOW')
+
+
+class SchemaError(ImportError):
+    """The constants module is missing, or does not describe a valid
+    layout of bridge records.
+
+    """
+
+
+class BridgeSchema:
+    """The layout of bridge records and the inspection settings.
+
+    This is a plain class rather than a NamedTuple, since bridge_functions
+    imports this module and importing typing would double its import time.
+
+    >>> SCHEMA.fields[SCHEMA.index('LAT')]
+    'LAT'
+    """
+
+    def __init__(self, fields: tuple[str, ...],
+                 priority_tiers: tuple[tuple[float, float], ...],
+                 from_sep: str, to_sep: str, earth_radius: float) -> None:
+        """Initialize a new schema for bridge records with the fields named
+        fields, in order, and the (radius, BCI) inspection priority tiers
+        priority_tiers, from high to low priority. from_sep and to_sep
+        separate the spans in span details strings, and earth_radius is the
+        radius of the Earth in kilometers.
+
+        """
+
+        self.fields = fields
+        self.priority_tiers = priority_tiers
+        self.from_sep = from_sep
+        self.to_sep = to_sep
+        self.earth_radius = earth_radius
+
+    def index(self, field: str) -> int:
+        """Return the position of the field named field in a bridge
+        record.
+
+        """
+
+        return self.fields.index(field)
+
+    def get_column_order(self, header: list[str],
+                         width: int = 0) -> list[int]:
+        """Return the column of the CSV header line header that holds each
+        field of a bridge record, in the order of this schema, followed by
+        the other columns of rows width columns wide, which hold the BCI
+        history, in file order.
+
+        Raise a SchemaError if a field has no column.
+
+        >>> header = ['ID', 'HWY NAME', 'STRUCTURE'] + [
+        ...     FIELD_HEADERS[field] for field in FIELDS[3:]] + ['']
+        >>> SCHEMA.get_column_order(header)[:4]
+        [0, 2, 1, 3]
+        >>> SCHEMA.get_column_order(header, 16)[-3:]
+        [13, 14, 15]
+        """
+
+        columns = {}
+        for column in range(len(header)):
+            columns.setdefault(header[column].strip().upper(), column)
+
+        order = []
+        for field in self.fields:
+            column = columns.get(FIELD_HEADERS[field].upper())
+            if column is None:
+                raise SchemaError(f'no column {FIELD_HEADERS[field]!r} '
+                                  f'for field {field}')
+            order.append(column)
+
+        used = set(order)
+        return order + [column for column in range(max(len(header), width))
+                        if column not in used]
+
+
+def load_schema(module_name: str = 'constants') -> BridgeSchema:
+    """Return the schema described by the module named module_name, which
+    is imported if need be. Raise a SchemaError if it cannot be imported or
+    does not describe a valid layout.
+
+    >>> load_schema('no_such_constants')
+    Traceback (most recent call last):
+    ...
+    bridge_schema.SchemaError: cannot load the bridge data layout from \
+no_such_constants: No module named 'no_such_constants'
+    """
+
+    try:
+        constants = __import__(module_name)
+    except ImportError as error:
+        raise SchemaError(f'cannot load the bridge data layout from '
+                          f'{module_name}: {error}') from error
+
+    names = ([field + '_INDEX' for field in FIELDS]
+             + [priority + suffix for priority in PRIORITIES
+                for suffix in ('_PRIORITY_RADIUS', '_PRIORITY_BCI')]
+             + ['FROM_SEP', 'TO_SEP', 'EARTH_RADIUS'])
+    missing = [name for name in names if not hasattr(constants, name)]
+    if missing:
+        raise SchemaError(f'{module_name} does not define '
+                          + ', '.join(missing))
+
+    positions = {field: getattr(constants, field + '_INDEX')
+                 for field in FIELDS}
+    if sorted(positions.values()) != list(range(len(FIELDS))):
+        raise SchemaError(f'the field positions in {module_name} are not '
+                          f'0 to {len(FIELDS) - 1}, each used once')
+
+    tiers = tuple((getattr(constants, priority + '_PRIORITY_RADIUS'),
+                   getattr(constants, priority + '_PRIORITY_BCI'))
+                  for priority in PRIORITIES)
+    if any(radius < 0 for radius, _ in tiers):
+        raise SchemaError(f'the priority radii in {module_name} must not '
+                          f'be negative')
+    if any(tiers[i][1] >= tiers[i + 1][1] for i in range(len(tiers) - 1)):
+        raise SchemaError(f'the priority BCIs in {module_name} must '
+                          f'increase from high to low priority')
+
+    if (not constants.FROM_SEP or not constants.TO_SEP
+            or constants.FROM_SEP == constants.TO_SEP):
+        raise SchemaError(f'the span separators in {module_name} must be '
+                          f'different and not empty')
+    if constants.EARTH_RADIUS <= 0:
+        raise SchemaError(f'EARTH_RADIUS in {module_name} must be positive')
+
+    return BridgeSchema(tuple(sorted(FIELDS, key=positions.get)), tiers,
+                        constants.FROM_SEP, constants.TO_SEP,
+                        constants.EARTH_RADIUS)
+
+
+# The layout of bridge records described by constants.
+SCHEMA = load_schema()
+
+
+def read_data_in_order(csv_file: TextIOBase,
+                       schema: BridgeSchema = SCHEMA) -> list[list[str]]:
+    """Read and return the rows of the open CSV file csv_file, as read_data
+    does, with their columns moved into the order of the schema schema.
+    The first of the two header lines of csv_file says which column holds
+    each field.
+
+    >>> import csv
+    >>> from io import StringIO
+    >>> from bridge_functions import read_data, THREE_BRIDGES_UNCLEANED
+    >>> header = [FIELD_HEADERS[field] for field in SCHEMA.fields]
+    >>> swapped = [1, 0] + list(range(2, 27))
+    >>> csv_file = StringIO()
+    >>> writer = csv.writer(csv_file)
+    >>> _ = writer.writerow([header[i] for i in swapped[:13]])
+    >>> _ = writer.writerow([''] * 27)
+    >>> writer.writerows([[row[i] for i in swapped]
+    ...                   for row in THREE_BRIDGES_UNCLEANED])
+    >>> _ = csv_file.seek(0)
+    >>> read_data(csv_file) == THREE_BRIDGES_UNCLEANED
+    False
+    >>> _ = csv_file.seek(0)
+    >>> read_data_in_order(csv_file) == THREE_BRIDGES_UNCLEANED
+    True
+    """
+
+    # Imported here, since only reading CSV files needs it.
+    import csv
+
+    lines = csv.reader(csv_file)
+    header = next(lines, [])
+    next(lines, None)
+
+    # Rows of the same width share one order.
+    getters = {}
+    rows = []
+    for row in lines:
+        get_columns = getters.get(len(row))
+        if get_columns is None:
+            order = schema.get_column_order(header, len(row))
+            get_columns = getters[len(row)] = (
+                None if order == list(range(len(row))) else itemgetter(*order))
+        rows.append(row if get_columns is None else list(get_columns(row)))
+
+    return rows
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
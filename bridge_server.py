@@ -0,0 +1,553 @@
+"""A local JSON-over-HTTP query server over one shared copy of the bridges.
+
+The server loads and formats the bridge data once and answers queries on
+it, so client processes do not each read the CSV file. Each endpoint is a
+bridge function, called with the JSON object in the body of a POST to
+/<function name> as its keyword arguments, and answers with a JSON object
+holding its result:
+
+    POST /get_bridges_in_radius
+    {"latitude": 43.1, "longitude": -80.15, "radius": 50}
+
+    {"result": [1, 2]}
+
+Queries that scan the bridges run in a pool of worker processes, so the
+event loop never blocks on them. The workers are started by a fork server
+rather than forked from the server itself, so they do not inherit the
+sockets of open connections. They map a snapshot of the data saved by
+bridge_snapshot, which is saved again after a write, before the next query
+that needs it. Identical queries in flight at the same time are answered
+by a single call. Writes run one at a time, in the order they arrive, in a
+thread, so a large batch does not hold up other clients either. Run as a
+script, e.g.
+
+    python bridge_server.py bridge_data.csv --port 8080
+
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+from batch_updates import is_valid_date
+from bridge_functions import (
+    add_rehab, assign_inspectors, get_bridge, get_bridges_containing,
+    get_bridges_in_radius, get_closest_bridge, inspect_bridges,
+    THREE_BRIDGES)
+from bridge_snapshot import load_bridge_data, load_snapshot, save_snapshot
+
+# Endpoints: the function each one calls with the bridge data, the names of
+# its other arguments, and whether it scans the bridges.
+QUERIES = {
+    'get_bridge': (get_bridge, ('bridge_id',), False),
+    'get_bridges_in_radius': (get_bridges_in_radius,
+                              ('latitude', 'longitude', 'radius'), True),
+    'get_closest_bridge': (get_closest_bridge, ('bridge_id',), True),
+    'get_bridges_containing': (get_bridges_containing, ('search',), True),
+    'assign_inspectors': (assign_inspectors,
+                          ('inspectors', 'max_bridges'), True)}
+
+# Endpoints that change the bridge data, and the names of their arguments.
+WRITES = {
+    'inspect_bridges': (inspect_bridges, ('bridge_ids', 'date', 'bci')),
+    'add_rehab': (add_rehab, ('bridge_id', 'date', 'major'))}
+
+# Largest request body accepted, in bytes.
+MAX_BODY_SIZE = 1 << 20
+
+# Default address the server listens on.
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8080
+
+# Reason phrases of the HTTP statuses the server answers with.
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error'}
+
+# Ways of starting worker processes, in order of preference. Forked
+# workers would keep the sockets of the connections open at the time.
+START_METHODS = ('forkserver', 'spawn')
+
+# The snapshot a worker process last loaded: its path and its table.
+_worker_snapshot = [None, None]
+
+
+class RequestError(Exception):
+    """A request that cannot be answered, with the HTTP status to answer
+    it with.
+
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        """Initialize a new error with HTTP status status and message
+        message.
+
+        """
+
+        super().__init__(message)
+        self.status = status
+
+
+def _run_query(snapshot_path: str, name: str, args: dict):
+    """Return the result of the query endpoint name called with the
+    arguments args on the bridge data in the snapshot file at
+    snapshot_path. Runs in a worker process, which keeps the last snapshot
+    it loaded.
+
+    """
+
+    if _worker_snapshot[0] != snapshot_path:
+        _worker_snapshot[:] = [snapshot_path, load_snapshot(snapshot_path)]
+
+    return QUERIES[name][0](_worker_snapshot[1], **args)
+
+
+def get_pool_context():
+    """Return the multiprocessing context of the first of START_METHODS
+    available on this platform.
+
+    >>> get_pool_context().get_start_method() in START_METHODS
+    True
+    """
+
+    methods = multiprocessing.get_all_start_methods()
+    for method in START_METHODS:
+        if method in methods:
+            return multiprocessing.get_context(method)
+
+    return multiprocessing.get_context()
+
+
+def is_integer(value) -> bool:
+    """Return True if and only if the JSON value value is an integer.
+
+    >>> is_integer(3), is_integer(3.0), is_integer(True)
+    (True, False, False)
+    """
+
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def is_number(value) -> bool:
+    """Return True if and only if the JSON value value is a finite number.
+
+    >>> is_number(3), is_number(60.5), is_number('60.5'), is_number(False)
+    (True, True, False, False)
+    >>> is_number(float('nan'))
+    False
+    """
+
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value))
+
+
+def check_arguments(name: str, args) -> None:
+    """Raise a RequestError if there is no endpoint name, or if args are
+    not the arguments it takes, or if an id, date, BCI or rehab kind among
+    them has the wrong type. Writes are only run after this check, so
+    they cannot put values of the wrong type into the bridge data.
+
+    >>> check_arguments('get_bridge', {'bridge_id': 1})
+    >>> check_arguments('get_bridge', {'id': 1})
+    Traceback (most recent call last):
+    ...
+    bridge_server.RequestError: get_bridge takes arguments bridge_id
+    >>> check_arguments('inspect_bridges', {
+    ...     'bridge_ids': [1], 'date': '09/15/2018', 'bci': 'bad'})
+    Traceback (most recent call last):
+    ...
+    bridge_server.RequestError: bci must be a number
+    >>> check_arguments('add_rehab', {
+    ...     'bridge_id': 1, 'date': '09/15/2018', 'major': 1})
+    Traceback (most recent call last):
+    ...
+    bridge_server.RequestError: major must be true or false
+    """
+
+    if name in QUERIES:
+        expected = QUERIES[name][1]
+    elif name in WRITES:
+        expected = WRITES[name][1]
+    else:
+        raise RequestError(404, f'no endpoint {name}')
+
+    if not isinstance(args, dict) or set(args) != set(expected):
+        raise RequestError(400, f'{name} takes arguments '
+                           + ', '.join(expected))
+    if 'date' in args and not (isinstance(args['date'], str)
+                               and is_valid_date(args['date'])):
+        raise RequestError(400, 'date must be in the format MM/DD/YYYY')
+    if 'bridge_id' in args and not is_integer(args['bridge_id']):
+        raise RequestError(400, 'bridge_id must be an integer')
+    if 'bridge_ids' in args and not (
+            isinstance(args['bridge_ids'], list)
+            and all(map(is_integer, args['bridge_ids']))):
+        raise RequestError(400, 'bridge_ids must be a list of integers')
+    if 'bci' in args and not is_number(args['bci']):
+        raise RequestError(400, 'bci must be a number')
+    if 'major' in args and not isinstance(args['major'], bool):
+        raise RequestError(400, 'major must be true or false')
+
+
+def get_body_length(headers: dict[str, str]) -> int:
+    """Return the length of the body of a request with the headers
+    headers, whose names are in lowercase. Raise a RequestError if the
+    Content-Length header is not a valid length, or is more than
+    MAX_BODY_SIZE.
+
+    >>> get_body_length({}), get_body_length({'content-length': '12'})
+    (0, 12)
+    >>> get_body_length({'content-length': '-1'})
+    Traceback (most recent call last):
+    ...
+    bridge_server.RequestError: invalid Content-Length
+    """
+
+    try:
+        length = int(headers.get('content-length', 0))
+    except ValueError:
+        length = -1
+    if length < 0:
+        raise RequestError(400, 'invalid Content-Length')
+    if length > MAX_BODY_SIZE:
+        raise RequestError(413, 'request body too large')
+
+    return length
+
+
+class BridgeServer:
+    """A query server over the bridges in some bridge data.
+
+    call answers one request without going through HTTP.
+
+    >>> server = BridgeServer(THREE_BRIDGES, workers=1)
+    >>> asyncio.run(server.call('get_bridges_in_radius', {
+    ...     'latitude': 43.10, 'longitude': -80.15, 'radius': 50}))
+    [1, 2]
+    >>> asyncio.run(server.call('inspect_bridges', {
+    ...     'bridge_ids': [2], 'date': '09/15/2018', 'bci': 60.5}))
+    >>> asyncio.run(server.call('get_bridge', {'bridge_id': 2}))[-1][0]
+    60.5
+    >>> server.close()
+    >>> THREE_BRIDGES[1][-1][0]
+    71.5
+
+    """
+
+    def __init__(self, bridge_data: list[list], workers: int = None) -> None:
+        """Initialize a new server over a copy of the bridge data
+        bridge_data, which runs scans in up to workers worker processes, or
+        one per CPU if workers is None.
+
+        """
+
+        self.bridge_data = deepcopy(bridge_data)
+        self.workers = workers
+        self.version = 0
+        self.coalesced = 0
+        self._pool = None
+        self._in_flight = {}
+        self._write_lock = None
+        self._directory = tempfile.mkdtemp(prefix='bridges-')
+        self._snapshot_path = None
+        self._snapshot_version = None
+        self._snapshot_users = {}
+
+    async def call(self, name: str, args: dict):
+        """Return the result of calling endpoint name with the arguments
+        args. Raise a RequestError if the request is not valid.
+
+        """
+
+        check_arguments(name, args)
+        if self._write_lock is None:
+            self._write_lock = asyncio.Lock()
+
+        if name in WRITES:
+            loop = asyncio.get_running_loop()
+            async with self._write_lock:
+                await loop.run_in_executor(None, lambda: WRITES[name][0](
+                    self.bridge_data, **args))
+                self.version += 1
+            return None
+
+        key = (name, json.dumps(args, sort_keys=True), self.version)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._query(name, args))
+            self._in_flight[key] = future
+            future.add_done_callback(
+                lambda _: self._in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+
+        # Shielded, so that a client hanging up does not cancel the query
+        # for the others waiting on it.
+        return await asyncio.shield(future)
+
+    async def _query(self, name: str, args: dict):
+        """Return the result of the query endpoint name called with the
+        arguments args on the current bridge data.
+
+        """
+
+        function, _, scans = QUERIES[name]
+        if not scans:
+            # Writes change the data in another thread, so the result is
+            # copied while none is running.
+            async with self._write_lock:
+                return deepcopy(function(self.bridge_data, **args))
+
+        loop = asyncio.get_running_loop()
+        if self._snapshot_version != self.version:
+            async with self._write_lock:
+                if self._snapshot_version != self.version:
+                    await self._save_snapshot(loop)
+
+        path = self._snapshot_path
+        self._snapshot_users[path] = self._snapshot_users.get(path, 0) + 1
+        try:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_pool_context())
+            return await loop.run_in_executor(self._pool, _run_query, path,
+                                              name, args)
+        finally:
+            self._snapshot_users[path] -= 1
+            self._remove_old_snapshots()
+
+    async def _save_snapshot(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Save a snapshot of the current bridge data for the workers to
+        load. Must be called holding the write lock, so that the data does
+        not change while it is saved.
+
+        """
+
+        path = os.path.join(self._directory,
+                            f'bridges-{self.version}.snapshot')
+        await loop.run_in_executor(None, save_snapshot, self.bridge_data,
+                                   path)
+        self._snapshot_path = path
+        self._snapshot_version = self.version
+        self._remove_old_snapshots()
+
+    def _remove_old_snapshots(self) -> None:
+        """Delete the snapshots older than the current one that no query
+        is using.
+
+        """
+
+        for path, users in list(self._snapshot_users.items()):
+            if users == 0 and path != self._snapshot_path:
+                del self._snapshot_users[path]
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter) -> None:
+        """Answer the HTTP requests arriving on one connection until the
+        client closes it. A request whose body cannot be read is answered,
+        and then the connection is closed.
+
+        >>> async def send_invalid_length():
+        ...     server = BridgeServer(THREE_BRIDGES, workers=1)
+        ...     listener = await server.start(port=0)
+        ...     reader, writer = await asyncio.open_connection(
+        ...         DEFAULT_HOST, listener.sockets[0].getsockname()[1])
+        ...     writer.write(b'POST /get_bridge HTTP/1.1\\r\\n'
+        ...                  b'Content-Length: ten\\r\\n\\r\\n'
+        ...                  b'{"bridge_id": 1}')
+        ...     answer = await asyncio.wait_for(reader.read(), 30)
+        ...     writer.close()
+        ...     listener.close()
+        ...     server.close()
+        ...     return answer.split(b'\\r\\n')[0], answer.split(b'\\r\\n')[-1]
+        >>> asyncio.run(send_invalid_length())
+        (b'HTTP/1.1 400 Bad Request', b'{"error": "invalid Content-Length"}')
+        """
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    field, _, value = line.decode('latin-1').partition(':')
+                    headers[field.strip().lower()] = value.strip()
+
+                try:
+                    length = get_body_length(headers)
+                except RequestError as error:
+                    # The body is left unread, so the rest of the stream
+                    # cannot be split into requests.
+                    status, body = error.status, {'error': str(error)}
+                    keep_alive = False
+                else:
+                    status, body = await self._answer(
+                        request_line.decode('latin-1').split(),
+                        await reader.readexactly(length) if length else b'')
+                    keep_alive = (headers.get('connection', '').lower()
+                                  != 'close')
+                data = json.dumps(body).encode('utf-8')
+                writer.write(
+                    f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}'
+                    f'\r\n\r\n'.encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _answer(self, request: list[str],
+                      body: bytes) -> tuple[int, dict]:
+        """Return the HTTP status and the JSON body of the answer to the
+        request with request line words request and body body.
+
+        """
+
+        if len(request) != 3:
+            return 400, {'error': 'invalid request line'}
+        if request[0] != 'POST':
+            return 405, {'error': 'endpoints only accept POST'}
+        try:
+            args = json.loads(body or b'{}')
+            result = await self.call(request[1].strip('/'), args)
+        except ValueError as error:
+            return 400, {'error': str(error)}
+        except RequestError as error:
+            return error.status, {'error': str(error)}
+        except Exception as error:
+            # Arguments of the right names but the wrong types fail inside
+            # the bridge functions.
+            return 500, {'error': f'{type(error).__name__}: {error}'}
+
+        return 200, {'result': result}
+
+    async def start(self, host: str = DEFAULT_HOST,
+                    port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        """Return a started server listening for HTTP requests on host and
+        port, or on a free port if port is 0.
+
+        >>> async def query_twice():
+        ...     server = BridgeServer(THREE_BRIDGES, workers=1)
+        ...     listener = await server.start(port=0)
+        ...     port = listener.sockets[0].getsockname()[1]
+        ...     args = {'latitude': 43.10, 'longitude': -80.15, 'radius': 50}
+        ...     answers = [await asyncio.wait_for(post_query(
+        ...         DEFAULT_HOST, port, 'get_bridges_in_radius', args), 30)
+        ...                for _ in range(2)]
+        ...     listener.close()
+        ...     server.close()
+        ...     return answers
+        >>> asyncio.run(query_twice())
+        [(200, {'result': [1, 2]}), (200, {'result': [1, 2]})]
+
+        A write with arguments of the wrong type is refused, and leaves the
+        bridge data as it was.
+
+        >>> async def write_badly():
+        ...     server = BridgeServer(THREE_BRIDGES, workers=1)
+        ...     listener = await server.start(port=0)
+        ...     port = listener.sockets[0].getsockname()[1]
+        ...     answers = [await asyncio.wait_for(post_query(
+        ...         DEFAULT_HOST, port, name, args), 30) for name, args in [
+        ...             ('inspect_bridges', {'bridge_ids': [1, 2],
+        ...                                  'date': '09/15/2018',
+        ...                                  'bci': 'bad'}),
+        ...             ('get_bridges_in_radius', {'latitude': 43.10,
+        ...                                        'longitude': -80.15,
+        ...                                        'radius': 50}),
+        ...             ('get_closest_bridge', {'bridge_id': 3})]]
+        ...     listener.close()
+        ...     server.close()
+        ...     return answers
+        >>> for answer in asyncio.run(write_badly()):
+        ...     print(answer)
+        (400, {'error': 'bci must be a number'})
+        (200, {'result': [1, 2]})
+        (200, {'result': 1})
+        """
+
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        """Stop the worker processes and delete the snapshots."""
+
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        shutil.rmtree(self._directory, ignore_errors=True)
+
+
+async def post_query(host: str, port: int, name: str,
+                     args: dict) -> tuple[int, dict]:
+    """Return the HTTP status and the JSON body of the answer of the
+    server listening on host and port to a call of endpoint name with the
+    arguments args. The connection is closed after the one request, and
+    the answer is read until the server closes it.
+
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        body = json.dumps(args).encode('utf-8')
+        writer.write(f'POST /{name} HTTP/1.1\r\n'
+                     f'Host: {host}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+        answer = await reader.read()
+    finally:
+        writer.close()
+
+    head, _, data = answer.partition(b'\r\n\r\n')
+    return int(head.split()[1]), json.loads(data)
+
+
+async def serve(csv_path: str, host: str = DEFAULT_HOST,
+                port: int = DEFAULT_PORT, workers: int = None) -> None:
+    """Serve queries on the bridges in the CSV file at csv_path on host and
+    port, with up to workers worker processes, until cancelled.
+
+    """
+
+    server = BridgeServer(load_bridge_data(csv_path).to_records(), workers)
+    try:
+        listener = await server.start(host, port)
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv_path')
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(serve(args.csv_path, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,338 @@
+"""Binary snapshots of formatted bridge data.
+
+save_snapshot writes formatted bridge data to a compact binary file with
+fixed-width numeric columns, a string table for the text fields and
+offset arrays for the span and BCI lists. load_snapshot memory-maps such a
+file and returns a BridgeTable whose columns are views into the mapping,
+so a process can query the bridges without reading or formatting the CSV
+file. For example,
+
+    bridge_data = load_bridge_data('bridge_data.csv')
+
+formats the CSV file and saves a snapshot next to it on the first run, and
+on later runs maps the snapshot instead, as long as the CSV file has not
+changed since.
+
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from bridge_functions import (
+    read_data, format_data, THREE_BRIDGES, THREE_BRIDGES_UNCLEANED)
+from bridge_table import BridgeTable
+from constants import (
+    ID_INDEX, NAME_INDEX, HIGHWAY_INDEX, LAT_INDEX, LON_INDEX, YEAR_INDEX,
+    LAST_MAJOR_INDEX, LAST_MINOR_INDEX, NUM_SPANS_INDEX, SPAN_DETAILS_INDEX,
+    LENGTH_INDEX, LAST_INSPECTED_INDEX, BCIS_INDEX)
+
+# The first bytes of every snapshot file.
+MAGIC = b'BRIDGSNP'
+
+# Bumped whenever the layout of a snapshot changes.
+SNAPSHOT_VERSION = 1
+
+# Magic, version, byte order, number of bridges, number of span values,
+# number of BCI values, number of strings, number of string bytes and the
+# SHA-256 checksum of the source CSV file.
+HEADER = struct.Struct('<8sII5Q32s')
+
+# Every column starts at a multiple of this many bytes.
+ALIGNMENT = 8
+
+# The string fields of a bridge record, in the order they are stored.
+STRING_INDEXES = (NAME_INDEX, HIGHWAY_INDEX, YEAR_INDEX, LAST_MAJOR_INDEX,
+                  LAST_MINOR_INDEX, LAST_INSPECTED_INDEX)
+
+# Snapshot files are looked for next to the CSV file, with this suffix.
+SNAPSHOT_SUFFIX = '.snapshot'
+
+
+def file_checksum(path: str) -> bytes:
+    """Return the SHA-256 digest of the contents of the file at path."""
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source_file:
+        for block in iter(lambda: source_file.read(1 << 20), b''):
+            digest.update(block)
+
+    return digest.digest()
+
+
+class StringColumn:
+    """A column of strings read from the string table of a snapshot.
+
+    Strings are decoded when they are looked up. Strings that are assigned
+    are kept in memory, in front of the snapshot.
+
+    """
+
+    def __init__(self, indexes: memoryview, offsets: memoryview,
+                 data: memoryview) -> None:
+        """Initialize a new column whose string at position pos is string
+        number indexes[pos] of the string table, which is stored in
+        data[offsets[i]:offsets[i + 1]] for string number i.
+
+        """
+
+        self._indexes = indexes
+        self._offsets = offsets
+        self._data = data
+        self._changed = {}
+
+    def __len__(self) -> int:
+        """Return the number of strings in this column."""
+
+        return len(self._indexes)
+
+    def __getitem__(self, pos: int) -> str:
+        """Return the string at position pos of this column."""
+
+        if pos in self._changed:
+            return self._changed[pos]
+
+        i = self._indexes[pos]
+        return str(self._data[self._offsets[i]:self._offsets[i + 1]],
+                   'utf-8')
+
+    def __setitem__(self, pos: int, string: str) -> None:
+        """Replace the string at position pos of this column by string."""
+
+        self._changed[pos % len(self._indexes)] = string
+
+
+def _pad(snapshot_file, size: int) -> None:
+    """Write zero bytes to snapshot_file after size bytes of a column, so
+    that the next column is aligned.
+
+    """
+
+    snapshot_file.write(bytes(-size % ALIGNMENT))
+
+
+def save_snapshot(bridge_data: list[list], snapshot_path: str,
+                  checksum: bytes = bytes(32)) -> None:
+    """Write the bridge data bridge_data to a snapshot file at
+    snapshot_path, recording checksum as the checksum of its source. The
+    file is replaced atomically, so a reader never maps a partly written
+    snapshot.
+
+    Precondition: Valid bridge data, and len(checksum) == 32.
+
+    """
+
+    strings = {}
+    columns = [array('q'), array('d'), array('d'), array('q'), array('d'),
+               array('q'), array('d'), array('q'), array('d')]
+    ids, lats, lons, num_spans, lengths = columns[:5]
+    span_offsets, span_values, bci_offsets, bci_values = columns[5:]
+    string_columns = [array('I') for _ in STRING_INDEXES]
+    span_offsets.append(0)
+    bci_offsets.append(0)
+    for bridge in bridge_data:
+        ids.append(bridge[ID_INDEX])
+        lats.append(bridge[LAT_INDEX])
+        lons.append(bridge[LON_INDEX])
+        num_spans.append(bridge[NUM_SPANS_INDEX])
+        lengths.append(bridge[LENGTH_INDEX])
+        span_values.extend(bridge[SPAN_DETAILS_INDEX])
+        span_offsets.append(len(span_values))
+        bci_values.extend(bridge[BCIS_INDEX])
+        bci_offsets.append(len(bci_values))
+        for column, index in zip(string_columns, STRING_INDEXES):
+            column.append(strings.setdefault(bridge[index], len(strings)))
+
+    string_offsets = array('q', [0])
+    string_data = bytearray()
+    for string in strings:
+        string_data += string.encode('utf-8')
+        string_offsets.append(len(string_data))
+
+    header = HEADER.pack(MAGIC, SNAPSHOT_VERSION, sys.byteorder == 'little',
+                         len(ids), len(span_values), len(bci_values),
+                         len(strings), len(string_data), checksum)
+    temp_path = snapshot_path + '.tmp'
+    with open(temp_path, 'wb') as snapshot_file:
+        snapshot_file.write(header)
+        _pad(snapshot_file, len(header))
+        for column in columns + string_columns + [string_offsets]:
+            column.tofile(snapshot_file)
+            _pad(snapshot_file, len(column) * column.itemsize)
+        snapshot_file.write(string_data)
+    os.replace(temp_path, snapshot_path)
+
+
+def get_column_layout(num_bridges: int, num_span_values: int,
+                      num_bci_values: int,
+                      num_strings: int) -> list[tuple[str, int]]:
+    """Return the array typecode and length of each column of a snapshot
+    of num_bridges bridges with num_span_values spans, num_bci_values BCIs
+    and num_strings strings, in the order they are stored. The string
+    bytes follow the last column.
+
+    >>> get_column_layout(3, 9, 22, 15)[5:7]
+    [('q', 4), ('d', 9)]
+    """
+
+    return ([('q', num_bridges), ('d', num_bridges), ('d', num_bridges),
+             ('q', num_bridges), ('d', num_bridges),
+             ('q', num_bridges + 1), ('d', num_span_values),
+             ('q', num_bridges + 1), ('d', num_bci_values)]
+            + [('I', num_bridges)] * len(STRING_INDEXES)
+            + [('q', num_strings + 1)])
+
+
+def get_snapshot_size(num_bridges: int, num_span_values: int,
+                      num_bci_values: int, num_strings: int,
+                      num_string_bytes: int) -> int:
+    """Return the size in bytes of a snapshot file of num_bridges bridges
+    with num_span_values spans, num_bci_values BCIs, and num_strings
+    strings taking num_string_bytes bytes, as written by save_snapshot.
+
+    >>> get_snapshot_size(0, 0, 0, 0, 0)
+    112
+    """
+
+    size = HEADER.size + -HEADER.size % ALIGNMENT
+    for typecode, count in get_column_layout(num_bridges, num_span_values,
+                                             num_bci_values, num_strings):
+        column_size = count * struct.calcsize(typecode)
+        size += column_size + -column_size % ALIGNMENT
+
+    return size + num_string_bytes
+
+
+def read_snapshot_checksum(snapshot_path: str) -> bytes:
+    """Return the source checksum recorded in the snapshot file at
+    snapshot_path, or None if there is no such file or it is not a
+    snapshot that this version can load.
+
+    """
+
+    try:
+        with open(snapshot_path, 'rb') as snapshot_file:
+            header = snapshot_file.read(HEADER.size)
+    except OSError:
+        return None
+
+    if len(header) < HEADER.size:
+        return None
+    magic, version, little, *_, checksum = HEADER.unpack(header)
+    if (magic != MAGIC or version != SNAPSHOT_VERSION
+            or little != (sys.byteorder == 'little')):
+        return None
+
+    return checksum
+
+
+def load_snapshot(snapshot_path: str, checksum: bytes = None) -> BridgeTable:
+    """Return a table holding the bridges in the snapshot file at
+    snapshot_path, with its columns mapped from the file rather than read.
+    Return None if there is no such file, it is not a snapshot that this
+    version can load, it is truncated or corrupt or, when checksum is not
+    None, it was made from a source whose checksum is not checksum.
+
+    The returned table supports everything a BridgeTable does except
+    append.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'bridges.snapshot')
+    ...     save_snapshot(THREE_BRIDGES, path)
+    ...     table = load_snapshot(path)
+    ...     records = table.to_records()
+    ...     stale = load_snapshot(path, b'x' * 32)
+    ...     with open(path, 'r+b') as snapshot_file:
+    ...         _ = snapshot_file.truncate(os.path.getsize(path) - 8)
+    ...     truncated = load_snapshot(path)
+    >>> records == THREE_BRIDGES, stale, truncated
+    (True, None, None)
+    """
+
+    found = read_snapshot_checksum(snapshot_path)
+    if found is None or checksum is not None and found != checksum:
+        return None
+
+    with open(snapshot_path, 'rb') as snapshot_file:
+        mapping = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    counts = HEADER.unpack_from(mapping)[3:8]
+    if len(mapping) != get_snapshot_size(*counts):
+        mapping.close()
+        return None
+
+    view = memoryview(mapping)
+    start = HEADER.size + -HEADER.size % ALIGNMENT
+    columns = []
+    for typecode, count in get_column_layout(*counts[:4]):
+        size = count * struct.calcsize(typecode)
+        columns.append(view[start:start + size].cast(typecode))
+        start += size + -size % ALIGNMENT
+
+    table = BridgeTable()
+    (table.ids, table.lats, table.lons, table.num_spans, table.lengths,
+     table.span_offsets, table.span_values, table.bci_offsets,
+     table.bci_values) = columns[:9]
+    string_indexes = columns[9:-1]
+    string_offsets = columns[-1]
+    string_data = view[start:start + counts[4]]
+
+    # The offsets end at the lengths in the header unless the file was
+    # overwritten in place.
+    if (table.span_offsets[-1] != counts[1]
+            or table.bci_offsets[-1] != counts[2]
+            or string_offsets[-1] != counts[4]):
+        return None
+    (table.names, table.highways, table.years, table.last_majors,
+     table.last_minors, table.last_inspected) = [
+         StringColumn(indexes, string_offsets, string_data)
+         for indexes in string_indexes]
+
+    return table
+
+
+def load_bridge_data(csv_path: str, snapshot_path: str = None) -> BridgeTable:
+    """Return a table holding the formatted bridge data from the CSV file
+    at csv_path. The data is loaded from the snapshot file at
+    snapshot_path, which defaults to csv_path with SNAPSHOT_SUFFIX added,
+    when that snapshot was made from the current contents of the CSV file.
+    Otherwise the CSV file is read and formatted, and the snapshot is
+    rebuilt.
+
+    >>> import csv, tempfile
+    >>> with tempfile.TemporaryDirectory() as directory:
+    ...     path = os.path.join(directory, 'bridges.csv')
+    ...     with open(path, 'w', newline='', encoding='utf-8') as csv_file:
+    ...         writer = csv.writer(csv_file)
+    ...         writer.writerows([['header'], ['header']])
+    ...         writer.writerows(THREE_BRIDGES_UNCLEANED)
+    ...     first = load_bridge_data(path).to_records()
+    ...     saved = os.path.exists(path + SNAPSHOT_SUFFIX)
+    ...     second = load_bridge_data(path).to_records()
+    ...     with open(path + SNAPSHOT_SUFFIX, 'r+b') as snapshot_file:
+    ...         _ = snapshot_file.truncate(200)
+    ...     rebuilt = load_bridge_data(path).to_records()
+    >>> first == second == rebuilt == THREE_BRIDGES, saved
+    (True, True)
+    """
+
+    if snapshot_path is None:
+        snapshot_path = csv_path + SNAPSHOT_SUFFIX
+    checksum = file_checksum(csv_path)
+    table = load_snapshot(snapshot_path, checksum)
+    if table is None:
+        with open(csv_path, encoding='utf-8') as csv_file:
+            bridge_data = read_data(csv_file)
+        format_data(bridge_data)
+        save_snapshot(bridge_data, snapshot_path, checksum)
+        table = load_snapshot(snapshot_path, checksum)
+
+    return table
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
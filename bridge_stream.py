@@ -0,0 +1,117 @@
+"""Streaming ingestion of bridge data.
+
+These functions read, format and aggregate bridge data one record at a
+time, so that large CSV exports can be processed without holding all of
+their rows in memory. Peak memory depends on the chunk size used, not on
+the size of the file. For example,
+
+    with open('bridge_data.csv', encoding='utf-8') as bridge_data_file:
+        records = stream_formatted(stream_data(bridge_data_file))
+        total = stream_total_length_on_hwy(records, '401')
+
+formats and sums one record at a time.
+
+"""
+
+import csv
+from itertools import islice
+from typing import Iterable, Iterator, TextIO
+
+from bridge_functions import (
+    format_record, get_bridges_in_radius, THREE_BRIDGES,
+    THREE_BRIDGES_UNCLEANED)
+from constants import HIGHWAY_INDEX, LENGTH_INDEX
+
+# Number of header lines at the top of a bridge data CSV file.
+HEADER_LINES = 2
+
+# Default number of records per chunk.
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def stream_data(csv_file: TextIO) -> Iterator[list[str]]:
+    """Yield the rows of the open CSV file csv_file one at a time, as lists
+    of strings, skipping its header lines. This yields the same rows as
+    read_data returns.
+
+    >>> from io import StringIO
+    >>> rows = stream_data(StringIO('header\\nheader\\n1,a\\n2,b\\n'))
+    >>> list(rows)
+    [['1', 'a'], ['2', 'b']]
+    """
+
+    return islice(csv.reader(csv_file), HEADER_LINES, None)
+
+
+def stream_formatted(rows: Iterable[list[str]],
+                     first_id: int = 1) -> Iterator[list]:
+    """Yield each of the uncleaned bridge records in rows formatted as
+    format_data formats it, numbering them from first_id. Each record is
+    formatted in place as it is reached.
+
+    >>> rows = [list(row) for row in THREE_BRIDGES_UNCLEANED]
+    >>> list(stream_formatted(rows)) == THREE_BRIDGES
+    True
+    """
+
+    bridge_id = first_id
+    for row in rows:
+        yield format_record(row, bridge_id)
+        bridge_id += 1
+
+
+def stream_chunks(records: Iterable[list],
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[list]:
+    """Yield the records in records in lists of chunk_size records, the last
+    of which may be shorter.
+
+    >>> list(stream_chunks([1, 2, 3, 4, 5], 2))
+    [[1, 2], [3, 4], [5]]
+    """
+
+    records = iter(records)
+    chunk = list(islice(records, chunk_size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(records, chunk_size))
+
+
+def stream_total_length_on_hwy(records: Iterable[list],
+                               highway: str) -> float:
+    """Return the total length of the bridges on the highway highway among
+    the formatted bridge records records, as get_total_length_on_hwy does.
+
+    >>> stream_total_length_on_hwy(iter(THREE_BRIDGES), '403')
+    126.0
+    >>> stream_total_length_on_hwy(iter(THREE_BRIDGES), '407')
+    0
+    """
+
+    total = 0
+    for bridge in records:
+        if bridge[HIGHWAY_INDEX] == highway:
+            total += bridge[LENGTH_INDEX]
+
+    return total
+
+
+def stream_bridges_in_radius(records: Iterable[list], latitude: float,
+                             longitude: float, radius: float,
+                             chunk_size: int = DEFAULT_CHUNK_SIZE
+                             ) -> Iterator[int]:
+    """Yield the ids of the formatted bridge records in records that are
+    within radius radius of the location with latitude and longitude
+    latitude and longitude, in the order get_bridges_in_radius returns them.
+    Records are checked chunk_size at a time.
+
+    >>> list(stream_bridges_in_radius(iter(THREE_BRIDGES), 43.10, -80.15, 50))
+    [1, 2]
+    """
+
+    for chunk in stream_chunks(records, chunk_size):
+        yield from get_bridges_in_radius(chunk, latitude, longitude, radius)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,329 @@
+"""A columnar store for formatted bridge data.
+
+A BridgeTable keeps each field of the bridge records in its own column:
+typed arrays for the numeric fields, shared strings for the text fields,
+and offset + value arrays for the ragged span and BCI lists. Indexing or
+iterating over a table yields the usual list rows, so a table can be
+passed to any query function in bridge_functions in place of a list of
+lists. Those rows are copies, so inspect_bridges and add_rehab hand a
+table's updates to its own inspect_bridges and add_rehab methods.
+
+format_data formats a list of rows in place, and a table is not a list of
+rows, so BridgeTable.from_raw formats raw rows straight into a new table
+instead.
+
+"""
+
+from array import array
+
+from bridge_functions import (
+    format_record, notify_bridges_changed, THREE_BRIDGES,
+    THREE_BRIDGES_UNCLEANED)
+from constants import (
+    ID_INDEX, NAME_INDEX, HIGHWAY_INDEX, LAT_INDEX, LON_INDEX, YEAR_INDEX,
+    LAST_MAJOR_INDEX, LAST_MINOR_INDEX, NUM_SPANS_INDEX, SPAN_DETAILS_INDEX,
+    LENGTH_INDEX, LAST_INSPECTED_INDEX, BCIS_INDEX)
+
+
+class BridgeTable:
+    """Formatted bridge data, stored column by column.
+
+    The BCIs of a bridge are stored newest first, like in a bridge record.
+    Inspections recorded after a bridge was added are kept newest last in a
+    separate list for that bridge, so that recording one is O(1). Like
+    inspect_bridges and add_rehab, record_inspection and set_rehab notify
+    the watchers registered with watch_bridge_data.
+
+    >>> table = BridgeTable.from_records(THREE_BRIDGES)
+    >>> len(table)
+    3
+    >>> table[2] == THREE_BRIDGES[2]
+    True
+    >>> list(table) == THREE_BRIDGES
+    True
+
+    """
+
+    def __init__(self) -> None:
+        """Initialize a new, empty table."""
+
+        self.ids = array('q')
+        self.names = []
+        self.highways = []
+        self.lats = array('d')
+        self.lons = array('d')
+        self.years = []
+        self.last_majors = []
+        self.last_minors = []
+        self.num_spans = array('q')
+        self.span_offsets = array('q', [0])
+        self.span_values = array('d')
+        self.lengths = array('d')
+        self.last_inspected = []
+        self.bci_offsets = array('q', [0])
+        self.bci_values = array('d')
+        self._new_bcis = {}
+        self._strings = {}
+
+    @classmethod
+    def from_records(cls, bridge_data: list[list]) -> 'BridgeTable':
+        """Return a new table holding the bridges in bridge data
+        bridge_data.
+
+        Precondition: Valid bridge data.
+
+        """
+
+        table = cls()
+        for bridge in bridge_data:
+            table.append(bridge)
+
+        return table
+
+    @classmethod
+    def from_raw(cls, data: list[list[str]]) -> 'BridgeTable':
+        """Return a new table holding the uncleaned bridge data data,
+        formatted as format_data would format it. Each row is formatted and
+        stored on its own, and data is not modified.
+
+        >>> table = BridgeTable.from_raw(THREE_BRIDGES_UNCLEANED)
+        >>> list(table) == THREE_BRIDGES
+        True
+        """
+
+        table = cls()
+        for i in range(len(data)):
+            table.append(format_record(list(data[i]), i + 1))
+
+        return table
+
+    def _shared(self, string: str) -> str:
+        """Return a string equal to string, reusing an equal string already
+        stored in this table when there is one.
+
+        """
+
+        return self._strings.setdefault(string, string)
+
+    def append(self, bridge: list) -> None:
+        """Add the bridge record bridge to the end of this table.
+
+        >>> table = BridgeTable()
+        >>> table.append(THREE_BRIDGES[0])
+        >>> table[0] == THREE_BRIDGES[0]
+        True
+        """
+
+        self.ids.append(bridge[ID_INDEX])
+        self.names.append(bridge[NAME_INDEX])
+        self.highways.append(self._shared(bridge[HIGHWAY_INDEX]))
+        self.lats.append(bridge[LAT_INDEX])
+        self.lons.append(bridge[LON_INDEX])
+        self.years.append(self._shared(bridge[YEAR_INDEX]))
+        self.last_majors.append(self._shared(bridge[LAST_MAJOR_INDEX]))
+        self.last_minors.append(self._shared(bridge[LAST_MINOR_INDEX]))
+        self.num_spans.append(bridge[NUM_SPANS_INDEX])
+        self.span_values.extend(bridge[SPAN_DETAILS_INDEX])
+        self.span_offsets.append(len(self.span_values))
+        self.lengths.append(bridge[LENGTH_INDEX])
+        self.last_inspected.append(self._shared(bridge[LAST_INSPECTED_INDEX]))
+        self.bci_values.extend(bridge[BCIS_INDEX])
+        self.bci_offsets.append(len(self.bci_values))
+
+    def __len__(self) -> int:
+        """Return the number of bridges in this table."""
+
+        return len(self.ids)
+
+    def _position(self, pos: int) -> int:
+        """Return the non-negative position for the list-style position
+        pos, raising IndexError if it is out of range.
+
+        """
+
+        if pos < 0:
+            pos += len(self.ids)
+        if not 0 <= pos < len(self.ids):
+            raise IndexError('bridge table index out of range')
+
+        return pos
+
+    def get_spans(self, pos: int) -> list[float]:
+        """Return the span lengths of the bridge at position pos.
+
+        >>> BridgeTable.from_records(THREE_BRIDGES).get_spans(2)
+        [16.0]
+        """
+
+        pos = self._position(pos)
+        return self.span_values[
+            self.span_offsets[pos]:self.span_offsets[pos + 1]].tolist()
+
+    def get_bcis(self, pos: int) -> list[float]:
+        """Return the BCIs of the bridge at position pos, newest first.
+
+        >>> BridgeTable.from_records(THREE_BRIDGES).get_bcis(1)
+        [71.5, 68.1, 69.0, 69.4, 69.4, 70.3, 73.3]
+        """
+
+        pos = self._position(pos)
+        bcis = self._new_bcis.get(pos, [])[::-1]
+        bcis.extend(
+            self.bci_values[self.bci_offsets[pos]:self.bci_offsets[pos + 1]])
+
+        return bcis
+
+    def get_latest_bci(self, pos: int) -> float | None:
+        """Return the most recent BCI of the bridge at position pos, or None
+        if the bridge has no BCIs.
+
+        >>> BridgeTable.from_records(THREE_BRIDGES).get_latest_bci(0)
+        72.3
+        """
+
+        pos = self._position(pos)
+        if pos in self._new_bcis:
+            return self._new_bcis[pos][-1]
+        if self.bci_offsets[pos] < self.bci_offsets[pos + 1]:
+            return self.bci_values[self.bci_offsets[pos]]
+
+        return None
+
+    def __getitem__(self, pos: int) -> list:
+        """Return the bridge record at position pos, as a new list.
+
+        Changing the returned list does not change this table.
+
+        """
+
+        pos = self._position(pos)
+        bridge = [None] * (BCIS_INDEX + 1)
+        bridge[ID_INDEX] = self.ids[pos]
+        bridge[NAME_INDEX] = self.names[pos]
+        bridge[HIGHWAY_INDEX] = self.highways[pos]
+        bridge[LAT_INDEX] = self.lats[pos]
+        bridge[LON_INDEX] = self.lons[pos]
+        bridge[YEAR_INDEX] = self.years[pos]
+        bridge[LAST_MAJOR_INDEX] = self.last_majors[pos]
+        bridge[LAST_MINOR_INDEX] = self.last_minors[pos]
+        bridge[NUM_SPANS_INDEX] = self.num_spans[pos]
+        bridge[SPAN_DETAILS_INDEX] = self.get_spans(pos)
+        bridge[LENGTH_INDEX] = self.lengths[pos]
+        bridge[LAST_INSPECTED_INDEX] = self.last_inspected[pos]
+        bridge[BCIS_INDEX] = self.get_bcis(pos)
+
+        return bridge
+
+    def __iter__(self):
+        """Yield the bridge records in this table, in order, as new lists."""
+
+        for pos in range(len(self.ids)):
+            yield self[pos]
+
+    def to_records(self) -> list[list]:
+        """Return the bridges in this table as a list of bridge records.
+
+        >>> table = BridgeTable.from_records(THREE_BRIDGES)
+        >>> table.to_records() == THREE_BRIDGES
+        True
+        """
+
+        return list(self)
+
+    def record_inspection(self, pos: int, date: str, bci: float) -> None:
+        """Record a new inspection on date date with BCI score bci for the
+        bridge at position pos.
+
+        >>> table = BridgeTable.from_records(THREE_BRIDGES)
+        >>> table.record_inspection(2, '09/15/2018', 71.9)
+        >>> table[2][LAST_INSPECTED_INDEX], table.get_bcis(2)[:2]
+        ('09/15/2018', [71.9, 85.1])
+        """
+
+        pos = self._position(pos)
+        self.last_inspected[pos] = self._shared(date)
+        self._new_bcis.setdefault(pos, []).append(bci)
+        notify_bridges_changed(self, [self.ids[pos]])
+
+    def inspect_bridges(self, bridge_ids: list[int], date: str,
+                        bci: float) -> None:
+        """Record a new inspection on date date with BCI score bci for
+        every bridge with an id in bridge_ids, as
+        bridge_functions.inspect_bridges does for a list of bridges, which
+        calls this method when given a table.
+
+        >>> from bridge_functions import inspect_bridges
+        >>> table = BridgeTable.from_records(THREE_BRIDGES)
+        >>> inspect_bridges(table, [1, 3, 42], '09/15/2018', 71.9)
+        >>> [table.get_latest_bci(pos) for pos in range(3)]
+        [71.9, 71.5, 71.9]
+        """
+
+        bridge_ids = set(bridge_ids)
+        positions = [pos for pos in range(len(self.ids))
+                     if self.ids[pos] in bridge_ids]
+        date = self._shared(date)
+        for pos in positions:
+            self.last_inspected[pos] = date
+            self._new_bcis.setdefault(pos, []).append(bci)
+
+        if positions:
+            notify_bridges_changed(self, [self.ids[pos]
+                                          for pos in positions])
+
+    def set_rehab(self, pos: int, date: str, major: bool) -> None:
+        """Update the major rehab year, if major is True, or the minor rehab
+        year otherwise, of the bridge at position pos from the date date in
+        the format MM/DD/YYYY.
+
+        >>> table = BridgeTable.from_records(THREE_BRIDGES)
+        >>> table.set_rehab(0, '09/15/2018', False)
+        >>> table[0][LAST_MINOR_INDEX]
+        '2018'
+        """
+
+        pos = self._position(pos)
+        if major:
+            self.last_majors[pos] = self._shared(date[6:])
+        else:
+            self.last_minors[pos] = self._shared(date[6:])
+        notify_bridges_changed(self, [self.ids[pos]])
+
+    def add_rehab(self, bridge_id: int, date: str, major: bool) -> None:
+        """Update the major rehab year, if major is True, or the minor
+        rehab year otherwise, of the bridge with id bridge_id from the date
+        date, as bridge_functions.add_rehab does for a list of bridges,
+        which calls this method when given a table. If there is no such
+        bridge, this has no effect.
+
+        >>> from bridge_functions import add_rehab
+        >>> table = BridgeTable.from_records(THREE_BRIDGES)
+        >>> add_rehab(table, 2, '09/15/2019', True)
+        >>> add_rehab(table, 42, '09/15/2019', True)
+        >>> [bridge[LAST_MAJOR_INDEX] for bridge in table]
+        ['2014', '2019', '2013']
+
+        Tables loaded from a snapshot, whose columns are not arrays, are
+        updated the same way.
+
+        >>> import os, tempfile
+        >>> from bridge_snapshot import load_snapshot, save_snapshot
+        >>> with tempfile.TemporaryDirectory() as directory:
+        ...     path = os.path.join(directory, 'bridges.snapshot')
+        ...     save_snapshot(THREE_BRIDGES, path)
+        ...     table = load_snapshot(path)
+        ...     add_rehab(table, 3, '09/15/2019', False)
+        ...     minors = [bridge[LAST_MINOR_INDEX] for bridge in table]
+        >>> minors
+        ['2009', '2007', '2019']
+        """
+
+        for pos in range(len(self.ids)):
+            if self.ids[pos] == bridge_id:
+                self.set_rehab(pos, date, major)
+                return
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
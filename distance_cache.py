@@ -0,0 +1,212 @@
+"""A bounded cache of the distances between pairs of bridges.
+
+Nearest-bridge and clustering workloads ask for the same bridge-to-bridge
+distances over and over. A DistanceCache keeps the most recently used
+distances, keyed on the ids of the two bridges, and evicts the least
+recently used ones once it is full. Each entry also records the locations
+it was computed from, so a distance is recomputed as soon as either
+bridge has moved.
+
+"""
+
+from collections import OrderedDict
+from typing import NamedTuple
+
+from bridge_functions import get_bridge, get_distance_between, THREE_BRIDGES
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX
+
+# Number of bridge pairs a DistanceCache keeps by default.
+DEFAULT_MAX_SIZE = 100_000
+
+
+class CacheStats(NamedTuple):
+    """How a DistanceCache has been used.
+
+    hits and misses count the lookups that did and did not find a distance
+    in the cache, evictions counts the distances dropped to make room, and
+    invalidations counts the distances found out of date because a bridge
+    had moved, which are also counted as misses. size is the number of
+    distances in the cache.
+
+    """
+
+    hits: int
+    misses: int
+    evictions: int
+    invalidations: int
+    size: int
+
+
+def condensed_index(num_bridges: int, i: int, j: int) -> int:
+    """Return the position of the distance between bridges i and j, where
+    i < j, in a condensed matrix of the distances between num_bridges
+    bridges, as returned by DistanceCache.get_condensed_matrix.
+
+    >>> [condensed_index(4, i, j) for i, j in ((0, 1), (0, 3), (1, 2), (2, 3))]
+    [0, 2, 3, 5]
+    """
+
+    return num_bridges * i - i * (i + 1) // 2 + j - i - 1
+
+
+class DistanceCache:
+    """A least recently used cache of the distances between the bridges of
+    some bridge data.
+
+    >>> cache = DistanceCache(THREE_BRIDGES, max_size=2)
+    >>> cache.get_distance(1, 2), cache.get_distance(2, 1)
+    (1.968, 1.968)
+    >>> cache.get_closest_bridge(3)
+    1
+    >>> cache.stats()
+    CacheStats(hits=1, misses=3, evictions=1, invalidations=0, size=2)
+
+    """
+
+    def __init__(self, bridge_data: list[list],
+                 max_size: int = DEFAULT_MAX_SIZE) -> None:
+        """Initialize a new, empty cache of the distances between the
+        bridges in bridge data bridge_data, holding at most max_size
+        distances.
+
+        """
+
+        self.bridge_data = bridge_data
+        self.max_size = max_size
+        self._distances = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._invalidations = 0
+
+    def __len__(self) -> int:
+        """Return the number of distances in this cache."""
+
+        return len(self._distances)
+
+    def get_distance_between(self, bridge1: list, bridge2: list) -> float:
+        """Return the distance between bridges bridge1 and bridge2, as
+        get_distance_between does.
+
+        >>> cache = DistanceCache(THREE_BRIDGES)
+        >>> cache.get_distance_between(THREE_BRIDGES[2], THREE_BRIDGES[0])
+        224.451
+        """
+
+        id1, id2 = bridge1[ID_INDEX], bridge2[ID_INDEX]
+        if id1 > id2:
+            id1, id2, bridge1, bridge2 = id2, id1, bridge2, bridge1
+        location = (bridge1[LAT_INDEX], bridge1[LON_INDEX],
+                    bridge2[LAT_INDEX], bridge2[LON_INDEX])
+        key = (id1, id2)
+        entry = self._distances.get(key)
+        if entry is not None:
+            if entry[0] == location:
+                self._hits += 1
+                self._distances.move_to_end(key)
+                return entry[1]
+            self._invalidations += 1
+
+        self._misses += 1
+        distance = get_distance_between(bridge1, bridge2)
+        if self.max_size > 0:
+            self._distances[key] = (location, distance)
+            self._distances.move_to_end(key)
+            if len(self._distances) > self.max_size:
+                self._distances.popitem(last=False)
+                self._evictions += 1
+
+        return distance
+
+    def get_distance(self, bridge_id1: int, bridge_id2: int) -> float:
+        """Return the distance between the bridges with ids bridge_id1 and
+        bridge_id2 in this cache's bridge data.
+
+        Precondition: Both bridges are in this cache's bridge data.
+
+        >>> DistanceCache(THREE_BRIDGES).get_distance(3, 1)
+        224.451
+        """
+
+        return self.get_distance_between(
+            get_bridge(self.bridge_data, bridge_id1),
+            get_bridge(self.bridge_data, bridge_id2))
+
+    def get_closest_bridge(self, bridge_id: int) -> int:
+        """Return the id of the bridge which is closest to the bridge with
+        id bridge_id, as get_closest_bridge does.
+
+        Precondition: Bridge with id bridge_id is in this cache's bridge
+        data, and there are at least two bridges in it.
+
+        >>> DistanceCache(THREE_BRIDGES).get_closest_bridge(2)
+        1
+        """
+
+        target = get_bridge(self.bridge_data, bridge_id)
+        closest_bridge = None
+        closest_distance = None
+        for bridge in self.bridge_data:
+            if bridge != target:
+                distance = self.get_distance_between(bridge, target)
+                if closest_distance is None or distance < closest_distance:
+                    closest_bridge = bridge
+                    closest_distance = distance
+
+        return closest_bridge[ID_INDEX]
+
+    def get_condensed_matrix(self, bridge_ids: list[int]) -> list[float]:
+        """Return the condensed matrix of the distances between the bridges
+        with ids bridge_ids: the distance between bridge_ids[i] and
+        bridge_ids[j], for each i < j, in order, at position
+        condensed_index(len(bridge_ids), i, j). The distances are added to
+        this cache.
+
+        This takes a quadratic number of distances, so it is meant for
+        small sets of bridges, such as those of one region.
+
+        Precondition: Every id in bridge_ids is in this cache's bridge data.
+
+        >>> cache = DistanceCache(THREE_BRIDGES)
+        >>> cache.get_condensed_matrix([1, 2, 3])
+        [1.968, 224.451, 225.459]
+        >>> cache.get_distance(2, 3)
+        225.459
+        >>> cache.stats().hits
+        1
+        """
+
+        bridges = [get_bridge(self.bridge_data, bridge_id)
+                   for bridge_id in bridge_ids]
+        return [self.get_distance_between(bridges[i], bridges[j])
+                for i in range(len(bridges))
+                for j in range(i + 1, len(bridges))]
+
+    def invalidate(self, bridge_id: int = None) -> None:
+        """Drop every distance to the bridge with id bridge_id from this
+        cache, or every distance if bridge_id is None.
+
+        >>> cache = DistanceCache(THREE_BRIDGES)
+        >>> _ = cache.get_condensed_matrix([1, 2, 3])
+        >>> cache.invalidate(1)
+        >>> len(cache)
+        1
+        """
+
+        if bridge_id is None:
+            self._distances.clear()
+            return
+
+        for key in [key for key in self._distances if bridge_id in key]:
+            del self._distances[key]
+
+    def stats(self) -> CacheStats:
+        """Return the statistics of this cache."""
+
+        return CacheStats(self._hits, self._misses, self._evictions,
+                          self._invalidations, len(self._distances))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,166 @@
+"""Cached per-highway aggregates of bridge data.
+
+HighwayStats groups the bridges of some bridge data by highway in one pass
+and caches, for each highway, the total length, number of bridges, mean
+and minimum latest BCI, and total number of spans. When bridges change
+through inspect_bridges or add_rehab, only the highways of the changed
+bridges are recomputed, the next time they are looked up.
+
+"""
+
+from bisect import insort
+from copy import deepcopy
+from typing import NamedTuple
+
+from bridge_functions import (
+    get_total_length_on_hwy, inspect_bridges, BridgeWatcher, THREE_BRIDGES)
+from constants import (
+    ID_INDEX, HIGHWAY_INDEX, NUM_SPANS_INDEX, LENGTH_INDEX, BCIS_INDEX)
+
+
+class HighwaySummary(NamedTuple):
+    """Aggregates over the bridges on one highway.
+
+    mean_bci and min_bci are over the latest BCI of each bridge that has
+    one, and are 0 if no bridge on the highway has a BCI.
+
+    """
+
+    total_length: float
+    num_bridges: int
+    mean_bci: float
+    min_bci: float
+    total_spans: int
+
+
+# The summary of a highway with no bridges.
+EMPTY_SUMMARY = HighwaySummary(0, 0, 0, 0, 0)
+
+
+class HighwayStats(BridgeWatcher):
+    """Per-highway aggregates of some bridge data, kept up to date as the
+    bridge data changes.
+
+    >>> stats = HighwayStats(THREE_BRIDGES)
+    >>> stats.get_total_length('403')
+    126.0
+    >>> summary = stats.get_summary('403')
+    >>> summary.num_bridges, summary.min_bci, summary.total_spans
+    (2, 71.5, 8)
+    >>> stats.get_summary('407') == EMPTY_SUMMARY
+    True
+
+    """
+
+    def __init__(self, bridge_data: list[list]) -> None:
+        """Initialize new aggregates over the bridge data bridge_data, and
+        start watching it for changes.
+
+        """
+
+        self._members = {}
+        self._highways = {}
+        self._summaries = {}
+        super().__init__(bridge_data)
+
+    def refresh(self) -> None:
+        """Regroup the bridges by highway from scratch. Call this after
+        adding or removing bridges.
+
+        """
+
+        super().refresh()
+        self._members = {}
+        self._highways = {}
+        self._summaries = {}
+        for pos in range(len(self.bridge_data)):
+            bridge = self.bridge_data[pos]
+            self._highways[bridge[ID_INDEX]] = bridge[HIGHWAY_INDEX]
+            self._members.setdefault(bridge[HIGHWAY_INDEX], []).append(pos)
+
+    def update_bridges(self, bridge_ids: list[int],
+                       positions: list[int]) -> None:
+        """Note that the bridges with ids bridge_ids, at positions
+        positions in the bridge data, have changed.
+
+        >>> bridges = deepcopy(THREE_BRIDGES)
+        >>> stats = HighwayStats(bridges)
+        >>> stats.get_summary('6').min_bci
+        85.1
+        >>> inspect_bridges(bridges, [3], '09/15/2018', 71.9)
+        >>> stats.get_summary('6').min_bci
+        71.9
+        """
+
+        for bridge_id, pos in zip(bridge_ids, positions):
+            old_highway = self._highways[bridge_id]
+            new_highway = self.bridge_data[pos][HIGHWAY_INDEX]
+            self._summaries.pop(old_highway, None)
+            if new_highway != old_highway:
+                self._members[old_highway].remove(pos)
+                if not self._members[old_highway]:
+                    del self._members[old_highway]
+                insort(self._members.setdefault(new_highway, []), pos)
+                self._highways[bridge_id] = new_highway
+                self._summaries.pop(new_highway, None)
+
+    def _summarize(self, highway: str) -> HighwaySummary:
+        """Return the aggregates for the highway highway, computed from the
+        bridge data.
+
+        """
+
+        total_length = 0
+        total_spans = 0
+        bcis = []
+        members = self._members.get(highway, [])
+        for pos in members:
+            bridge = self.bridge_data[pos]
+            total_length += bridge[LENGTH_INDEX]
+            total_spans += bridge[NUM_SPANS_INDEX]
+            if bridge[BCIS_INDEX]:
+                bcis.append(bridge[BCIS_INDEX][0])
+
+        if not bcis:
+            return HighwaySummary(total_length, len(members), 0, 0,
+                                  total_spans)
+
+        return HighwaySummary(total_length, len(members),
+                              sum(bcis) / len(bcis), min(bcis), total_spans)
+
+    def get_summary(self, highway: str) -> HighwaySummary:
+        """Return the aggregates for the bridges on the highway highway."""
+
+        if highway not in self._members:
+            return EMPTY_SUMMARY
+        if highway not in self._summaries:
+            self._summaries[highway] = self._summarize(highway)
+
+        return self._summaries[highway]
+
+    def get_summaries(self) -> dict[str, HighwaySummary]:
+        """Return a dictionary from every highway in the bridge data to the
+        aggregates for the bridges on it.
+
+        >>> sorted(HighwayStats(THREE_BRIDGES).get_summaries())
+        ['403', '6']
+        """
+
+        return {highway: self.get_summary(highway)
+                for highway in self._members}
+
+    def get_total_length(self, highway: str) -> float:
+        """Return the total length of bridges on the highway highway, as
+        get_total_length_on_hwy does.
+
+        >>> (HighwayStats(THREE_BRIDGES).get_total_length('6')
+        ...  == get_total_length_on_hwy(THREE_BRIDGES, '6'))
+        True
+        """
+
+        return self.get_summary(highway).total_length
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
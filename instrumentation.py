@@ -0,0 +1,331 @@
+"""Opt-in instrumentation of the public functions in bridge_functions.
+
+While instrumentation is enabled, every public function of bridge_functions
+is replaced, in every loaded module that refers to it, by a wrapper that
+records its number of calls, its wall time, the number of bridge records it
+read from its bridge data and the number of haversine distances it
+computed. Disabling the instrumentation puts the original functions back,
+so it costs nothing while it is off. For example,
+
+    with instrument() as stats:
+        assign_inspectors(bridges, inspectors, 10)
+    print(stats.report())
+
+Only calls made through a module attribute are recorded, so code that
+looked a function up before the instrumentation was enabled, or holds it in
+a local name, is not seen.
+
+Counts are inclusive: the rows and haversine distances of a function
+include those of the bridge functions it calls. Counting rows hands each
+function a wrapper around its bridge data, which slows every access down,
+so pass count_rows=False to measure wall time alone.
+
+"""
+
+import cProfile
+import json
+import pstats
+import sys
+from functools import wraps
+from io import StringIO
+from time import perf_counter
+from types import FunctionType
+
+import bridge_functions
+from bridge_functions import THREE_BRIDGES
+
+# Functions whose results are haversine distances, one per element.
+HAVERSINE_FUNCTIONS = ('calculate_distance', 'calculate_distances')
+
+# Names of the parameter holding the bridge data scanned by a function.
+DATA_PARAMETERS = ('bridge_data', 'data')
+
+# Functions handed their bridge data unwrapped, because they compare it by
+# identity.
+IDENTITY_FUNCTIONS = ('notify_bridges_changed',)
+
+# The instrumentation that is enabled, if any.
+_active = None
+
+
+class FunctionStats:
+    """What was recorded about the calls to one function."""
+
+    def __init__(self, name: str) -> None:
+        """Initialize empty statistics for the function named name."""
+
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.haversines = 0
+
+    def to_dict(self) -> dict:
+        """Return these statistics as a dictionary.
+
+        >>> FunctionStats('get_bridge').to_dict()['calls']
+        0
+        """
+
+        return {'calls': self.calls, 'seconds': self.seconds,
+                'rows': self.rows, 'haversines': self.haversines}
+
+
+class CountedRows:
+    """Bridge data that counts the records read from it.
+
+    Every record read by indexing or iteration adds one to the rows of each
+    of the given statistics. Other attributes are those of the wrapped
+    bridge data.
+
+    """
+
+    def __init__(self, bridge_data: list[list],
+                 stats: list[FunctionStats]) -> None:
+        """Initialize new counted access to the bridge data bridge_data,
+        counting reads in each of stats.
+
+        """
+
+        self.bridge_data = bridge_data
+        self._stats = stats
+
+    def _count(self, rows: int) -> None:
+        """Add rows to the rows of each of the statistics."""
+
+        for stats in self._stats:
+            stats.rows += rows
+
+    def __len__(self) -> int:
+        """Return the number of records in the bridge data."""
+
+        return len(self.bridge_data)
+
+    def __getitem__(self, pos):
+        """Return the record or records at pos in the bridge data."""
+
+        records = self.bridge_data[pos]
+        self._count(len(records) if isinstance(pos, slice) else 1)
+        return records
+
+    def __iter__(self):
+        """Yield the records of the bridge data, in order."""
+
+        for bridge in self.bridge_data:
+            self._count(1)
+            yield bridge
+
+    def __getattr__(self, name: str):
+        """Return the attribute name of the bridge data."""
+
+        return getattr(self.bridge_data, name)
+
+
+class Instrumentation:
+    """Statistics on the calls to the public functions of bridge_functions,
+    recorded while this instrumentation is enabled.
+
+    >>> with instrument() as stats:
+    ...     bridge_functions.get_closest_bridge(THREE_BRIDGES, 1)
+    2
+    >>> stats.get_stats('get_closest_bridge').calls
+    1
+    >>> stats.get_stats('calculate_distance').calls > 0
+    True
+
+    """
+
+    def __init__(self, count_rows: bool = True) -> None:
+        """Initialize a new, disabled instrumentation, which counts the bridge
+        records read by each function if count_rows is True.
+
+        """
+
+        self.count_rows = count_rows
+        self.stats = {}
+        self._stack = []
+        self._patched = []
+
+    def _wrap(self, name: str, function, scans_data: bool):
+        """Return a wrapper around the function function named name that
+        records its calls. If scans_data is True, its first argument is
+        bridge data whose reads are counted.
+
+        """
+
+        stats = self.stats.setdefault(name, FunctionStats(name))
+        stack = self._stack
+        haversine = name in HAVERSINE_FUNCTIONS
+        count_rows = self.count_rows and scans_data
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            stats.calls += 1
+            stack.append(stats)
+            if args and isinstance(args[0], CountedRows):
+                args = (args[0].bridge_data,) + args[1:]
+            if count_rows and args:
+                args = (CountedRows(args[0], list(stack)),) + args[1:]
+            nested = stats.haversines
+            start = perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            finally:
+                stats.seconds += perf_counter() - start
+                stack.pop()
+
+            if haversine:
+                # calculate_distances may call calculate_distance, whose
+                # distances have been counted already.
+                size = getattr(result, 'size', None)
+                if size is None:
+                    size = len(result) if hasattr(result, '__len__') else 1
+                new = size - (stats.haversines - nested)
+                for caller in stack:
+                    caller.haversines += new
+                stats.haversines += new
+
+            return result
+
+        return wrapper
+
+    def enable(self) -> None:
+        """Start recording calls to the public functions of
+        bridge_functions, in every loaded module that refers to them.
+
+        """
+
+        global _active
+        if _active is not None:
+            raise RuntimeError('instrumentation is already enabled')
+        _active = self
+
+        wrappers = {}
+        for name, value in vars(bridge_functions).items():
+            if (isinstance(value, FunctionType) and not name.startswith('_')
+                    and getattr(value, '__module__', None)
+                    == bridge_functions.__name__):
+                code = value.__code__
+                scans_data = (name not in IDENTITY_FUNCTIONS
+                              and code.co_argcount > 0
+                              and code.co_varnames[0] in DATA_PARAMETERS)
+                wrappers[id(value)] = self._wrap(name, value, scans_data)
+
+        for module in list(sys.modules.values()):
+            namespace = getattr(module, '__dict__', {})
+            for name, value in list(namespace.items()):
+                if id(value) in wrappers and callable(value):
+                    namespace[name] = wrappers[id(value)]
+                    self._patched.append((namespace, name, value))
+
+    def disable(self) -> None:
+        """Stop recording calls, and put the original functions back."""
+
+        global _active
+        for namespace, name, value in reversed(self._patched):
+            namespace[name] = value
+        self._patched = []
+        _active = None
+
+    def __enter__(self) -> 'Instrumentation':
+        """Enable this instrumentation and return it."""
+
+        self.enable()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        """Disable this instrumentation."""
+
+        self.disable()
+
+    def get_stats(self, name: str) -> FunctionStats:
+        """Return the statistics for the function named name."""
+
+        return self.stats.setdefault(name, FunctionStats(name))
+
+    def reset(self) -> None:
+        """Forget everything recorded so far."""
+
+        for stats in self.stats.values():
+            stats.calls = stats.rows = stats.haversines = 0
+            stats.seconds = 0.0
+
+    def to_dict(self) -> dict[str, dict]:
+        """Return a dictionary from the name of each function that was
+        called to its statistics.
+
+        >>> with instrument() as stats:
+        ...     _ = bridge_functions.get_average_bci(THREE_BRIDGES, 1)
+        >>> sorted(stats.to_dict())
+        ['get_average_bci', 'get_bridge']
+        """
+
+        return {name: stats.to_dict() for name, stats in self.stats.items()
+                if stats.calls}
+
+    def to_json(self) -> str:
+        """Return the statistics of to_dict as JSON text."""
+
+        return json.dumps(self.to_dict(), indent=1, sort_keys=True)
+
+    def report(self) -> str:
+        """Return a table of the statistics of every function that was
+        called, slowest first.
+
+        >>> with instrument() as stats:
+        ...     _ = bridge_functions.get_average_bci(THREE_BRIDGES, 3)
+        >>> print(stats.report().splitlines()[0])
+        function                       calls    seconds       rows haversines
+        """
+
+        lines = [f'{"function":<28} {"calls":>7} {"seconds":>10} '
+                 f'{"rows":>10} {"haversines":>10}']
+        for stats in sorted(self.stats.values(),
+                            key=lambda stats: -stats.seconds):
+            if stats.calls:
+                lines.append(f'{stats.name:<28} {stats.calls:>7} '
+                             f'{stats.seconds:>10.6f} {stats.rows:>10} '
+                             f'{stats.haversines:>10}')
+
+        return '\n'.join(lines)
+
+
+def instrument(count_rows: bool = True) -> Instrumentation:
+    """Return a new instrumentation, to be enabled with a with statement,
+    which counts the bridge records read by each function if count_rows is
+    True.
+
+    >>> with instrument() as stats:
+    ...     bridge_functions.get_closest_bridge(THREE_BRIDGES, 3)
+    1
+    >>> stats.get_stats('get_closest_bridge').haversines
+    2
+    >>> stats.get_stats('get_closest_bridge').rows
+    5
+    """
+
+    return Instrumentation(count_rows)
+
+
+def profile_call(call, sort_by: str = 'cumulative', limit: int = 25) -> str:
+    """Call the function call with no arguments under cProfile, and return
+    its pstats report, sorted by sort_by and limited to limit lines.
+
+    >>> text = profile_call(
+    ...     lambda: bridge_functions.get_closest_bridge(THREE_BRIDGES, 1))
+    >>> 'get_closest_bridge' in text
+    True
+    """
+
+    profiler = cProfile.Profile()
+    profiler.runcall(call)
+    stream = StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats(sort_by).print_stats(
+        limit)
+
+    return stream.getvalue()
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
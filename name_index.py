@@ -0,0 +1,194 @@
+"""A trigram index over bridge names for fast case-insensitive search.
+
+Every bridge name is lowercased once, and each three-character substring
+(trigram) of it is mapped to the bridges whose names contain it. A search
+for a string of at least three characters only checks the bridges that
+contain all of its trigrams.
+
+"""
+
+from bridge_functions import THREE_BRIDGES
+from constants import ID_INDEX, NAME_INDEX
+
+# Prepended to every indexed name, so that the trigrams of a prefix search
+# only match at the start of a name.
+START = '\x00'
+
+
+def get_trigrams(text: str) -> set[str]:
+    """Return the set of three-character substrings of text.
+
+    >>> sorted(get_trigrams('bridge'))
+    ['bri', 'dge', 'idg', 'rid']
+    >>> get_trigrams('ab')
+    set()
+    """
+
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """A searchable index of bridge names.
+
+    Searches return bridge ids in the order the bridges were added to the
+    index, which for an index built from bridge data is the order of the
+    bridge data, as in get_bridges_containing.
+
+    >>> index = NameIndex(THREE_BRIDGES)
+    >>> index.search('underpass')
+    [1, 2]
+    >>> index.search('pAss')
+    [1, 2]
+    >>> index.search('mouse')
+    []
+
+    """
+
+    def __init__(self, bridge_data: list[list] = ()) -> None:
+        """Initialize a new index of the names of the bridges in bridge data
+        bridge_data.
+
+        """
+
+        self._ids = []
+        self._names = []
+        self._positions = {}
+        self._postings = {}
+        for bridge in bridge_data:
+            self.add(bridge)
+
+    def __len__(self) -> int:
+        """Return the number of bridges in this index."""
+
+        return len(self._positions)
+
+    def _index_name(self, pos: int, name: str) -> None:
+        """Index the name name for the bridge at position pos."""
+
+        self._names[pos] = name.lower()
+        for trigram in get_trigrams(START + self._names[pos]):
+            self._postings.setdefault(trigram, set()).add(pos)
+
+    def _unindex_name(self, pos: int) -> None:
+        """Remove the name of the bridge at position pos from this index."""
+
+        for trigram in get_trigrams(START + self._names[pos]):
+            positions = self._postings[trigram]
+            positions.discard(pos)
+            if not positions:
+                del self._postings[trigram]
+        self._names[pos] = None
+
+    def add(self, bridge: list) -> None:
+        """Add the bridge record bridge to the end of this index. If its id is
+        already in this index, only update its name.
+
+        >>> index = NameIndex(THREE_BRIDGES)
+        >>> index.add([4, 'Stokes Creek Culvert'])
+        >>> index.search('stokes')
+        [3, 4]
+        """
+
+        if bridge[ID_INDEX] in self._positions:
+            self.rename(bridge[ID_INDEX], bridge[NAME_INDEX])
+            return
+
+        self._positions[bridge[ID_INDEX]] = len(self._ids)
+        self._ids.append(bridge[ID_INDEX])
+        self._names.append(None)
+        self._index_name(len(self._ids) - 1, bridge[NAME_INDEX])
+
+    def rename(self, bridge_id: int, name: str) -> None:
+        """Change the indexed name of the bridge with id bridge_id to name.
+        Do nothing if there is no such bridge in this index.
+
+        >>> index = NameIndex(THREE_BRIDGES)
+        >>> index.rename(3, 'Stokes River Underpass')
+        >>> index.search('underpass')
+        [1, 2, 3]
+        """
+
+        pos = self._positions.get(bridge_id)
+        if pos is not None:
+            self._unindex_name(pos)
+            self._index_name(pos, name)
+
+    def remove(self, bridge_id: int) -> None:
+        """Remove the bridge with id bridge_id from this index. Do nothing if
+        there is no such bridge in this index.
+
+        >>> index = NameIndex(THREE_BRIDGES)
+        >>> index.remove(1)
+        >>> index.search('underpass')
+        [2]
+        """
+
+        pos = self._positions.pop(bridge_id, None)
+        if pos is not None:
+            self._unindex_name(pos)
+
+    def _candidates(self, trigrams: set[str]) -> list[int]:
+        """Return the sorted positions of the bridges whose indexed names
+        contain every trigram in trigrams.
+
+        """
+
+        if not trigrams:
+            return [pos for pos in range(len(self._names))
+                    if self._names[pos] is not None]
+
+        postings = sorted((self._postings.get(trigram, set())
+                           for trigram in trigrams), key=len)
+        return sorted(postings[0].intersection(*postings[1:]))
+
+    def search(self, search: str) -> list[int]:
+        """Return a list of ids of all bridges in this index whose names
+        contain the search string search, ignoring case.
+
+        >>> NameIndex(THREE_BRIDGES).search('r')
+        [1, 2, 3]
+        """
+
+        search = search.lower()
+        return [self._ids[pos]
+                for pos in self._candidates(get_trigrams(search))
+                if search in self._names[pos]]
+
+    def search_prefix(self, prefix: str) -> list[int]:
+        """Return a list of ids of all bridges in this index whose names
+        start with prefix, ignoring case.
+
+        >>> NameIndex(THREE_BRIDGES).search_prefix('west st')
+        [2]
+        >>> NameIndex(THREE_BRIDGES).search_prefix('street')
+        []
+        """
+
+        prefix = prefix.lower()
+        return [self._ids[pos]
+                for pos in self._candidates(get_trigrams(START + prefix))
+                if self._names[pos].startswith(prefix)]
+
+    def search_all(self, terms: list[str]) -> list[int]:
+        """Return a list of ids of all bridges in this index whose names
+        contain every string in terms, ignoring case.
+
+        >>> NameIndex(THREE_BRIDGES).search_all(['highway', '403'])
+        [1]
+        >>> NameIndex(THREE_BRIDGES).search_all(['west', 'river'])
+        []
+        """
+
+        terms = [term.lower() for term in terms]
+        trigrams = set()
+        for term in terms:
+            trigrams.update(get_trigrams(term))
+
+        return [self._ids[pos]
+                for pos in self._candidates(trigrams)
+                if all(term in self._names[pos] for term in terms)]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
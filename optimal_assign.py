@@ -0,0 +1,238 @@
+"""Capacity-aware optimal assignment of bridges to inspectors.
+
+assign_inspectors hands each bridge to the first inspector who can take it,
+which can waste travel and leave urgent bridges unassigned once the early
+inspectors are full. assign_inspectors_optimal instead solves the
+capacity-constrained problem as a min-cost flow: bridges are added one at
+a time, most urgent priority tier first, and each is routed along the
+cheapest augmenting path, which may move already assigned bridges to
+other inspectors to make room.
+
+Searches get longer as the inspectors fill up, so on large problems pass
+max_candidates to limit each bridge to its closest inspectors. The greedy
+assign_inspectors remains the default assignment; this module is an
+alternative for planning.
+
+"""
+
+from heapq import heappop, heappush
+from math import inf
+
+from bridge_functions import (
+    assign_inspectors_with_tiers, calculate_distance, calculate_distances,
+    get_inspection_reach, np, PRIORITY_TIERS, ROUNDING_SLACK, THREE_BRIDGES)
+from spatial_index import SpatialIndex
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX, BCIS_INDEX
+
+# Stands for the sink of the flow network in the shortest path searches.
+SINK = -1
+
+
+def get_priority(bridge: list,
+                 tiers: tuple[tuple[float, float], ...]) -> int:
+    """Return the rank of the most urgent of the (radius, BCI) priority
+    tiers tiers that covers the most recent BCI of the bridge bridge, where
+    the tier with the lowest BCI has rank 0, or len(tiers) if no tier covers
+    it.
+
+    >>> get_priority(THREE_BRIDGES[0], PRIORITY_TIERS)
+    2
+    >>> get_priority(THREE_BRIDGES[0], ((500, 60),))
+    1
+    """
+
+    rank = 0
+    for _, bci in sorted(tiers, key=lambda tier: tier[1]):
+        if bridge[BCIS_INDEX] and bridge[BCIS_INDEX][0] <= bci:
+            return rank
+        rank += 1
+
+    return rank
+
+
+def _get_inspector_distances(index: SpatialIndex, bridge: list, reach: float,
+                             max_candidates: int) -> dict[int, float]:
+    """Return a dictionary from the position of each inspector in the
+    spatial index index within reach kilometers of the bridge bridge to its
+    distance from the bridge. If max_candidates is not None, only keep the
+    max_candidates closest inspectors.
+
+    If NumPy is installed, index.lats and index.lons must be NumPy arrays.
+
+    """
+
+    lat, lon = bridge[LAT_INDEX], bridge[LON_INDEX]
+    candidates = index.candidates(lat, lon, reach)
+    if np:
+        distances = calculate_distances(index.lats[candidates],
+                                        index.lons[candidates],
+                                        lat, lon).tolist()
+    else:
+        distances = calculate_distances([index.lats[i] for i in candidates],
+                                        [index.lons[i] for i in candidates],
+                                        lat, lon)
+
+    found = []
+    for j in range(len(candidates)):
+        distance = distances[j]
+        if distance > reach - ROUNDING_SLACK and np:
+            # Vectorized distances can differ from calculate_distance in the
+            # last digit, so decide close calls with calculate_distance.
+            distance = calculate_distance(lat, lon, index.lats[candidates[j]],
+                                          index.lons[candidates[j]])
+        if distance <= reach:
+            found.append((distance, candidates[j]))
+
+    if max_candidates is not None and len(found) > max_candidates:
+        found.sort()
+        found = found[:max_candidates]
+
+    return {inspector: distance for distance, inspector in found}
+
+
+def assign_inspectors_optimal(bridge_data: list[list],
+                              inspectors: list[list[float]],
+                              max_bridges: int,
+                              tiers: tuple[tuple[float, float], ...]
+                              = PRIORITY_TIERS,
+                              max_candidates: int = None) -> list[list[int]]:
+    """Return a list of bridge IDs from bridge data bridge_data, to be
+    assigned to each inspector in inspectors, with at most max_bridges
+    bridges per inspector, in the format of assign_inspectors. A bridge can
+    go to an inspector under the (radius, BCI) priority tiers tiers exactly
+    when assign_inspectors_with_tiers would allow it.
+
+    Bridges are considered by priority, with ties in the order of
+    bridge_data, and every bridge is assigned if it can be without
+    unassigning a bridge considered before it. So as many of the most
+    urgent bridges as possible are assigned, then as many of the next tier,
+    and so on. Among the assignments of those bridges, one with the least
+    total distance between inspectors and their bridges is returned.
+
+    If max_candidates is not None, each bridge is only considered for its
+    max_candidates closest eligible inspectors, which makes the search
+    faster but may give a worse assignment.
+
+    >>> inspectors = [[44.1, -80.8], [43.164531, -80.251582]]
+    >>> tiers = ((150, 100),)
+    >>> assign_inspectors_with_tiers(THREE_BRIDGES, inspectors, 2, tiers)
+    [[1, 2], []]
+    >>> assign_inspectors_optimal(THREE_BRIDGES, inspectors, 2, tiers)
+    [[3], [1, 2]]
+    >>> assign_inspectors_optimal(THREE_BRIDGES, inspectors, 0)
+    [[], []]
+    """
+
+    num_inspectors = len(inspectors)
+    members = [set() for _ in range(num_inspectors)]
+    if max_bridges <= 0 or num_inspectors == 0:
+        return [[] for _ in members]
+
+    index = SpatialIndex([inspector[0] for inspector in inspectors],
+                         [inspector[1] for inspector in inspectors],
+                         range(num_inspectors))
+    if np:
+        index.lats, index.lons = np.array(index.lats), np.array(index.lons)
+    order = sorted(range(len(bridge_data)),
+                   key=lambda pos: (get_priority(bridge_data[pos], tiers),
+                                    pos))
+
+    # Bridges are nodes num_inspectors + pos of the network. The potentials
+    # keep every reduced edge cost non-negative, so Dijkstra's algorithm
+    # finds the cheapest augmenting paths.
+    costs = {}
+    assigned = {}
+    inspector_potentials = [0.0] * num_inspectors
+    bridge_potentials = {}
+    sink_potential = 0.0
+    # Nodes from which no inspector with room can be reached. This stays
+    # true as bridges are added, so later searches skip them.
+    dead = set()
+    for source in order:
+        reach = get_inspection_reach(bridge_data[source], tiers)
+        if reach < 0:
+            continue
+        costs[source] = _get_inspector_distances(
+            index, bridge_data[source], reach, max_candidates)
+        if not costs[source]:
+            continue
+        bridge_potentials[source] = max(
+            inspector_potentials[inspector] - distance
+            for inspector, distance in costs[source].items())
+
+        start = num_inspectors + source
+        distances = {start: 0.0}
+        previous = {}
+        settled = []
+        heap = [(0.0, start)]
+        while heap:
+            distance, node = heappop(heap)
+            if distance > distances[node]:
+                continue
+            if node == SINK:
+                break
+            settled.append(node)
+
+            if node >= num_inspectors:
+                pos = node - num_inspectors
+                own = assigned.get(pos)
+                base = distance + bridge_potentials[pos]
+                for inspector, cost in costs[pos].items():
+                    new_distance = (base + cost
+                                    - inspector_potentials[inspector])
+                    if (new_distance < distances.get(inspector, inf)
+                            and inspector != own and inspector not in dead):
+                        distances[inspector] = max(new_distance, distance)
+                        previous[inspector] = node
+                        heappush(heap, (distances[inspector], inspector))
+            else:
+                base = distance + inspector_potentials[node]
+                if len(members[node]) < max_bridges:
+                    new_distance = max(base - sink_potential, distance)
+                    if new_distance < distances.get(SINK, inf):
+                        distances[SINK] = new_distance
+                        previous[SINK] = node
+                        heappush(heap, (new_distance, SINK))
+                for pos in members[node]:
+                    if num_inspectors + pos in dead:
+                        continue
+                    new_distance = max(base - costs[pos][node]
+                                       - bridge_potentials[pos], distance)
+                    if new_distance < distances.get(num_inspectors + pos,
+                                                    inf):
+                        distances[num_inspectors + pos] = new_distance
+                        previous[num_inspectors + pos] = node
+                        heappush(heap, (new_distance, num_inspectors + pos))
+
+        if SINK not in previous:
+            dead.update(settled)
+            del bridge_potentials[source]
+            continue
+
+        sink_distance = distances[SINK]
+        for node in settled:
+            shift = distances[node] - sink_distance
+            if node >= num_inspectors:
+                bridge_potentials[node - num_inspectors] += shift
+            else:
+                inspector_potentials[node] += shift
+
+        inspector = previous[SINK]
+        while True:
+            pos = previous[inspector] - num_inspectors
+            old_inspector = assigned.get(pos)
+            if old_inspector is not None:
+                members[old_inspector].discard(pos)
+            assigned[pos] = inspector
+            members[inspector].add(pos)
+            if pos == source:
+                break
+            inspector = old_inspector
+
+    return [[bridge_data[pos][ID_INDEX] for pos in sorted(positions)]
+            for positions in members]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
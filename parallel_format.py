@@ -0,0 +1,79 @@
+"""Multi-process formatting of uncleaned bridge data.
+
+Each row of a bridge data file is formatted independently of the others,
+apart from its id, which only depends on its position. This module splits
+the rows into chunks and formats the chunks in a pool of worker processes.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from copy import deepcopy
+
+from bridge_functions import (
+    format_data, format_record, THREE_BRIDGES, THREE_BRIDGES_UNCLEANED)
+
+# Default number of rows sent to a worker process at a time.
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def format_chunk(rows: list[list[str]], first_id: int) -> list[list]:
+    """Return the uncleaned bridge records rows formatted as format_data
+    formats them, numbering them from first_id.
+
+    >>> format_chunk(deepcopy(THREE_BRIDGES_UNCLEANED[1:]), 2) \\
+    ...     == THREE_BRIDGES[1:]
+    True
+    """
+
+    for i in range(len(rows)):
+        format_record(rows[i], first_id + i)
+
+    return rows
+
+
+def format_data_parallel(data: list[list[str]], workers: int = None,
+                         chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+    """Modify the uncleaned bridge data data exactly as format_data does,
+    formatting chunk_size rows at a time in up to workers worker processes.
+    If workers is None, use one worker per CPU.
+
+    The records in data are updated in place, so references to them stay
+    valid, and ids are assigned by position as in the serial version. As
+    with format_data, data is left unchanged if a record cannot be
+    formatted.
+
+    >>> d = deepcopy(THREE_BRIDGES_UNCLEANED)
+    >>> format_data_parallel(d, workers=2, chunk_size=2)
+    >>> d == THREE_BRIDGES
+    True
+
+    Raise ValueError if chunk_size is not positive.
+
+    >>> format_data_parallel(d, chunk_size=0)
+    Traceback (most recent call last):
+    ...
+    ValueError: chunk_size must be positive, not 0
+
+    """
+
+    if chunk_size <= 0:
+        raise ValueError(f'chunk_size must be positive, not {chunk_size}')
+    if workers == 1 or len(data) <= chunk_size:
+        format_data(data)
+        return
+
+    starts = range(0, len(data), chunk_size)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = list(executor.map(format_chunk,
+                                   (data[start:start + chunk_size]
+                                    for start in starts),
+                                   (start + 1 for start in starts)))
+
+    for start, chunk in zip(starts, chunks):
+        for i in range(len(chunk)):
+            data[start + i][:] = chunk[i]
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,314 @@
+"""Ordering each inspector's assigned bridges into a short route.
+
+assign_inspectors only says which bridges each inspector gets. plan_route
+orders them into a route that starts at the inspector's location: a
+nearest-neighbour route is built first and then improved with 2-opt
+(reversing a stretch of the route) and Or-opt (moving a run of up to
+three bridges elsewhere) until neither helps. All distances come from one
+pairwise distance matrix per route. plan_routes plans the routes of many
+inspectors in a pool of worker processes.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+from bridge_functions import (
+    calculate_distance_matrix, get_bridge, THREE_BRIDGES)
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX
+
+# Average driving speed, in kilometers per hour, for time budgets.
+DEFAULT_SPEED = 60
+
+# Time spent at each bridge, in hours, for time budgets.
+DEFAULT_INSPECTION_HOURS = 1.0
+
+# Routes are only planned in worker processes for at least this many
+# inspectors.
+PARALLEL_THRESHOLD = 64
+
+# Smallest change in route length treated as an improvement.
+MIN_GAIN = 1e-9
+
+# Longest run of bridges that Or-opt moves at once.
+MAX_SEGMENT = 3
+
+
+class Route(NamedTuple):
+    """A planned route for one inspector.
+
+    bridge_ids are the ids of the bridges to visit, in order, and length is
+    the length in kilometers of the route through them from the inspector's
+    location. skipped are the ids of the assigned bridges left out of the
+    route to keep it within its budget.
+
+    """
+
+    bridge_ids: list[int]
+    length: float
+    skipped: list[int]
+
+
+def get_route_matrix(start: list[float], lats: list[float],
+                     lons: list[float], closed: bool) -> list[list[float]]:
+    """Return the matrix of distances between the points of a route that
+    starts at the location start and visits the locations (lats[i],
+    lons[i]). Point 0 is start, point i + 1 is location i, and the last
+    point is where the route ends: start again if closed is True, and a
+    point at distance 0 from every other point otherwise.
+
+    >>> matrix = get_route_matrix([43.10, -80.15], [43.167233], [-80.275567],
+    ...                           True)
+    >>> [round(distance) for distance in matrix[0]]
+    [0, 13, 0]
+    """
+
+    lats = [start[0]] + list(lats) + [start[0]]
+    lons = [start[1]] + list(lons) + [start[1]]
+    matrix = calculate_distance_matrix(lats, lons, lats, lons)
+    matrix = [[float(distance) for distance in row] for row in matrix]
+    if not closed:
+        for row in matrix:
+            row[-1] = 0.0
+        matrix[-1] = [0.0] * len(matrix)
+
+    return matrix
+
+
+def get_route_length(matrix: list[list[float]], path: list[int]) -> float:
+    """Return the length of the path path through the points of the
+    distance matrix matrix.
+
+    >>> get_route_length([[0, 2, 5], [2, 0, 1], [5, 1, 0]], [0, 1, 2])
+    3
+    """
+
+    return sum(matrix[path[i]][path[i + 1]] for i in range(len(path) - 1))
+
+
+def order_nearest_neighbour(matrix: list[list[float]]) -> list[int]:
+    """Return a path through every point of the distance matrix matrix that
+    starts at the first point, ends at the last point, and always moves on
+    to the closest point not yet visited.
+
+    >>> order_nearest_neighbour([[0, 5, 1, 0], [5, 0, 2, 0], [1, 2, 0, 0],
+    ...                          [0, 0, 0, 0]])
+    [0, 2, 1, 3]
+    """
+
+    end = len(matrix) - 1
+    unvisited = set(range(1, end))
+    path = [0]
+    while unvisited:
+        row = matrix[path[-1]]
+        path.append(min(unvisited, key=lambda point: (row[point], point)))
+        unvisited.discard(path[-1])
+    path.append(end)
+
+    return path
+
+
+def improve_two_opt(matrix: list[list[float]], path: list[int]) -> bool:
+    """Shorten the path path through the points of the distance matrix
+    matrix by reversing stretches of it, keeping its first and last points
+    in place, until no reversal makes it shorter. Return True if and only if
+    path was changed.
+
+    >>> path = [0, 2, 1, 3, 4]
+    >>> matrix = [[0, 1, 2, 3, 9], [1, 0, 1, 2, 9], [2, 1, 0, 1, 9],
+    ...           [3, 2, 1, 0, 0], [9, 9, 9, 0, 0]]
+    >>> improve_two_opt(matrix, path), path
+    (True, [0, 1, 2, 3, 4])
+    """
+
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, len(path) - 2):
+            before, first = matrix[path[i - 1]], path[i]
+            for j in range(i + 1, len(path) - 1):
+                gain = (before[first] + matrix[path[j]][path[j + 1]]
+                        - before[path[j]] - matrix[first][path[j + 1]])
+                if gain > MIN_GAIN:
+                    path[i:j + 1] = path[j:i - 1:-1]
+                    before, first = matrix[path[i - 1]], path[i]
+                    improved = changed = True
+
+    return changed
+
+
+def improve_or_opt(matrix: list[list[float]], path: list[int]) -> bool:
+    """Shorten the path path through the points of the distance matrix
+    matrix by moving runs of up to MAX_SEGMENT points, possibly reversed,
+    to other places in it, keeping its first and last points in place,
+    until no move makes it shorter. Return True if and only if path was
+    changed.
+
+    >>> path = [0, 2, 3, 1, 4]
+    >>> matrix = [[0, 1, 2, 3, 9], [1, 0, 1, 2, 9], [2, 1, 0, 1, 9],
+    ...           [3, 2, 1, 0, 0], [9, 9, 9, 0, 0]]
+    >>> improve_or_opt(matrix, path), path
+    (True, [0, 1, 2, 3, 4])
+    """
+
+    changed = False
+    improved = True
+    while improved:
+        improved = False
+        for size in range(1, MAX_SEGMENT + 1):
+            i = 1
+            while i + size < len(path):
+                first, last = path[i], path[i + size - 1]
+                prev, after = path[i - 1], path[i + size]
+                removal_gain = (matrix[prev][first] + matrix[last][after]
+                                - matrix[prev][after])
+                rest = path[:i] + path[i + size:]
+                best = None
+                for j in range(len(rest) - 1):
+                    left, right = rest[j], rest[j + 1]
+                    if j == i - 1:
+                        continue
+                    forward = matrix[left][first] + matrix[last][right]
+                    backward = matrix[left][last] + matrix[first][right]
+                    cost = min(forward, backward) - matrix[left][right]
+                    if (removal_gain - cost > MIN_GAIN
+                            and (best is None or cost < best[0])):
+                        best = (cost, j, backward < forward)
+                if best is None:
+                    i += 1
+                    continue
+
+                _, j, reverse = best
+                segment = path[i:i + size]
+                if reverse:
+                    segment.reverse()
+                path[:] = rest[:j + 1] + segment + rest[j + 1:]
+                improved = changed = True
+
+    return changed
+
+
+def _trim_to_budget(matrix: list[list[float]], path: list[int],
+                    max_length: float, max_hours: float, speed: float,
+                    inspection_hours: float) -> int:
+    """Return the number of bridges at the start of the path path through
+    the points of the distance matrix matrix that can be visited, and the
+    route ended, within max_length kilometers and max_hours hours, where
+    None means no budget.
+
+    """
+
+    end = path[-1]
+    length = 0
+    for count in range(len(path) - 2):
+        length += matrix[path[count]][path[count + 1]]
+        total = length + matrix[path[count + 1]][end]
+        hours = total / speed + (count + 1) * inspection_hours
+        if ((max_length is not None and total > max_length)
+                or (max_hours is not None and hours > max_hours)):
+            return count
+
+    return len(path) - 2
+
+
+def _plan_stops(start: list[float], ids: list[int], lats: list[float],
+                lons: list[float], return_to_start: bool, max_length: float,
+                max_hours: float, speed: float,
+                inspection_hours: float) -> Route:
+    """Return the route from the location start through the bridges with
+    ids ids at locations (lats[i], lons[i]), as plan_route does.
+
+    """
+
+    matrix = get_route_matrix(start, lats, lons, return_to_start)
+    path = order_nearest_neighbour(matrix)
+    improved = True
+    while improved:
+        improved = improve_two_opt(matrix, path)
+        improved = improve_or_opt(matrix, path) or improved
+
+    count = _trim_to_budget(matrix, path, max_length, max_hours, speed,
+                            inspection_hours)
+    kept = path[:count + 1] + path[-1:]
+    return Route([ids[point - 1] for point in kept[1:-1]],
+                 get_route_length(matrix, kept),
+                 [ids[point - 1] for point in path[count + 1:-1]])
+
+
+def plan_route(bridge_data: list[list], inspector: list[float],
+               bridge_ids: list[int], return_to_start: bool = False,
+               max_length: float = None, max_hours: float = None,
+               speed: float = DEFAULT_SPEED,
+               inspection_hours: float = DEFAULT_INSPECTION_HOURS) -> Route:
+    """Return a short route from the (latitude, longitude) location
+    inspector through the bridges with ids bridge_ids in bridge data
+    bridge_data, ending back at inspector if return_to_start is True.
+
+    If max_length is not None, the route is cut short so that it is at most
+    max_length kilometers long. If max_hours is not None, it is cut short
+    so that driving it at speed kilometers per hour and spending
+    inspection_hours hours at each bridge takes at most max_hours hours.
+
+    Precondition: Every id in bridge_ids is in bridge_data.
+
+    >>> route = plan_route(THREE_BRIDGES, [43.10, -80.15], [3, 1, 2])
+    >>> route.bridge_ids, round(route.length)
+    ([2, 1, 3], 237)
+    >>> plan_route(THREE_BRIDGES, [43.10, -80.15], [3, 1, 2],
+    ...            max_length=100).bridge_ids
+    [2, 1]
+    >>> plan_route(THREE_BRIDGES, [43.10, -80.15], [3, 1, 2],
+    ...            max_hours=1.5).skipped
+    [1, 3]
+    """
+
+    bridges = [get_bridge(bridge_data, bridge_id) for bridge_id in bridge_ids]
+    return _plan_stops(inspector, [bridge[ID_INDEX] for bridge in bridges],
+                       [bridge[LAT_INDEX] for bridge in bridges],
+                       [bridge[LON_INDEX] for bridge in bridges],
+                       return_to_start, max_length, max_hours, speed,
+                       inspection_hours)
+
+
+def plan_routes(bridge_data: list[list], inspectors: list[list[float]],
+                assignment: list[list[int]], workers: int = None,
+                return_to_start: bool = False, max_length: float = None,
+                max_hours: float = None, speed: float = DEFAULT_SPEED,
+                inspection_hours: float = DEFAULT_INSPECTION_HOURS
+                ) -> list[Route]:
+    """Return the route of plan_route for each inspector in inspectors
+    through the bridges assigned to it in assignment, as returned by
+    assign_inspectors for bridge data bridge_data. Routes are planned in up
+    to workers worker processes, or one per CPU if workers is None.
+
+    >>> inspectors = [[43.20, -80.35], [45.0368, -81.34]]
+    >>> assignment = [[1, 2], [3]]
+    >>> [route.bridge_ids for route in plan_routes(
+    ...     THREE_BRIDGES, inspectors, assignment, workers=1)]
+    [[1, 2], [3]]
+    """
+
+    by_id = {bridge[ID_INDEX]: bridge for bridge in bridge_data}
+    tasks = []
+    for inspector, bridge_ids in zip(inspectors, assignment):
+        bridges = [by_id[bridge_id] for bridge_id in bridge_ids]
+        tasks.append((inspector, list(bridge_ids),
+                      [bridge[LAT_INDEX] for bridge in bridges],
+                      [bridge[LON_INDEX] for bridge in bridges]))
+    options = (return_to_start, max_length, max_hours, speed,
+               inspection_hours)
+
+    if workers == 1 or len(tasks) < PARALLEL_THRESHOLD:
+        return [_plan_stops(*task, *options) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            _plan_stops, *zip(*tasks), *([option] * len(tasks)
+                                         for option in options),
+            chunksize=max(1, len(tasks) // (4 * (workers or 8)))))
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
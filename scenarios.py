@@ -0,0 +1,366 @@
+"""What-if runs of the inspector assignment over many scenarios.
+
+A Scenario changes the inputs of assign_inspectors_with_tiers: the
+inspectors' depots, the most bridges each inspector takes and the
+(radius, BCI) priority tiers. evaluate_scenario runs one scenario and
+sums up its assignment in a ScenarioResult: how many bridges of each
+priority were assigned, how many high priority bridges were left over, and
+how far inspectors are from the bridges they were given.
+
+run_scenarios evaluates scenarios in a pool of worker processes. The
+bridge data is not sent with each scenario: it is saved once as a snapshot
+by bridge_snapshot, every worker maps that file when it starts and keeps
+just the fields an assignment reads, and then only the scenarios and their
+results go between the processes. Results are yielded as they complete,
+and write_results streams them to a CSV or JSON lines file. Run as a
+script, e.g.
+
+    python scenarios.py bridge_data.csv scenarios.json --output results.csv
+
+where scenarios.json holds a list of objects with the fields of Scenario,
+tiers being optional.
+
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Iterable, Iterator, NamedTuple, TextIO
+
+from bridge_functions import (
+    assign_inspectors_with_tiers, calculate_distance, PRIORITY_TIERS,
+    THREE_BRIDGES)
+from bridge_schema import PRIORITIES
+from bridge_snapshot import (
+    load_bridge_data, load_snapshot, save_snapshot, SNAPSHOT_SUFFIX)
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX, BCIS_INDEX
+
+# Formats write_results can write: CSV with a header line, or one JSON
+# object per line.
+FORMATS = ('csv', 'json')
+
+# Scenarios waiting in the pool per worker process, so that scenarios are
+# read and results written as the run goes rather than all at once.
+PENDING_PER_WORKER = 4
+
+# The bridges a worker process evaluates scenarios on, as kept by
+# _start_worker, and the position of each bridge by id.
+_worker_bridges = []
+_worker_positions = {}
+
+
+class Scenario(NamedTuple):
+    """The inputs of one assignment: inspectors is a list of (latitude,
+    longitude) depots, in the order they pick bridges, max_bridges is the
+    most bridges each one is assigned, and tiers are the (radius, BCI)
+    priority tiers, one for each of PRIORITIES, from high to low.
+
+    """
+
+    name: str
+    inspectors: list[list[float]]
+    max_bridges: int
+    tiers: tuple[tuple[float, float], ...] = PRIORITY_TIERS
+
+
+class ScenarioResult(NamedTuple):
+    """The summary of the assignment of the scenario named name.
+
+    high_covered, medium_covered and low_covered are the numbers of bridges
+    of each priority that were assigned, as given by get_priority, and
+    unassigned_high is the number of high priority bridges that were not.
+    assigned is the number of bridges assigned in all, and mean_distance is
+    the mean distance in kilometers from an inspector to the bridges
+    assigned to them, or None if no bridge was assigned.
+
+    """
+
+    name: str
+    high_covered: int
+    medium_covered: int
+    low_covered: int
+    unassigned_high: int
+    assigned: int
+    mean_distance: float
+
+
+def get_priority(bridge: list,
+                 tiers: tuple[tuple[float, float], ...]) -> int:
+    """Return the position in tiers of the first of the (radius, BCI)
+    priority tiers tiers, from high to low priority, that covers the most
+    recent BCI of the bridge bridge, or None if none does.
+
+    >>> [get_priority(bridge, PRIORITY_TIERS) for bridge in THREE_BRIDGES]
+    [2, 2, 2]
+    >>> get_priority(THREE_BRIDGES[1], ((500, 60), (250, 71.5), (100, 100)))
+    1
+    >>> get_priority(THREE_BRIDGES[0], ((500, 60),)) is None
+    True
+    """
+
+    if bridge[BCIS_INDEX]:
+        for priority in range(len(tiers)):
+            if bridge[BCIS_INDEX][0] <= tiers[priority][1]:
+                return priority
+
+    return None
+
+
+def evaluate_scenario(bridge_data: list[list], scenario: Scenario,
+                      positions: dict[int, int] = None) -> ScenarioResult:
+    """Return the summary of the assignment of scenario scenario on bridge
+    data bridge_data. positions maps the id of each bridge to its position
+    in bridge_data, and is worked out if it is None.
+
+    Raise a ValueError if scenario does not have one tier for each of
+    PRIORITIES.
+
+    >>> evaluate_scenario(THREE_BRIDGES, Scenario(
+    ...     'local', [[43.20, -80.35], [45.0368, -81.34]], 2))
+    ScenarioResult(name='local', high_covered=0, medium_covered=0, \
+low_covered=3, unassigned_high=0, assigned=3, mean_distance=5.427)
+    >>> evaluate_scenario(THREE_BRIDGES, Scenario(
+    ...     'strict', [[43.10, -80.15]], 5,
+    ...     ((500, 60), (250, 71.5), (0, 100))))
+    ScenarioResult(name='strict', high_covered=0, medium_covered=1, \
+low_covered=0, unassigned_high=0, assigned=1, mean_distance=10.929)
+    """
+
+    if len(scenario.tiers) != len(PRIORITIES):
+        raise ValueError(f'scenario {scenario.name!r} must have '
+                         f'{len(PRIORITIES)} priority tiers, from high to '
+                         f'low')
+    if positions is None:
+        positions = {bridge[ID_INDEX]: pos
+                     for pos, bridge in enumerate(bridge_data)}
+
+    assignment = assign_inspectors_with_tiers(
+        bridge_data, scenario.inspectors, scenario.max_bridges,
+        scenario.tiers)
+
+    covered = [0] * len(PRIORITIES)
+    total_distance = 0.0
+    assigned = 0
+    for inspector, bridge_ids in zip(scenario.inspectors, assignment):
+        for bridge_id in bridge_ids:
+            bridge = bridge_data[positions[bridge_id]]
+            priority = get_priority(bridge, scenario.tiers)
+            if priority is not None:
+                covered[priority] += 1
+            total_distance += calculate_distance(
+                inspector[0], inspector[1], bridge[LAT_INDEX],
+                bridge[LON_INDEX])
+            assigned += 1
+
+    high = sum(1 for bridge in bridge_data
+               if get_priority(bridge, scenario.tiers) == 0)
+
+    return ScenarioResult(
+        scenario.name, *covered, high - covered[0], assigned,
+        round(total_distance / assigned, 3) if assigned else None)
+
+
+def get_scenario_bridges(bridge_data) -> list[list]:
+    """Return bridge records holding only the id, location and most recent
+    BCI of each bridge in the bridge data or BridgeTable bridge_data, in
+    order: the fields that evaluate_scenario reads.
+
+    >>> bridges = get_scenario_bridges(THREE_BRIDGES)
+    >>> bridges[0][ID_INDEX], bridges[0][BCIS_INDEX]
+    (1, [72.3])
+    >>> evaluate_scenario(bridges, Scenario('all', [[43.10, -80.15]], 3)) \\
+    ...     == evaluate_scenario(THREE_BRIDGES, Scenario(
+    ...         'all', [[43.10, -80.15]], 3))
+    True
+    """
+
+    bridges = []
+    for pos in range(len(bridge_data)):
+        bridge = bridge_data[pos]
+        record = [None] * len(bridge)
+        record[ID_INDEX] = bridge[ID_INDEX]
+        record[LAT_INDEX] = bridge[LAT_INDEX]
+        record[LON_INDEX] = bridge[LON_INDEX]
+        record[BCIS_INDEX] = bridge[BCIS_INDEX][:1]
+        bridges.append(record)
+
+    return bridges
+
+
+def _start_worker(snapshot_path: str) -> None:
+    """Keep the bridges of the snapshot file at snapshot_path for the
+    scenarios this worker process evaluates.
+
+    """
+
+    _worker_bridges[:] = get_scenario_bridges(load_snapshot(snapshot_path))
+    _worker_positions.clear()
+    _worker_positions.update((bridge[ID_INDEX], pos) for pos, bridge
+                             in enumerate(_worker_bridges))
+
+
+def _evaluate_in_worker(scenario: Scenario) -> ScenarioResult:
+    """Return the summary of scenario scenario on the bridges of this
+    worker process.
+
+    """
+
+    return evaluate_scenario(_worker_bridges, scenario, _worker_positions)
+
+
+def run_scenarios(bridge_data: list[list], scenarios: Iterable[Scenario],
+                  workers: int = None,
+                  snapshot_path: str = None) -> Iterator[ScenarioResult]:
+    """Yield the summary of each scenario in scenarios on bridge data
+    bridge_data, in the order the scenarios complete. Scenarios are
+    evaluated in up to workers worker processes, or one per CPU if workers
+    is None, which map the snapshot file at snapshot_path, or a snapshot of
+    bridge_data saved for the run if snapshot_path is None. If workers is
+    1, scenarios are evaluated in order in this process.
+
+    Scenarios are read from scenarios as the workers need them, so it can
+    be a generator.
+
+    >>> scenarios = [Scenario('one', [[43.10, -80.15]], 1),
+    ...              Scenario('two', [[43.10, -80.15]], 2)]
+    >>> [(result.name, result.assigned) for result in sorted(
+    ...     run_scenarios(THREE_BRIDGES, scenarios, workers=2))]
+    [('one', 1), ('two', 2)]
+    """
+
+    if workers == 1:
+        bridges = get_scenario_bridges(bridge_data)
+        positions = {bridge[ID_INDEX]: pos
+                     for pos, bridge in enumerate(bridges)}
+        for scenario in scenarios:
+            yield evaluate_scenario(bridges, scenario, positions)
+        return
+
+    directory = None
+    if snapshot_path is None:
+        directory = tempfile.mkdtemp(prefix='scenarios-')
+        snapshot_path = os.path.join(directory, 'bridges.snapshot')
+        save_snapshot(bridge_data, snapshot_path)
+
+    executor = ProcessPoolExecutor(max_workers=workers,
+                                   initializer=_start_worker,
+                                   initargs=(snapshot_path,))
+    limit = PENDING_PER_WORKER * (workers or os.cpu_count() or 1)
+    pending = set()
+    try:
+        for scenario in scenarios:
+            if len(pending) >= limit:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_evaluate_in_worker, scenario))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(cancel_futures=True)
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def write_results(results: Iterable[ScenarioResult], out_file: TextIO,
+                  file_format: str = 'csv') -> int:
+    """Write each result in results to the open file out_file as soon as
+    it is produced, in the format file_format, one of FORMATS, and return
+    the number of results written.
+
+    >>> from io import StringIO
+    >>> out_file = StringIO()
+    >>> write_results(run_scenarios(THREE_BRIDGES, [Scenario(
+    ...     'none', [[43.10, -80.15]], 0)], workers=1), out_file)
+    1
+    >>> for line in out_file.getvalue().splitlines():
+    ...     print(line)
+    name,high_covered,medium_covered,low_covered,unassigned_high,assigned,\
+mean_distance
+    none,0,0,0,0,0,
+    >>> out_file = StringIO()
+    >>> _ = write_results(run_scenarios(THREE_BRIDGES, [Scenario(
+    ...     'none', [[43.10, -80.15]], 0)], workers=1), out_file, 'json')
+    >>> json.loads(out_file.getvalue())['mean_distance'] is None
+    True
+    """
+
+    if file_format not in FORMATS:
+        raise ValueError(f'file_format must be one of {", ".join(FORMATS)}')
+
+    writer = None
+    if file_format == 'csv':
+        # Imported here, since only CSV output needs it.
+        import csv
+        writer = csv.writer(out_file)
+        writer.writerow(ScenarioResult._fields)
+
+    count = 0
+    for result in results:
+        if writer is None:
+            out_file.write(json.dumps(result._asdict()) + '\n')
+        else:
+            writer.writerow(['' if value is None else value
+                             for value in result])
+        out_file.flush()
+        count += 1
+
+    return count
+
+
+def read_scenarios(json_file: TextIO) -> list[Scenario]:
+    """Return the scenarios in the open JSON file json_file, which holds a
+    list of objects with the fields of Scenario. A scenario without tiers
+    uses PRIORITY_TIERS.
+
+    >>> from io import StringIO
+    >>> read_scenarios(StringIO('[{"name": "a", "inspectors": [[43, -80]], '
+    ...                         '"max_bridges": 2, "tiers": [[1, 2]]}]'))
+    [Scenario(name='a', inspectors=[[43, -80]], max_bridges=2, \
+tiers=((1, 2),))]
+    """
+
+    scenarios = []
+    for fields in json.load(json_file):
+        if 'tiers' in fields:
+            fields = dict(fields, tiers=tuple(
+                tuple(tier) for tier in fields['tiers']))
+        scenarios.append(Scenario(**fields))
+
+    return scenarios
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv_path')
+    parser.add_argument('scenarios_path')
+    parser.add_argument('--output', help='file to write the results to, '
+                        'standard output by default')
+    parser.add_argument('--format', choices=FORMATS, help='csv by default, '
+                        'or json if the output file ends in .json or .jsonl')
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    with open(args.scenarios_path, encoding='utf-8') as scenarios_file:
+        all_scenarios = read_scenarios(scenarios_file)
+    table = load_bridge_data(args.csv_path)
+    results = run_scenarios(table, all_scenarios, args.workers,
+                            args.csv_path + SNAPSHOT_SUFFIX)
+
+    output_format = args.format
+    if output_format is None:
+        output_format = ('json' if args.output and args.output.endswith(
+            ('.json', '.jsonl')) else 'csv')
+    if args.output is None:
+        write_results(results, sys.stdout, output_format)
+    else:
+        with open(args.output, 'w', newline='',
+                  encoding='utf-8') as results_file:
+            write_results(results, results_file, output_format)
@@ -0,0 +1,613 @@
+"""Inspector assignment split into geographic tiles, run by worker processes.
+
+assign_inspectors treats the whole province as one problem. Here the
+inspectors are split into square latitude/longitude tiles, and each tile
+is sent the bridges its inspectors can reach: the bridges in the tile and
+in a halo around it as wide as each bridge's inspection reach. Tiles are
+searched independently by worker processes, which take them from a queue of
+files in a directory, so workers on several machines can share the work
+through a shared directory. Run a worker as a script, e.g.
+
+    python sharded_assign.py /shared/queue
+
+Tiles meet in their halos, where inspectors of different tiles compete for
+the same bridges, and assign_inspectors gives each bridge to the first
+inspector that can take it. So the workers do not assign bridges: for each
+inspector they search its tile for the first few bridges it can reach, in
+order, which is where the time goes. This process then hands the bridges
+out in inspector order, skipping those already taken, exactly as
+assign_inspectors does. When earlier inspectors have taken too many of an
+inspector's bridges, this process searches its tile further itself, past
+the last bridge found and leaving out the taken bridges. So the workers
+save the most time when few inspectors can reach the same bridges; when
+many can, the earlier ones take most of the bridges found for the later
+ones, and much of the search is left to this process.
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from bisect import bisect_right
+from math import asin, cos, degrees, floor, pi, radians, sin
+from uuid import uuid4
+
+from bridge_functions import (
+    BATCH_THRESHOLD, calculate_distance, calculate_distances,
+    get_inspection_reach, np, PRIORITY_TIERS, ROUNDING_SLACK, THREE_BRIDGES)
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX, EARTH_RADIUS
+
+# Size of one tile, in degrees of latitude and longitude.
+DEFAULT_TILE_SIZE = 2.0
+
+# Seconds a worker waits before looking for new tasks again.
+POLL_INTERVAL = 0.01
+
+# Seconds after which a task claimed by a worker that has not finished it
+# is put back in the queue, in case the worker died.
+STALE_TIMEOUT = 60.0
+
+# Subdirectories of a queue directory: tasks waiting for a worker, tasks
+# being run, results, data shared by the tasks, and files being written.
+QUEUE_FOLDERS = ('pending', 'claimed', 'done', 'shared', 'tmp')
+
+# File whose existence tells the workers of a queue to stop.
+STOP_FILE = 'STOP'
+
+# Number of bridges the workers search for per inspector, for each bridge
+# it may be assigned.
+CANDIDATE_FACTOR = 2
+
+# Most tiles a worker keeps loaded.
+MAX_CACHED_TILES = 64
+
+
+class FileQueue:
+    """A queue of JSON tasks kept as files in a directory.
+
+    Files are written under another name and renamed into place, and a
+    worker claims a task by renaming it, so a task is read whole and run by
+    one worker at a time, even by workers on several machines sharing the
+    directory.
+
+    >>> queue = FileQueue(tempfile.mkdtemp())
+    >>> queue.put('task', {'x': 1})
+    >>> queue.claim()
+    ('task', {'x': 1})
+    >>> queue.claim() is None
+    True
+    >>> queue.complete('task', {'y': 2})
+    >>> queue.result('task')
+    {'y': 2}
+    >>> shutil.rmtree(queue.directory)
+
+    """
+
+    def __init__(self, directory: str) -> None:
+        """Initialize a new queue in the directory directory, creating its
+        subdirectories if need be.
+
+        """
+
+        self.directory = directory
+        for folder in QUEUE_FOLDERS:
+            os.makedirs(os.path.join(directory, folder), exist_ok=True)
+
+    def _path(self, folder: str, name: str) -> str:
+        """Return the path of the file for name in the subdirectory
+        folder.
+
+        """
+
+        return os.path.join(self.directory, folder, name + '.json')
+
+    def _write(self, folder: str, name: str, value) -> None:
+        """Write value as JSON to the file for name in the subdirectory
+        folder, replacing it whole.
+
+        """
+
+        handle, temp_path = tempfile.mkstemp(
+            dir=os.path.join(self.directory, 'tmp'))
+        with os.fdopen(handle, 'w') as temp_file:
+            temp_file.write(json.dumps(value))
+        os.replace(temp_path, self._path(folder, name))
+
+    def _read(self, folder: str, name: str):
+        """Return the JSON value in the file for name in the subdirectory
+        folder, or None if there is no such file.
+
+        """
+
+        try:
+            with open(self._path(folder, name)) as value_file:
+                return json.load(value_file)
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, folder: str, name: str) -> None:
+        """Delete the file for name in the subdirectory folder, if any."""
+
+        try:
+            os.remove(self._path(folder, name))
+        except FileNotFoundError:
+            pass
+
+    def put(self, name: str, task: dict) -> None:
+        """Add the task task named name to this queue."""
+
+        self._write('pending', name, task)
+
+    def claim(self):
+        """Return the name and the task of a task taken from this queue,
+        or None if no task is waiting.
+
+        """
+
+        folder = os.path.join(self.directory, 'pending')
+        for file_name in sorted(os.listdir(folder)):
+            name = file_name[:-len('.json')]
+            claimed_path = self._path('claimed', name)
+            try:
+                os.rename(self._path('pending', name), claimed_path)
+            except FileNotFoundError:
+                # Another worker claimed it first.
+                continue
+            # Renaming keeps the time the task was written, and stale tasks
+            # are found by the time they were claimed.
+            os.utime(claimed_path)
+            with open(claimed_path) as task_file:
+                return name, json.load(task_file)
+
+        return None
+
+    def complete(self, name: str, result: dict) -> None:
+        """Record the result result of the claimed task named name."""
+
+        self._write('done', name, result)
+        self._remove('claimed', name)
+
+    def result(self, name: str):
+        """Return the result of the task named name, or None if it has not
+        been completed.
+
+        """
+
+        return self._read('done', name)
+
+    def discard(self, name: str) -> None:
+        """Delete the result of the task named name."""
+
+        self._remove('done', name)
+
+    def requeue_stale(self, timeout: float = STALE_TIMEOUT) -> None:
+        """Put back in this queue the tasks claimed more than timeout
+        seconds ago that have not been completed.
+
+        """
+
+        folder = os.path.join(self.directory, 'claimed')
+        now = time.time()
+        for file_name in os.listdir(folder):
+            name = file_name[:-len('.json')]
+            claimed_path = self._path('claimed', name)
+            try:
+                if now - os.path.getmtime(claimed_path) > timeout:
+                    os.rename(claimed_path, self._path('pending', name))
+            except FileNotFoundError:
+                pass
+
+    def share(self, name: str, value) -> None:
+        """Store value under name for the tasks of this queue to read."""
+
+        self._write('shared', name, value)
+
+    def get_shared(self, name: str):
+        """Return the value stored under name, or None if there is none."""
+
+        return self._read('shared', name)
+
+    def unshare(self, name: str) -> None:
+        """Delete the value stored under name."""
+
+        self._remove('shared', name)
+
+    def stop(self) -> None:
+        """Tell the workers of this queue to stop."""
+
+        open(os.path.join(self.directory, STOP_FILE), 'w').close()
+
+    def stopped(self) -> bool:
+        """Return True if the workers of this queue have been told to
+        stop.
+
+        """
+
+        return os.path.exists(os.path.join(self.directory, STOP_FILE))
+
+
+def get_tile(latitude: float, longitude: float,
+             tile_size: float = DEFAULT_TILE_SIZE) -> tuple[int, int]:
+    """Return the row and column of the tile of tile_size degrees that
+    contains the location with latitude and longitude latitude and
+    longitude.
+
+    >>> get_tile(43.10, -80.15)
+    (21, -41)
+    """
+
+    return (floor(latitude / tile_size), floor(longitude / tile_size))
+
+
+def get_halo_tiles(latitude: float, longitude: float, reach: float,
+                   tile_size: float = DEFAULT_TILE_SIZE):
+    """Return the lowest and highest row and the lowest and highest column
+    of the tiles of tile_size degrees that contain all locations within
+    reach kilometers of the location with latitude and longitude latitude
+    and longitude, or None if they may be anywhere.
+
+    >>> get_halo_tiles(43.10, -80.15, 100)
+    (21, 21, -41, -40)
+    >>> get_halo_tiles(89.5, 0, 100) is None
+    True
+    """
+
+    angle = (reach + ROUNDING_SLACK) / EARTH_RADIUS
+    lat_delta = degrees(angle)
+    if (angle >= pi / 2 or latitude - lat_delta <= -90
+            or latitude + lat_delta >= 90):
+        return None
+
+    spread = sin(angle) / cos(radians(latitude))
+    if spread >= 1:
+        return None
+    lon_delta = degrees(asin(spread))
+    if longitude - lon_delta <= -180 or longitude + lon_delta >= 180:
+        return None
+
+    low_row, low_col = get_tile(latitude - lat_delta, longitude - lon_delta,
+                                tile_size)
+    high_row, high_col = get_tile(latitude + lat_delta,
+                                  longitude + lon_delta, tile_size)
+    return (low_row, high_row, low_col, high_col)
+
+
+def make_tiles(bridge_data: list[list], inspectors: list[list[float]],
+               tiers: tuple[tuple[float, float], ...] = PRIORITY_TIERS,
+               tile_size: float = DEFAULT_TILE_SIZE) -> list[dict]:
+    """Return the tiles of tile_size degrees holding the inspectors in
+    inspectors, in order of row and column. Each tile is a dictionary with
+    the number, latitude and longitude of each of its inspectors, in order,
+    and the position, latitude, longitude, inspection reach under the
+    (radius, BCI) priority tiers tiers and latitude limit of each bridge of
+    bridge data bridge_data those inspectors may reach, in order. No bridge
+    more than its latitude limit in degrees of latitude away from an
+    inspector can be within reach of them.
+
+    Precondition: Valid bridge data.
+
+    >>> tiles = make_tiles(THREE_BRIDGES, [[43.10, -80.15], [45.0, -81.3]],
+    ...                    tile_size=1)
+    >>> [tile['inspectors'] for tile in tiles]
+    [[[0, 43.1, -80.15]], [[1, 45.0, -81.3]]]
+    >>> [[bridge[0] for bridge in tile['bridges']] for tile in tiles]
+    [[0, 1], [2]]
+    """
+
+    tiles = {}
+    for number in range(len(inspectors)):
+        latitude, longitude = inspectors[number][0], inspectors[number][1]
+        tile = tiles.setdefault(get_tile(latitude, longitude, tile_size),
+                                {'inspectors': [], 'bridges': []})
+        tile['inspectors'].append([number, latitude, longitude])
+
+    for pos in range(len(bridge_data)):
+        bridge = bridge_data[pos]
+        reach = get_inspection_reach(bridge, tiers)
+        if reach < 0:
+            continue
+        record = [pos, bridge[LAT_INDEX], bridge[LON_INDEX], reach,
+                  degrees((reach + ROUNDING_SLACK) / EARTH_RADIUS)]
+        box = get_halo_tiles(bridge[LAT_INDEX], bridge[LON_INDEX], reach,
+                             tile_size)
+        if box is None:
+            for tile in tiles.values():
+                tile['bridges'].append(record)
+            continue
+
+        low_row, high_row, low_col, high_col = box
+        if (high_row - low_row + 1) * (high_col - low_col + 1) > len(tiles):
+            for (row, col), tile in tiles.items():
+                if low_row <= row <= high_row and low_col <= col <= high_col:
+                    tile['bridges'].append(record)
+        else:
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    if (row, col) in tiles:
+                        tiles[(row, col)]['bridges'].append(record)
+
+    return [tiles[key] for key in sorted(tiles)]
+
+
+def _get_columns(tile: dict) -> tuple:
+    """Return the positions, the latitudes, the longitudes and the
+    inspection reaches of the bridges of the tile tile, as returned by
+    make_tiles, and a dictionary from the number of each of its inspectors
+    to their location, computing them the first time. Latitudes, longitudes
+    and reaches are NumPy arrays if NumPy is installed and the tile holds at
+    least BATCH_THRESHOLD bridges, and None otherwise.
+
+    """
+
+    columns = tile.get('columns')
+    if columns is None:
+        bridges = tile['bridges']
+        positions = [bridge[0] for bridge in bridges]
+        if np and len(bridges) >= BATCH_THRESHOLD:
+            lats, lons, reaches = np.array(
+                [bridge[1:4] for bridge in bridges], dtype=float).T
+        else:
+            lats = lons = reaches = None
+        locations = {number: (latitude, longitude)
+                     for number, latitude, longitude in tile['inspectors']}
+        columns = tile['columns'] = (positions, lats, lons, reaches,
+                                     locations)
+
+    return columns
+
+
+def find_candidates(tile: dict, requests: list[list[int]],
+                    taken: set[int] = frozenset()) -> list[list[int]]:
+    """Return, for each [number, after, count] request in requests, the
+    positions of the first count bridges of the tile tile, as returned by
+    make_tiles, after position after that the tile's inspector number
+    number can reach, in order, leaving out the positions in taken.
+
+    >>> tile = make_tiles(THREE_BRIDGES, [[43.10, -80.15]])[0]
+    >>> find_candidates(tile, [[0, -1, 3], [0, -1, 1], [0, 0, 1]])
+    [[0, 1], [0], [1]]
+    >>> find_candidates(tile, [[0, -1, 3]], [0])
+    [[1]]
+    """
+
+    bridges = tile['bridges']
+    positions, lats, lons, reaches, locations = _get_columns(tile)
+
+    results = []
+    for number, after, count in requests:
+        latitude, longitude = locations[number]
+        start = bisect_right(positions, after)
+        found = []
+        if count <= 0:
+            pass
+        elif lats is not None:
+            distances = calculate_distances(lats[start:], lons[start:],
+                                            latitude, longitude)
+            limits = reaches[start:]
+            # Vectorized distances can differ from calculate_distance in
+            # the last digit, so decide close calls with
+            # calculate_distance.
+            for j in np.flatnonzero(
+                    distances <= limits + ROUNDING_SLACK).tolist():
+                pos, lat, lon, reach, _ = bridges[start + j]
+                if pos in taken:
+                    continue
+                if (distances[j] < reach - ROUNDING_SLACK
+                        or calculate_distance(latitude, longitude, lat,
+                                              lon) <= reach):
+                    found.append(pos)
+                    if len(found) == count:
+                        break
+        else:
+            for i in range(start, len(bridges)):
+                pos, lat, lon, reach, lat_limit = bridges[i]
+                if pos in taken:
+                    continue
+                if (abs(lat - latitude) <= lat_limit
+                        and calculate_distance(latitude, longitude, lat,
+                                               lon) <= reach):
+                    found.append(pos)
+                    if len(found) == count:
+                        break
+        results.append(found)
+
+    return results
+
+
+def run_task(queue: FileQueue, task: dict, tiles: dict) -> dict:
+    """Return the result of the task task of the queue queue: the
+    candidates of find_candidates for the tile and the requests it names,
+    or the error that stopped it. tiles maps the names of the tiles already
+    loaded to the tiles.
+
+    """
+
+    try:
+        tile = tiles.get(task['tile'])
+        if tile is None:
+            if len(tiles) >= MAX_CACHED_TILES:
+                tiles.clear()
+            tile = tiles[task['tile']] = queue.get_shared(task['tile'])
+        return {'candidates': find_candidates(tile, task['requests'])}
+    except Exception as error:
+        return {'error': f'{type(error).__name__}: {error}'}
+
+
+def run_worker(queue_dir: str, stop_event=None,
+               poll_interval: float = POLL_INTERVAL) -> None:
+    """Run the tasks of the queue in the directory queue_dir until the
+    queue is stopped or stop_event, a multiprocessing event, is set.
+
+    """
+
+    queue = FileQueue(queue_dir)
+    tiles = {}
+    while not queue.stopped() and not (stop_event is not None
+                                       and stop_event.is_set()):
+        task = queue.claim()
+        if task is None:
+            time.sleep(poll_interval)
+        else:
+            queue.complete(task[0], run_task(queue, task[1], tiles))
+
+
+def _run_tasks(queue: FileQueue, tasks: dict[str, dict],
+               poll_interval: float) -> dict[str, dict]:
+    """Put the tasks tasks, named by their keys, in the queue queue, and
+    return the result of each, by name. Tasks are also run here while
+    waiting for the workers.
+
+    """
+
+    for name, task in tasks.items():
+        queue.put(name, task)
+
+    tiles = {}
+    results = {}
+    while len(results) < len(tasks):
+        progress = False
+        for name in tasks:
+            if name not in results:
+                result = queue.result(name)
+                if result is not None:
+                    if 'error' in result:
+                        raise RuntimeError(f'task {name} failed: '
+                                           f'{result["error"]}')
+                    results[name] = result
+                    queue.discard(name)
+                    progress = True
+
+        if not progress and len(results) < len(tasks):
+            task = queue.claim()
+            if task is not None:
+                queue.complete(task[0], run_task(queue, task[1], tiles))
+            else:
+                queue.requeue_stale()
+                time.sleep(poll_interval)
+
+    return results
+
+
+def assign_inspectors_sharded(bridge_data: list[list],
+                              inspectors: list[list[float]],
+                              max_bridges: int,
+                              tiers: tuple[tuple[float, float], ...]
+                              = PRIORITY_TIERS,
+                              tile_size: float = DEFAULT_TILE_SIZE,
+                              workers: int = None, queue_dir: str = None,
+                              poll_interval: float = POLL_INTERVAL
+                              ) -> list[list[int]]:
+    """Return the inspector assignment of assign_inspectors_with_tiers for
+    bridge data bridge_data, inspectors inspectors, at most max_bridges
+    bridges per inspector and the (radius, BCI) priority tiers tiers,
+    searching tiles of tile_size degrees in up to workers local worker
+    processes, or one per CPU if workers is None.
+
+    Tasks go through a queue in the directory queue_dir, or in a temporary
+    directory if queue_dir is None, where workers started elsewhere with
+    run_worker also take them. This process runs tasks while it waits, so
+    with workers set to 0 and no other workers it searches every tile
+    itself.
+
+    Precondition: Valid bridge data.
+
+    >>> assign_inspectors_sharded(THREE_BRIDGES, [[43.20, -80.35],
+    ...                           [43.10, -80.15]], 1, tile_size=0.1,
+    ...                           workers=0)
+    [[1], [2]]
+    >>> assign_inspectors_sharded(THREE_BRIDGES, [[38.691, -80.85],
+    ...                           [43.20, -80.35]], 2, workers=0)
+    [[], [1, 2]]
+    """
+
+    if max_bridges <= 0:
+        return [[] for _ in inspectors]
+
+    tiles = make_tiles(bridge_data, inspectors, tiers, tile_size)
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(tiles))
+
+    temporary = queue_dir is None
+    if temporary:
+        queue_dir = tempfile.mkdtemp(prefix='assign-')
+    queue = FileQueue(queue_dir)
+    run = uuid4().hex
+    tile_names = [f'{run}-tile-{t}' for t in range(len(tiles))]
+    tasks = {}
+    for t in range(len(tiles)):
+        requests = [[number, -1, CANDIDATE_FACTOR * max_bridges]
+                    for number, _, _ in tiles[t]['inspectors']]
+        tasks[f'{run}-search-{t}'] = {'tile': tile_names[t],
+                                      'requests': requests}
+
+    stop_event = multiprocessing.Event()
+    processes = [multiprocessing.Process(
+        target=run_worker, args=(queue_dir, stop_event, poll_interval),
+        daemon=True) for _ in range(workers)]
+    try:
+        for t in range(len(tiles)):
+            queue.share(tile_names[t], tiles[t])
+        for process in processes:
+            process.start()
+        results = _run_tasks(queue, tasks, poll_interval)
+    finally:
+        stop_event.set()
+        for process in processes:
+            process.join()
+        for name in tile_names:
+            queue.unshare(name)
+        if temporary:
+            shutil.rmtree(queue_dir, ignore_errors=True)
+
+    # The positions of the bridges each inspector can reach that the
+    # workers found, whether they are all of them, and the tile searched.
+    candidates = [[] for _ in inspectors]
+    complete = [False] * len(inspectors)
+    tile_of = [None] * len(inspectors)
+    for t, name in enumerate(tasks):
+        for request, found in zip(tasks[name]['requests'],
+                                  results[name]['candidates']):
+            candidates[request[0]] = found
+            complete[request[0]] = len(found) < request[2]
+            tile_of[request[0]] = t
+
+    assignment = []
+    taken = set()
+    for number in range(len(inspectors)):
+        picked = []
+        for pos in candidates[number]:
+            if pos not in taken:
+                picked.append(pos)
+                if len(picked) == max_bridges:
+                    break
+        if len(picked) < max_bridges and not complete[number]:
+            # Earlier inspectors took too many of the bridges found, so
+            # search on from the last one, leaving out the taken bridges.
+            picked.extend(find_candidates(
+                tiles[tile_of[number]],
+                [[number, candidates[number][-1],
+                  max_bridges - len(picked)]], taken)[0])
+        taken.update(picked)
+        assignment.append(picked)
+
+    return [[bridge_data[pos][ID_INDEX] for pos in picked]
+            for picked in assignment]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run a worker for sharded inspector assignment.')
+    parser.add_argument('queue_dir')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL)
+    parser.add_argument('--stop', action='store_true',
+                        help='tell the workers of the queue to stop')
+    args = parser.parse_args()
+
+    if args.stop:
+        FileQueue(args.queue_dir).stop()
+    else:
+        run_worker(args.queue_dir, poll_interval=args.poll_interval)
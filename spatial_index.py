@@ -0,0 +1,354 @@
+"""A grid-based spatial index over formatted bridge data.
+
+The index buckets bridges into a uniform latitude/longitude grid so that
+radius and nearest-bridge queries only run the exact haversine check on
+bridges whose grid cell overlaps the bounding box of the query. Results
+are identical to the linear scans in bridge_functions, including the
+order of the returned ids.
+
+"""
+
+from math import asin, cos, degrees, floor, pi, radians, sin
+
+from bridge_functions import (
+    calculate_distance, calculate_distances, np, ROUNDING_SLACK,
+    THREE_BRIDGES)
+from constants import ID_INDEX, LAT_INDEX, LON_INDEX, EARTH_RADIUS
+
+# Size of one grid cell, in degrees of latitude and longitude.
+DEFAULT_CELL_SIZE = 0.25
+
+# Any radius at least this large covers the whole globe.
+HALF_CIRCUMFERENCE = pi * EARTH_RADIUS
+
+
+def _get_haversine(distance: float) -> float:
+    """Return the haversine of the angle that distance kilometers spans on
+    the Earth's surface, or -1 if distance is negative.
+
+    >>> _get_haversine(-1), _get_haversine(0), _get_haversine(1e9)
+    (-1, 0.0, 1.0)
+    """
+
+    if distance < 0:
+        return -1
+    return sin(min(distance, HALF_CIRCUMFERENCE) / (2 * EARTH_RADIUS)) ** 2
+
+
+class SpatialIndex:
+    """A uniform latitude/longitude grid over a set of located points.
+
+    Points are identified by their position in the data the index was
+    built from, and each query returns the ids of matching points in that
+    order.
+
+    >>> index = build_spatial_index(THREE_BRIDGES)
+    >>> index.bridges_in_radius(43.10, -80.15, 50)
+    [1, 2]
+    >>> index.closest_bridge(1)
+    2
+    >>> index.k_closest_bridges(3, 2)
+    [1, 2]
+
+    """
+
+    def __init__(self, lats: list[float], lons: list[float], ids: list,
+                 cell_size: float = DEFAULT_CELL_SIZE) -> None:
+        """Initialize a new index over the points (lats[i], lons[i]) with
+        ids ids[i], using square grid cells of cell_size degrees.
+
+        """
+
+        self.lats = list(lats)
+        self.lons = list(lons)
+        self.ids = list(ids)
+        self.cell_size = cell_size
+        self._positions = {}
+        self._cells = {}
+        for pos in range(len(self.ids)):
+            self._positions.setdefault(self.ids[pos], pos)
+            cell = self._cell_of(self.lats[pos], self.lons[pos])
+            self._cells.setdefault(cell, []).append(pos)
+
+    def __len__(self) -> int:
+        """Return the number of points in this index."""
+
+        return len(self.ids)
+
+    def _cell_of(self, lat: float, lon: float) -> tuple[int, int]:
+        """Return the grid cell containing the location (lat, lon)."""
+
+        return (floor(lat / self.cell_size), floor(lon / self.cell_size))
+
+    def candidates(self, lat: float, lon: float, radius: float) -> list[int]:
+        """Return the sorted positions of all points that may be within
+        radius kilometers of the location (lat, lon). The result is a
+        superset of the points that are actually within the radius.
+
+        """
+
+        return self._box_candidates(lat, lat, lon, lon, radius)
+
+    def _box_candidates(self, min_lat: float, max_lat: float, min_lon: float,
+                        max_lon: float, radius: float) -> list[int]:
+        """Return the sorted positions of all points that may be within
+        radius kilometers of some location with latitude between min_lat
+        and max_lat and longitude between min_lon and max_lon.
+
+        """
+
+        if radius < 0:
+            return []
+
+        reach = (radius + ROUNDING_SLACK) / EARTH_RADIUS
+        lat_delta = degrees(reach)
+        if (reach >= pi / 2 or min_lat - lat_delta <= -90
+                or max_lat + lat_delta >= 90):
+            return list(range(len(self.ids)))
+
+        # A circle reaches furthest east and west at the highest latitude.
+        spread = sin(reach) / cos(radians(max(abs(min_lat), abs(max_lat))))
+        if spread >= 1:
+            return list(range(len(self.ids)))
+        lon_delta = degrees(asin(spread))
+        if min_lon - lon_delta <= -180 or max_lon + lon_delta >= 180:
+            return list(range(len(self.ids)))
+
+        low_row, low_col = self._cell_of(min_lat - lat_delta,
+                                         min_lon - lon_delta)
+        high_row, high_col = self._cell_of(max_lat + lat_delta,
+                                           max_lon + lon_delta)
+
+        positions = []
+        if ((high_row - low_row + 1) * (high_col - low_col + 1)
+                > len(self._cells)):
+            for (row, col), cell in self._cells.items():
+                if low_row <= row <= high_row and low_col <= col <= high_col:
+                    positions.extend(cell)
+        else:
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    positions.extend(self._cells.get((row, col), ()))
+
+        positions.sort()
+        return positions
+
+    def in_radius(self, lat: float, lon: float, radius: float) -> list[int]:
+        """Return the sorted positions of all points within radius
+        kilometers of the location (lat, lon).
+
+        """
+
+        return [pos for pos in self.candidates(lat, lon, radius)
+                if calculate_distance(lat, lon, self.lats[pos],
+                                      self.lons[pos]) <= radius]
+
+    def bridges_in_radius(self, latitude: float, longitude: float,
+                          radius: float) -> list[int]:
+        """Return a list of ids of all bridges within radius radius of the
+        location with latitude and longitude latitude and longitude, in the
+        same order as get_bridges_in_radius.
+
+        >>> index = build_spatial_index(THREE_BRIDGES)
+        >>> index.bridges_in_radius(43.10, -80.15, 0)
+        []
+        >>> index.bridges_in_radius(43.10, -80.15, 250)
+        [1, 2, 3]
+        """
+
+        return [self.ids[pos]
+                for pos in self.in_radius(latitude, longitude, radius)]
+
+    def in_radii(self, queries: list[tuple[float, float, float]],
+                 counts_only: bool = False) -> list:
+        """Return, for each (lat, lon, radius) query in queries, the sorted
+        positions of all points within radius kilometers of the location
+        (lat, lon), or only the number of them if counts_only is True.
+
+        If NumPy is installed, queries are grouped by radius and by the grid
+        cell they fall in, and the points near each group are gathered once
+        and checked against each of its queries in one vectorized call.
+        Otherwise each query is answered by in_radius.
+
+        >>> index = build_spatial_index(THREE_BRIDGES)
+        >>> index.in_radii([(43.10, -80.15, 50), (43.10, -80.15, -1)])
+        [[0, 1], []]
+        """
+
+        if not np:
+            results = [self.in_radius(lat, lon, radius)
+                       for lat, lon, radius in queries]
+            if counts_only:
+                return [len(positions) for positions in results]
+            return results
+
+        groups = {}
+        for i in range(len(queries)):
+            lat, lon, radius = queries[i]
+            groups.setdefault((self._cell_of(lat, lon), radius),
+                              []).append(i)
+
+        results = [0 if counts_only else [] for _ in queries]
+        all_lats = np.asarray(self.lats, dtype=float)
+        all_lons = np.asarray(self.lons, dtype=float)
+        for (_, radius), group in groups.items():
+            group_lats = [queries[i][0] for i in group]
+            group_lons = [queries[i][1] for i in group]
+            positions = self._box_candidates(
+                min(group_lats), max(group_lats), min(group_lons),
+                max(group_lons), radius)
+            if not positions:
+                continue
+            positions = np.array(positions)
+            lats = np.radians(all_lats[positions])
+            lons = np.radians(all_lons[positions])
+            cos_lats = np.cos(lats)
+            inner = _get_haversine(radius - ROUNDING_SLACK)
+            outer = _get_haversine(radius + ROUNDING_SLACK)
+
+            for i in group:
+                lat, lon, _ = queries[i]
+                # Compare haversines rather than distances, which saves the
+                # inverse sine of every candidate.
+                haversines = (np.sin((lats - radians(lat)) / 2) ** 2
+                              + cos(radians(lat)) * cos_lats
+                              * np.sin((lons - radians(lon)) / 2) ** 2)
+                inside = haversines < inner
+                # Vectorized haversines can differ from calculate_distance in
+                # the last digit, so decide close calls with
+                # calculate_distance.
+                for j in np.flatnonzero(
+                        ~inside & (haversines <= outer)).tolist():
+                    inside[j] = calculate_distance(
+                        lat, lon, self.lats[positions[j]],
+                        self.lons[positions[j]]) <= radius
+                if counts_only:
+                    results[i] = int(np.count_nonzero(inside))
+                else:
+                    results[i] = positions[inside].tolist()
+
+        return results
+
+    def bridges_in_radii(self, queries: list[tuple[float, float, float]],
+                         counts_only: bool = False) -> list:
+        """Return, for each (latitude, longitude, radius) query in queries,
+        the list of ids of all bridges within radius radius of the location
+        with latitude and longitude latitude and longitude, as
+        bridges_in_radius returns it, or only the number of them if
+        counts_only is True.
+
+        >>> index = build_spatial_index(THREE_BRIDGES)
+        >>> index.bridges_in_radii([(43.10, -80.15, 50), (43.10, -80.15, 250)])
+        [[1, 2], [1, 2, 3]]
+        >>> index.bridges_in_radii([(43.10, -80.15, 50), (43.10, -80.15, 0)],
+        ...                        counts_only=True)
+        [2, 0]
+        """
+
+        results = self.in_radii(queries, counts_only)
+        if counts_only:
+            return results
+
+        return [[self.ids[pos] for pos in positions] for positions in results]
+
+    def k_closest_bridges(self, bridge_id: int, k: int) -> list[int]:
+        """Return the ids of the k bridges closest to the bridge with id
+        bridge_id, closest first. Bridges at the same distance are ordered
+        as they appear in the bridge data. Return [] if there is no bridge
+        with id bridge_id.
+
+        >>> index = build_spatial_index(THREE_BRIDGES)
+        >>> index.k_closest_bridges(1, 5)
+        [2, 3]
+        >>> index.k_closest_bridges(42, 1)
+        []
+        """
+
+        target = self._positions.get(bridge_id)
+        if target is None or k <= 0:
+            return []
+
+        lat, lon = self.lats[target], self.lons[target]
+        radius = radians(self.cell_size) * EARTH_RADIUS
+        while True:
+            found = []
+            for pos in self.candidates(lat, lon, radius):
+                if pos != target:
+                    distance = calculate_distance(lat, lon, self.lats[pos],
+                                                  self.lons[pos])
+                    if distance <= radius:
+                        found.append((distance, pos))
+
+            # Every point left out is farther away than radius, so once k
+            # points are found inside it they are the k closest overall.
+            if len(found) >= k or radius >= HALF_CIRCUMFERENCE:
+                found.sort()
+                return [self.ids[pos] for _, pos in found[:k]]
+            radius *= 4
+
+    def closest_bridge(self, bridge_id: int) -> int:
+        """Return the id of the bridge which is closest to the bridge with
+        id bridge_id, as get_closest_bridge does.
+
+        Precondition: Bridge with id bridge_id is in this index and there
+        are at least two bridges in this index.
+
+        >>> index = build_spatial_index(THREE_BRIDGES)
+        >>> index.closest_bridge(2)
+        1
+        """
+
+        return self.k_closest_bridges(bridge_id, 1)[0]
+
+
+def build_spatial_index(bridge_data: list[list],
+                        cell_size: float = DEFAULT_CELL_SIZE) -> SpatialIndex:
+    """Return a spatial index over the bridges in bridge data bridge_data,
+    using grid cells of cell_size degrees.
+
+    Precondition: Valid bridge data.
+
+    >>> len(build_spatial_index(THREE_BRIDGES))
+    3
+    """
+
+    return SpatialIndex([bridge[LAT_INDEX] for bridge in bridge_data],
+                        [bridge[LON_INDEX] for bridge in bridge_data],
+                        [bridge[ID_INDEX] for bridge in bridge_data],
+                        cell_size)
+
+
+def get_bridges_in_radii(bridge_data: list[list],
+                         queries: list[tuple[float, float, float]],
+                         counts_only: bool = False,
+                         index: SpatialIndex = None) -> list:
+    """Return, for each (latitude, longitude, radius) query in queries, the
+    list of ids of all bridges in bridge data bridge_data that
+    get_bridges_in_radius returns for it, or only the number of them if
+    counts_only is True.
+
+    Unless index is a spatial index already built over bridge_data, each
+    call builds one, which takes O(B) time and memory for B bridges before
+    any query is answered. Callers that run several batches over the same
+    bridges should build the index once with build_spatial_index and pass
+    it as index. Without NumPy, each query is then answered by
+    SpatialIndex.in_radius, one haversine per candidate bridge.
+
+    Precondition: Valid bridge data.
+
+    >>> get_bridges_in_radii(THREE_BRIDGES, [(43.10, -80.15, 50),
+    ...                                      (45.0, -81.3, 10)])
+    [[1, 2], [3]]
+    >>> index = build_spatial_index(THREE_BRIDGES)
+    >>> get_bridges_in_radii(THREE_BRIDGES, [(45.0, -81.3, 10)], True, index)
+    [1]
+    """
+
+    if index is None:
+        index = build_spatial_index(bridge_data)
+    return index.bridges_in_radii(queries, counts_only)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()
@@ -0,0 +1,197 @@
+"""Seeded synthetic bridge data in the shape of the Ontario bridge CSV file.
+
+make_raw_bridges generates uncleaned bridge records laid out exactly like
+THREE_BRIDGES_UNCLEANED: a structure id, name, highway, latitude and
+longitude strings, build and rehab years, a span details string, a length,
+an inspection date, and a current BCI followed by one column per year of
+BCI history, most of them blank. Bridges cluster around Ontario's cities,
+with the rest spread over the south and along the northern highways.
+
+"""
+
+import csv
+import random
+from typing import TextIO
+
+from bridge_functions import format_data, THREE_BRIDGES_UNCLEANED
+from constants import ID_INDEX
+
+# Centres of bridge clusters: (latitude, longitude, spread in degrees,
+# relative weight).
+CITIES = (
+    (43.70, -79.40, 0.35, 30), (45.42, -75.70, 0.30, 8),
+    (43.25, -79.87, 0.20, 6), (42.98, -81.25, 0.25, 5),
+    (43.45, -80.49, 0.20, 5), (42.30, -83.00, 0.20, 3),
+    (44.23, -76.48, 0.20, 3), (44.39, -79.69, 0.25, 3),
+    (46.49, -80.99, 0.30, 3), (48.38, -89.25, 0.30, 2),
+    (46.52, -84.33, 0.20, 1), (46.31, -79.46, 0.20, 1),
+    (48.48, -81.33, 0.25, 1))
+
+# Share of bridges placed away from any city.
+RURAL_SHARE = 0.25
+
+# Bounding boxes of rural bridges: southern Ontario and the northern
+# highway corridor.
+SOUTH = (42.0, 46.0, -83.5, -74.5)
+NORTH = (46.0, 50.5, -94.5, -79.5)
+
+# Years with a column of BCI history, newest first.
+BCI_YEARS = tuple(range(2013, 1999, -1))
+
+# The two header lines of a bridge data CSV file.
+HEADER_ROWS = (
+    ['ID', 'STRUCTURE', 'HWY NAME', 'LATITUDE', 'LONGITUDE', 'YEAR BUILT',
+     'LAST MAJOR REHAB', 'LAST MINOR REHAB', 'NUMBER OF SPANS',
+     'SPAN DETAILS (m)', 'DECK / CULVERTS LENGTH (m)',
+     'LAST INSPECTION DATE', 'CURRENT BCI',
+     'HISTORICAL BRIDGE CONDITION INDEX (BCI)'],
+    [''] * 12 + ['CURRENT BCI'] + [str(year) for year in BCI_YEARS])
+
+NAME_KINDS = ('UNDERPASS', 'OVERPASS', 'RIVER BRIDGE', 'CREEK BRIDGE',
+              'CREEK CULVERT', 'Underpass', 'Overpass', 'River Bridge')
+NAME_PLACES = ('WEST STREET', 'MAIN STREET', 'STOKES', 'Highway 24',
+               'KING STREET', 'Grand', 'Credit', 'HUMBER', 'Don Valley',
+               'RAILWAY', 'Bay Road', 'CONCESSION 6', 'Township Road 3')
+HIGHWAYS = ('401', '403', '400', '404', '407', '6', '7', '11', '17', '69',
+            'QEW', '416', '417', '115', '35', '10', '24', '8')
+
+
+def make_location(rng: random.Random) -> tuple[float, float]:
+    """Return a random (latitude, longitude) location in Ontario, using the
+    random number generator rng.
+
+    >>> lat, lon = make_location(random.Random(0))
+    >>> 41.6 < lat < 57 and -95.2 < lon < -74.2
+    True
+    """
+
+    if rng.random() < RURAL_SHARE:
+        min_lat, max_lat, min_lon, max_lon = (
+            SOUTH if rng.random() < 0.75 else NORTH)
+        return rng.uniform(min_lat, max_lat), rng.uniform(min_lon, max_lon)
+
+    lat, lon, spread, _ = rng.choices(
+        CITIES, weights=[city[3] for city in CITIES])[0]
+    return (min(56.8, max(41.7, rng.gauss(lat, spread))),
+            min(-74.3, max(-95.1, rng.gauss(lon, spread * 1.4))))
+
+
+def _format_number(number: float) -> str:
+    """Return number as the CSV file writes it, without a trailing '.0'.
+
+    >>> _format_number(12.0), _format_number(12.2)
+    ('12', '12.2')
+    """
+
+    return f'{number:g}' if number == int(number) else str(number)
+
+
+def make_raw_bridge(rng: random.Random, num: int) -> list[str]:
+    """Return a random uncleaned bridge record, as in
+    THREE_BRIDGES_UNCLEANED, for the num-th bridge, using the random number
+    generator rng.
+
+    >>> record = make_raw_bridge(random.Random(0), 1)
+    >>> len(record) == len(THREE_BRIDGES_UNCLEANED[0])
+    True
+    """
+
+    lat, lon = make_location(rng)
+    built = rng.randint(1920, 2010)
+    major = str(rng.randint(built, 2014)) if rng.random() < 0.7 else ''
+    minor = str(rng.randint(built, 2014)) if rng.random() < 0.6 else ''
+
+    num_spans = rng.choices((1, 2, 3, 4, 5, 6), (30, 15, 25, 20, 6, 4))[0]
+    spans = [round(rng.uniform(5, 45), rng.choice((0, 0, 1)))
+             for _ in range(num_spans)]
+    details = 'Total=' + _format_number(round(sum(spans), 1)) + '  ' + ''.join(
+        f'({i + 1})={_format_number(spans[i])};' for i in range(num_spans))
+    length = round(sum(spans) + rng.uniform(0, 6), 1)
+
+    # One BCI per inspected year, newest first, drifting down over time.
+    history = [''] * len(BCI_YEARS)
+    bci = rng.uniform(35, 95)
+    newest = None
+    for year in range(len(BCI_YEARS) - 1, -1, -1):
+        if rng.random() < 0.5:
+            bci = min(100.0, max(20.0, bci + rng.gauss(-0.6, 1.5)))
+            history[year] = _format_number(round(bci, 1))
+            newest = year
+    if newest is None:
+        newest = rng.randrange(len(BCI_YEARS))
+        history[newest] = _format_number(round(bci, 1))
+
+    date = '{:02}/{:02}/{}'.format(rng.randint(1, 12), rng.randint(1, 28),
+                                   BCI_YEARS[newest])
+    return ([f'{num // 100 + 1} - {num % 100:3}/',
+             rng.choice(NAME_PLACES) + ' ' + rng.choice(NAME_KINDS),
+             rng.choice(HIGHWAYS), f'{lat:.6f}', f'{lon:.6f}', str(built),
+             major, minor, str(num_spans), details, _format_number(length),
+             date, history[newest]] + history)
+
+
+def make_raw_bridges(num_bridges: int, seed: int = 0) -> list[list[str]]:
+    """Return num_bridges random uncleaned bridge records, as in
+    THREE_BRIDGES_UNCLEANED, using the random seed seed.
+
+    >>> rows = make_raw_bridges(100, seed=1)
+    >>> rows == make_raw_bridges(100, seed=1)
+    True
+    >>> format_data(rows)
+    >>> rows[-1][ID_INDEX]
+    100
+    """
+
+    rng = random.Random(seed)
+    return [make_raw_bridge(rng, num) for num in range(1, num_bridges + 1)]
+
+
+def make_bridges(num_bridges: int, seed: int = 0) -> list[list]:
+    """Return num_bridges random bridges, formatted as format_data formats
+    them, using the random seed seed.
+
+    >>> bridges = make_bridges(5)
+    >>> [bridge[ID_INDEX] for bridge in bridges]
+    [1, 2, 3, 4, 5]
+    """
+
+    bridges = make_raw_bridges(num_bridges, seed)
+    format_data(bridges)
+    return bridges
+
+
+def make_inspectors(num_inspectors: int, seed: int = 0) -> list[list[float]]:
+    """Return num_inspectors random inspector locations in Ontario, using
+    the random seed seed.
+
+    >>> len(make_inspectors(3))
+    3
+    """
+
+    rng = random.Random(seed)
+    return [[round(coordinate, 6) for coordinate in make_location(rng)]
+            for _ in range(num_inspectors)]
+
+
+def write_bridge_csv(csv_file: TextIO, rows: list[list[str]]) -> None:
+    """Write the uncleaned bridge records rows to the open CSV file
+    csv_file, after the two header lines, so that read_data reads them
+    back.
+
+    >>> from io import StringIO
+    >>> from bridge_functions import read_data
+    >>> csv_file = StringIO()
+    >>> write_bridge_csv(csv_file, THREE_BRIDGES_UNCLEANED)
+    >>> _ = csv_file.seek(0)
+    >>> read_data(csv_file) == THREE_BRIDGES_UNCLEANED
+    True
+    """
+
+    writer = csv.writer(csv_file, lineterminator='\n')
+    writer.writerows(HEADER_ROWS)
+    writer.writerows(rows)
+
+
+if __name__ == '__main__':
+    import doctest
+    doctest.testmod()